@@ -0,0 +1,106 @@
+"""
+Indicateurs par segment (virages, rectitude, dénivelé) calculés en une passe
+vectorisée sur tous les segments à la fois.
+
+Les segments sont décrits comme dans TraceStore : coords (N, 2) lat/lon
+concaténées et offsets (bornes des segments) ; l'altitude (N,) est optionnelle.
+Les pas et les virages qui enjambent deux segments sont masqués, puis les
+sommes et maxima par segment sont obtenus par np.add.at / np.maximum.at.
+Mêmes définitions que geometry.count_turns : un virage est un écart de cap
+supérieur ou égal au seuil entre deux pas consécutifs.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from geometry import angle_difference_deg, bearing_deg, haversine_km, vincenty_km
+
+DEFAULT_TURN_THRESHOLD_DEG = 25.0
+
+METRIC_COLUMNS = {
+    "lengths_km": "Distance (km)",
+    "turns": "Nombre de virages",
+    "turns_per_km": "Virages/km",
+    "max_angle_deg": "Angle max (°)",
+    "mean_angle_deg": "Angle moyen (°)",
+    "straightness": "Rectitude",
+    "elevation_gain_m": "D+ (m)",
+}
+
+
+class SegmentMetrics(NamedTuple):
+    """Indicateurs de chaque segment (tableaux alignés sur les segments)."""
+    lengths_km: np.ndarray        # longueur de la trace
+    turns: np.ndarray             # nombre de virages >= seuil
+    turns_per_km: np.ndarray      # virages par km (0 si longueur nulle)
+    max_angle_deg: np.ndarray     # plus grand écart de cap entre pas consécutifs
+    mean_angle_deg: np.ndarray    # écart de cap moyen entre pas consécutifs
+    straightness: np.ndarray      # distance à vol d'oiseau début-fin / longueur (1 = ligne droite)
+    elevation_gain_m: np.ndarray  # somme des montées (NaN si aucune altitude)
+
+
+def segment_metrics(offsets, coords, elevations=None, turn_threshold_deg=DEFAULT_TURN_THRESHOLD_DEG,
+                    geodesic=True):
+    """
+    Indicateurs de tous les segments décrits par (offsets, coords), distances
+    Vincenty si geodesic (comme track_profile), haversine sinon.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    offsets = offsets - offsets[0]
+    n_segments = len(offsets) - 1
+    counts = np.diff(offsets)
+    distance = vincenty_km if geodesic else haversine_km
+
+    # Pas i : du point i au point i+1, valide s'ils appartiennent au même segment
+    point_segment = np.repeat(np.arange(n_segments), counts)
+    step_valid = point_segment[:-1] == point_segment[1:]
+    step_segment = point_segment[:-1][step_valid]
+    lat1, lon1 = coords[:-1, 0][step_valid], coords[:-1, 1][step_valid]
+    lat2, lon2 = coords[1:, 0][step_valid], coords[1:, 1][step_valid]
+
+    lengths = np.zeros(n_segments)
+    np.add.at(lengths, step_segment, distance(lat1, lon1, lat2, lon2))
+
+    # Virage j : entre les pas valides j et j+1 du même segment
+    bearings = bearing_deg(lat1, lon1, lat2, lon2)
+    turn_valid = step_segment[:-1] == step_segment[1:]
+    turn_segment = step_segment[:-1][turn_valid]
+    angles = angle_difference_deg(bearings[:-1], bearings[1:])[turn_valid]
+
+    turns = np.bincount(turn_segment[angles >= turn_threshold_deg], minlength=n_segments)
+    n_angles = np.bincount(turn_segment, minlength=n_segments)
+    angle_sums = np.bincount(turn_segment, weights=angles, minlength=n_segments)
+    max_angles = np.zeros(n_segments)
+    np.maximum.at(max_angles, turn_segment, angles)
+    mean_angles = np.divide(angle_sums, n_angles, out=np.zeros(n_segments), where=n_angles > 0)
+    turns_per_km = np.divide(turns, lengths, out=np.zeros(n_segments), where=lengths > 0)
+
+    # Rectitude : corde début-fin rapportée à la longueur parcourue
+    straightness = np.zeros(n_segments)
+    measured = (counts >= 2) & (lengths > 0)
+    if measured.any():
+        first, last = offsets[:-1][measured], offsets[1:][measured] - 1
+        chords = distance(coords[first, 0], coords[first, 1], coords[last, 0], coords[last, 1])
+        straightness[measured] = np.minimum(chords / lengths[measured], 1.0)
+
+    elevation_gain = np.full(n_segments, np.nan)
+    if elevations is not None:
+        elevations = np.asarray(elevations, dtype=np.float64)
+        climbs = np.diff(elevations)[step_valid]
+        has_ele = np.bincount(step_segment, weights=np.isfinite(climbs), minlength=n_segments) > 0
+        gains = np.bincount(step_segment, weights=np.where(climbs > 0, climbs, 0.0), minlength=n_segments)
+        elevation_gain[has_ele] = gains[has_ele]
+
+    return SegmentMetrics(lengths, turns, turns_per_km, max_angles, mean_angles, straightness, elevation_gain)
+
+
+def metrics_table(segment_ids, metrics, decimals=2):
+    """DataFrame des indicateurs (une ligne par segment, colonnes METRIC_COLUMNS)."""
+    import pandas as pd  # seulement pour le tableau, pas pour le calcul
+
+    table = pd.DataFrame({"Segment": list(segment_ids)})
+    for field, column in METRIC_COLUMNS.items():
+        values = getattr(metrics, field)
+        table[column] = values if field == "turns" else np.round(values, decimals)
+    return table
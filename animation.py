@@ -0,0 +1,158 @@
+"""
+Moteur JavaScript des animations de relais (onglets Animation et Détail).
+
+L'animation avance en fonction du temps écoulé et d'une vitesse simulée en km
+par seconde, et non plus point par point : les distances cumulées de tous les
+points (sommes préfixes) sont calculées une fois au chargement, puis chaque
+image (requestAnimationFrame) ne fait qu'avancer un curseur, ajouter les
+points atteints au tracé en cours (polylignes d'au plus chunkPoints points,
+redessinées une fois par image) et, au plus quelques fois par seconde,
+recentrer la carte. Le coût d'une image ne dépend ni du nombre total de points
+ni de la longueur du segment en cours.
+
+RelayAnimation travaille sur les traces décodées par decodeTraces (trace_codec).
+"""
+
+ANIMATION_ENGINE_JS = """
+        function RelayAnimation(map, traces, options) {
+            var n = traces.length;
+            var color = options.color;
+            var weight = options.weight || 4;
+            var panInterval = options.panIntervalMs || 300;
+            var chunkPoints = options.chunkPoints || 256;
+
+            // Sommes préfixes : premier point global de chaque segment, distance cumulée de chaque point
+            var starts = new Int32Array(n + 1);
+            for (var k = 0; k < n; k++) starts[k + 1] = starts[k] + traces[k].length;
+            var total = starts[n];
+            var cum = new Float64Array(total);
+            var rad = Math.PI / 180, d = 0;
+            for (var k = 0; k < n; k++) {
+                var p = traces[k].points;
+                for (var i = 0; i < traces[k].length; i++) {
+                    if (i > 0) {
+                        var lat1 = p[2 * i - 2] * rad, lat2 = p[2 * i] * rad;
+                        var sLat = Math.sin((lat2 - lat1) / 2), sLon = Math.sin((p[2 * i + 1] - p[2 * i - 1]) * rad / 2);
+                        var a = sLat * sLat + Math.cos(lat1) * Math.cos(lat2) * sLon * sLon;
+                        d += 2 * 6371 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
+                    }
+                    cum[starts[k] + i] = d;
+                }
+            }
+
+            var self = this;
+            this.totalKm = d;
+            this.speedKmPerSec = options.speedKmPerSec;
+            this.playing = false;
+            var state;
+
+            function point(g, k) { return latLng(traces[k].points, g - starts[k]); }
+
+            function report() {
+                if (!options.onProgress) return;
+                var k = Math.max(state.segment, 0);
+                options.onProgress({
+                    segment: n ? traces[k].segment : null,
+                    segmentIndex: k,
+                    point: state.drawn - starts[k] + 1,
+                    segmentPoints: n ? traces[k].length : 0,
+                    travelledKm: state.travelled,
+                    totalKm: self.totalKm,
+                    fraction: self.totalKm > 0 ? state.travelled / self.totalKm : (state.drawn + 1) / Math.max(total, 1)
+                });
+            }
+
+            // Ajoute au tracé tous les points jusqu'à l'indice global g. Les nouveaux points
+            // sont poussés dans les latlngs de la polyligne en cours, redessinée une fois par
+            // image ; Leaflet reprojetant toute la polyligne à chaque redraw, le tracé d'un
+            // segment est découpé en polylignes d'au plus chunkPoints points, jointives :
+            // une image coûte O(chunkPoints + nouveaux points), quelle que soit la longueur du segment.
+            function startPath(first) {
+                state.path = L.polyline(first ? [first] : [], {color: color(state.segment), weight: weight}).addTo(map);
+                state.paths.push(state.path);
+                state.latlngs = state.path.getLatLngs();
+            }
+
+            function drawUpTo(g) {
+                var dirty = false;
+                while (state.drawn < g) {
+                    state.drawn++;
+                    if (state.drawn >= starts[state.segment + 1]) {
+                        if (dirty) state.path.redraw();
+                        while (state.drawn >= starts[state.segment + 1]) state.segment++;
+                        startPath(null);
+                    } else if (state.latlngs.length >= chunkPoints) {
+                        if (dirty) state.path.redraw();
+                        startPath(state.latlngs[state.latlngs.length - 1]);
+                    }
+                    state.latlngs.push(L.latLng(point(state.drawn, state.segment)));
+                    dirty = true;
+                }
+                if (dirty) state.path.redraw();
+            }
+
+            function frame(now) {
+                if (!self.playing) return;
+                var dt = state.lastFrame === null ? 0 : Math.min(now - state.lastFrame, 100);
+                state.lastFrame = now;
+                state.travelled = Math.min(self.totalKm, state.travelled + self.speedKmPerSec * dt / 1000);
+
+                // Curseur monotone : avance amortie en O(1) par image
+                var g = state.drawn;
+                while (g + 1 < total && cum[g + 1] <= state.travelled) g++;
+                var finished = state.travelled >= self.totalKm;
+                drawUpTo(finished ? total - 1 : Math.max(g, 0));
+
+                // Tête interpolée entre le dernier point atteint et le suivant
+                var k = state.segment, head = point(state.drawn, k);
+                if (!finished && state.drawn + 1 < starts[k + 1] && cum[state.drawn + 1] > cum[state.drawn]) {
+                    var next = point(state.drawn + 1, k);
+                    var t = (state.travelled - cum[state.drawn]) / (cum[state.drawn + 1] - cum[state.drawn]);
+                    head = [head[0] + t * (next[0] - head[0]), head[1] + t * (next[1] - head[1])];
+                }
+                state.head.setLatLng(head);
+                if (!map.hasLayer(state.head)) state.head.addTo(map);
+
+                if (now - state.lastPan > panInterval) {
+                    state.lastPan = now;
+                    if (!map.getBounds().pad(-0.2).contains(head)) map.panTo(head);
+                }
+
+                report();
+                if (finished) {
+                    self.playing = false;
+                    if (options.onEnd) options.onEnd();
+                    return;
+                }
+                state.raf = requestAnimationFrame(frame);
+            }
+
+            this.play = function() {
+                if (self.playing || !total) return;
+                if (state.drawn >= total - 1 && state.drawn >= 0) self.reset();
+                self.playing = true;
+                state.lastFrame = null;
+                state.raf = requestAnimationFrame(frame);
+            };
+
+            this.pause = function() {
+                self.playing = false;
+                if (state && state.raf) cancelAnimationFrame(state.raf);
+            };
+
+            this.reset = function() {
+                self.pause();
+                if (state) {
+                    state.paths.forEach(function(path) { map.removeLayer(path); });
+                    map.removeLayer(state.head);
+                }
+                state = {
+                    travelled: 0, drawn: -1, segment: -1, path: null, latlngs: [], paths: [],
+                    head: L.circleMarker([0, 0], {radius: 6, color: '#222', fillColor: '#fff', fillOpacity: 1, weight: 2}),
+                    lastFrame: null, lastPan: -Infinity, raf: null
+                };
+            };
+
+            this.reset();
+        }
+"""
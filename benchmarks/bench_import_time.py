@@ -0,0 +1,99 @@
+"""
+Benchmark du temps d'import au démarrage de display_all_traces.py.
+
+Exécute les imports de niveau module du script (extraits par analyse syntaxique,
+sans lancer l'application) dans un interpréteur neuf avec -X importtime, puis
+affiche le coût cumulé de chaque import de premier niveau. Échoue (code 1) si
+le total dépasse le budget ou si un module à importer paresseusement (folium,
+pandas, matplotlib...) est chargé au démarrage : utilisable tel quel en CI.
+
+    python benchmarks/bench_import_time.py --budget-ms 1200 --repeat 5
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_SCRIPT = os.path.join(ROOT, "display_all_traces.py")
+DEFAULT_BUDGET_MS = 1200.0
+DEFERRED_MODULES = ("folium", "branca", "pandas", "matplotlib", "geopandas", "leafmap", "shapely", "jinja2",
+                    "pyarrow")
+
+
+def startup_imports(script):
+    """Code source des imports de niveau module du script (dans l'ordre)."""
+    with open(script, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=script)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def parse_importtime(stderr):
+    """
+    Lignes 'import time: self | cumulative | module' de -X importtime.
+    Retourne ({module: cumul en µs} pour les imports de premier niveau, modules chargés).
+    """
+    top_level, loaded = {}, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        loaded.add(name.strip())
+        if not name.startswith("  "):  # indentation = profondeur dans l'arbre des imports
+            top_level[name.strip()] = int(cumulative)
+    return top_level, loaded
+
+
+def measure(code, cwd):
+    """Un démarrage à froid : (cumuls des imports de premier niveau, modules chargés)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="script Streamlit à mesurer")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="budget du temps d'import total (meilleur des essais)")
+    parser.add_argument("--repeat", type=int, default=5, help="nombre de démarrages mesurés")
+    parser.add_argument("--top", type=int, default=10, help="nombre d'imports les plus coûteux affichés")
+    parser.add_argument("--deferred", nargs="*", default=list(DEFERRED_MODULES),
+                        help="modules qui ne doivent pas être importés au démarrage")
+    args = parser.parse_args()
+
+    code = startup_imports(args.script)
+    cwd = os.path.dirname(os.path.abspath(args.script))
+    # Modules chargés par l'interpréteur lui-même (site, encodings...) : hors budget
+    interpreter, _ = measure("pass", cwd)
+    runs = []
+    for _ in range(args.repeat):
+        top_level, loaded = measure(code, cwd)
+        runs.append(({name: t for name, t in top_level.items() if name not in interpreter}, loaded))
+    totals = [sum(top_level.values()) / 1000 for top_level, _ in runs]
+    best = min(range(len(runs)), key=totals.__getitem__)
+    top_level, loaded = runs[best]
+
+    print(f"Imports au démarrage de {os.path.basename(args.script)} : "
+          f"{totals[best]:.0f} ms (meilleur de {args.repeat}, médiane {sorted(totals)[len(totals) // 2]:.0f} ms)")
+    for name, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if totals[best] > args.budget_ms:
+        failures.append(f"budget dépassé : {totals[best]:.0f} ms > {args.budget_ms:.0f} ms")
+    eager = sorted(m for m in args.deferred if m in loaded)
+    if eager:
+        failures.append(f"modules chargés au démarrage au lieu d'être différés : {', '.join(eager)}")
+    for failure in failures:
+        print(f"ÉCHEC : {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark de l'ingestion GPX : pool de threads vs pool de processus.
+
+Génère un répertoire synthétique de fichiers relai_<n>.gpx puis chronomètre
+ingest_gpx_files dans chaque mode (sans cache disque).
+
+    python benchmarks/bench_ingestion.py --files 3000 --points 400 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gpx_ingest import INGEST_MODES, ingest_gpx_files  # noqa: E402
+
+
+def write_synthetic_relays(directory, n_files, n_points, seed=0):
+    """Écrit n_files tracés aléatoires autour de Paris (lat, lon, ele, time)."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2025-01-01T08:00:00")
+    files = []
+    for k in range(1, n_files + 1):
+        lat = 48.8566 + np.cumsum(rng.normal(0, 1e-4, n_points))
+        lon = 2.3522 + np.cumsum(rng.normal(0, 1e-4, n_points))
+        ele = 35 + np.cumsum(rng.normal(0, 0.2, n_points))
+        times = start + np.arange(n_points).astype("timedelta64[s]")
+        body = "\n".join(
+            f'      <trkpt lat="{la:.7f}" lon="{lo:.7f}"><ele>{el:.1f}</ele><time>{t}Z</time></trkpt>'
+            for la, lo, el, t in zip(lat, lon, ele, times)
+        )
+        path = os.path.join(directory, f"relai_{k}.gpx")
+        with open(path, "w") as f:
+            f.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="bench" xmlns="http://www.topografix.com/GPX/1/1">\n'
+                f"  <trk><name>Segment_{k}</name><trkseg>\n{body}\n  </trkseg></trk>\n</gpx>\n"
+            )
+        files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=3000, help="nombre de fichiers relai_*.gpx")
+    parser.add_argument("--points", type=int, default=400, help="points par fichier")
+    parser.add_argument("--workers", type=int, default=4, help="taille des pools")
+    parser.add_argument("--max-points", type=int, default=500, help="échantillonnage à la lecture (0 = aucun)")
+    parser.add_argument("--modes", nargs="+", default=list(INGEST_MODES), choices=INGEST_MODES)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="relais_bench_") as directory:
+        t0 = time.perf_counter()
+        files = write_synthetic_relays(directory, args.files, args.points)
+        print(f"{len(files)} fichiers générés en {time.perf_counter() - t0:.2f} s")
+
+        for mode in args.modes:
+            t0 = time.perf_counter()
+            arrays, errors = ingest_gpx_files(
+                files, max_points=args.max_points or None, mode=mode, max_workers=args.workers
+            )
+            elapsed = time.perf_counter() - t0
+            n_points = sum(len(a) for a in arrays)
+            print(f"{mode:>8} : {elapsed:6.2f} s  ({len(files) / elapsed:7.0f} fichiers/s, "
+                  f"{n_points} points, {len(errors)} erreurs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Index des points de coupe candidats pour les algorithmes de découpage.
+
+Les points GPS sont denses (quelques mètres) alors qu'un passage de relais
+n'a de sens qu'à certains endroits. L'index retient :
+- les intersections : points où la trace recroise un autre passage
+  (à moins de intersection_radius_m, avec une direction différente) ;
+- le sommet de chaque virage (angle >= turn_threshold_deg, mesuré sur
+  baseline_m mètres de part et d'autre) ;
+- un point au moins tous les spacing_m mètres le long de la trace,
+  pour que toute longueur de segment reste atteignable ;
+- le premier et le dernier point.
+Les candidats sont indexés spatialement (cKDTree, coordonnées locales en
+mètres) pour les recherches de voisinage.
+"""
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from geometry import angle_difference_deg, bearing_deg, local_xy_m, track_profile
+
+INTERSECTION = 1
+TURN = 2
+SPACING = 4
+ENDPOINT = 8
+
+DEFAULT_SPACING_M = 250.0
+DEFAULT_INTERSECTION_RADIUS_M = 15.0
+DEFAULT_TURN_THRESHOLD_DEG = 25.0
+# Base de mesure des caps et virages : lisse le bruit GPS point à point
+DEFAULT_BASELINE_M = 20.0
+
+
+def baseline_turns(coords, cumulative, baseline_m):
+    """
+    Cap moyen et angle de virage en chaque point, mesurés entre les points situés
+    baseline_m mètres avant et après (insensibles au bruit GPS d'un point à l'autre).
+    Retourne (headings, turns) en degrés ; virage nul aux extrémités.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    before = np.searchsorted(cumulative, cumulative - baseline_m / 1000.0, side='left')
+    after = np.minimum(np.searchsorted(cumulative, cumulative + baseline_m / 1000.0, side='right') - 1, n - 1)
+    lat, lon = coords[:, 0], coords[:, 1]
+    incoming = bearing_deg(lat[before], lon[before], lat, lon)
+    outgoing = bearing_deg(lat, lon, lat[after], lon[after])
+    turns = np.where((before < np.arange(n)) & (after > np.arange(n)), angle_difference_deg(incoming, outgoing), 0.0)
+    return bearing_deg(lat[before], lon[before], lat[after], lon[after]), turns
+
+
+def _run_minima(flagged, score):
+    """Dans chaque suite d'indices consécutifs de flagged (triés), l'indice de score minimal."""
+    if not len(flagged):
+        return flagged
+    run_ids = np.cumsum(np.diff(flagged, prepend=flagged[0] - 2) != 1)
+    order = np.lexsort((score[flagged], run_ids))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = run_ids[order][1:] != run_ids[order][:-1]
+    return flagged[order[first]]
+
+
+def _intersection_points(xy, cumulative, headings, radius_m):
+    """
+    Points où un autre passage de la trace croise celle-ci (à moins de radius_m,
+    direction différente d'au moins 45°) : un point par croisement et par passage,
+    le plus proche de l'autre passage.
+    """
+    n = len(xy)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64)
+    pairs = cKDTree(xy).query_pairs(radius_m, output_type='ndarray')
+    if not len(pairs):
+        return np.zeros(0, dtype=np.int64)
+    i, j = pairs[:, 0], pairs[:, 1]
+    # Autre passage : éloigné le long de la trace (pas un simple voisin)
+    other_pass = np.abs(cumulative[j] - cumulative[i]) * 1000.0 > 4 * radius_m
+    axis = headings % 180  # direction non orientée
+    crossing = angle_difference_deg(2 * axis[i], 2 * axis[j]) / 2 >= 45
+    keep = other_pass & crossing
+    i, j = i[keep], j[keep]
+    gap = np.hypot(*(xy[i] - xy[j]).T)
+    closest = np.full(n, np.inf)
+    np.minimum.at(closest, i, gap)
+    np.minimum.at(closest, j, gap)
+    return _run_minima(np.flatnonzero(np.isfinite(closest)), closest)
+
+
+class CandidateIndex:
+    """
+    Points de coupe candidats d'une trace.
+
+    - indices : indices des points candidats (triés, contiennent 0 et n-1)
+    - kinds   : drapeaux INTERSECTION | TURN | SPACING | ENDPOINT de chaque candidat
+    - n_points : nombre de points de la trace
+    """
+
+    def __init__(self, indices, kinds, coords, n_points):
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.kinds = np.asarray(kinds, dtype=np.int64)
+        self.n_points = n_points
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self._ref_lat = float(coords[:, 0].mean()) if len(coords) else 0.0
+        self._tree = cKDTree(local_xy_m(coords[self.indices], self._ref_lat)) if len(self.indices) else None
+
+    def __len__(self):
+        return len(self.indices)
+
+    @property
+    def reduction(self):
+        """Facteur de réduction de l'espace de recherche (points / candidats)."""
+        return self.n_points / max(len(self), 1)
+
+    def mask(self):
+        """Masque booléen (n_points,) des candidats."""
+        mask = np.zeros(self.n_points, dtype=bool)
+        mask[self.indices] = True
+        return mask
+
+    def counts(self):
+        """Nombre de candidats de chaque type."""
+        return {
+            "intersections": int(np.count_nonzero(self.kinds & INTERSECTION)),
+            "virages": int(np.count_nonzero(self.kinds & TURN)),
+            "espacement": int(np.count_nonzero(self.kinds & SPACING)),
+            "total": len(self)
+        }
+
+    def within(self, lat, lon, radius_m):
+        """Indices (points de la trace) des candidats à moins de radius_m du point donné."""
+        if self._tree is None:
+            return np.zeros(0, dtype=np.int64)
+        found = self._tree.query_ball_point(local_xy_m([(lat, lon)], self._ref_lat)[0], radius_m)
+        return np.sort(self.indices[found])
+
+    def nearest(self, lat, lon, k=1):
+        """Indices (points de la trace) des k candidats les plus proches du point donné."""
+        if self._tree is None:
+            return np.zeros(0, dtype=np.int64)
+        _, found = self._tree.query(local_xy_m([(lat, lon)], self._ref_lat)[0], k=min(k, len(self)))
+        return self.indices[np.atleast_1d(found)]
+
+
+def build_candidate_index(coords, profile=None, spacing_m=DEFAULT_SPACING_M,
+                          turn_threshold_deg=DEFAULT_TURN_THRESHOLD_DEG,
+                          intersection_radius_m=DEFAULT_INTERSECTION_RADIUS_M,
+                          baseline_m=DEFAULT_BASELINE_M):
+    """Construit le CandidateIndex d'une trace (n, 2) lat/lon."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    if not n:
+        return CandidateIndex([], [], coords, 0)
+    if profile is None:
+        profile = track_profile(coords)
+    cumulative = profile.cumulative
+    kinds = np.zeros(n, dtype=np.int64)
+    kinds[[0, n - 1]] |= ENDPOINT
+
+    headings, turns = baseline_turns(coords, cumulative, baseline_m)
+    kinds[_intersection_points(local_xy_m(coords), cumulative, headings, intersection_radius_m)] |= INTERSECTION
+
+    # Sommet de chaque virage : angle maximal de la suite de points au-dessus du seuil
+    kinds[_run_minima(np.flatnonzero(turns >= turn_threshold_deg), -turns)] |= TURN
+
+    # Premier point de chaque tranche de spacing_m mètres
+    marks = np.arange(0.0, profile.total, spacing_m / 1000.0)
+    kinds[np.unique(np.searchsorted(cumulative, marks, side='left').clip(0, n - 1))] |= SPACING
+
+    indices = np.flatnonzero(kinds)
+    return CandidateIndex(indices, kinds[indices], coords, n)
+
+
+def candidate_quality_report(coords, min_km, max_km, index=None, profile=None, **dp_options):
+    """
+    Compare la DP (splitters.split_dp) sur tous les points et sur les seuls
+    candidats : coût (somme des angles de coupe), nombre de segments, écart-type
+    des longueurs, points évalués et durée. Retourne une liste de dicts (une
+    ligne par variante).
+    """
+    from splitters import split_dp
+
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if profile is None:
+        profile = track_profile(coords)
+    if index is None:
+        index = build_candidate_index(coords, profile)
+
+    rows = []
+    for label, candidates in (("Tous les points", None), ("Candidats", index.indices)):
+        start = time.perf_counter()
+        result = split_dp(coords, min_km, max_km, profile=profile, candidates=candidates, **dp_options)
+        rows.append({
+            "Variante": label,
+            "Points évalués": len(coords) if candidates is None else len(candidates),
+            "Segments": len(result.lengths),
+            "Coût (somme des angles, °)": round(result.cost, 2),
+            "Écart-type longueurs (km)": round(float(result.lengths.std()), 3) if len(result.lengths) else 0.0,
+            "Durée (s)": round(time.perf_counter() - start, 3)
+        })
+    base = rows[0]["Coût (somme des angles, °)"]
+    for row in rows:
+        row["Écart de coût (°)"] = round(row["Coût (somme des angles, °)"] - base, 2)
+    return rows
@@ -1,29 +1,27 @@
+# Imports légers uniquement : folium, branca, pandas, shapely et matplotlib sont
+# importés dans les fonctions qui s'en servent, pour que le premier affichage ne
+# paie que ce dont il a besoin (budget vérifié par benchmarks/bench_import_time.py)
 import streamlit as st
-import folium
-import leafmap.foliumap as leafmap
-from streamlit_folium import folium_static
-import gpxpy
 import os
-import glob
-import pandas as pd
 import time
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import matplotlib.colors as mcolors
-from io import BytesIO, StringIO
-import math
-import geopandas as gpd
-from shapely.geometry import LineString
-import branca.colormap as cm
-import concurrent.futures
 import json
-import pickle
 from pathlib import Path
-import hashlib
 import base64
+import hashlib
 import urllib.parse
-import webbrowser
+
+from analytics import metrics_table
+from gpx_cache import GpxFileCache, directory_signature
+from gpx_ingest import ingest_gpx_files
+from gpx_parser import empty_gpx_arrays, parse_gpx
+from manifest import GPX_PATTERN, segment_number, update_manifest
+from map_cache import MapHtmlCache, map_cache_key
+from relay_archive import RelayArchive
+from simplify import density_tolerance, douglas_peucker_importance, simplification_mask
+from animation import ANIMATION_ENGINE_JS
+from trace_codec import DECODER_JS, encode_traces
+from trace_store import TraceStore
 
 # Configuration de la page Streamlit
 st.set_page_config(
@@ -231,6 +229,8 @@ st.markdown("""
 
 CACHE_DIR = Path("cache")
 CACHE_DIR.mkdir(exist_ok=True)
+# Tuiles servies par Streamlit (server.enableStaticServing) sous app/static/tiles/
+TILES_DIR = Path(os.path.dirname(os.path.abspath(__file__))) / "static" / "tiles"
 
 if 'session_id' not in st.session_state:
     st.session_state['session_id'] = str(time.time())
@@ -241,150 +241,202 @@ if 'animation_data' not in st.session_state:
     st.session_state['animation_data'] = None
 
 
-def get_cache_key(directory, segments=None):
-    """Génère une clé de cache basée sur le répertoire et les segments sélectionnés"""
-    key = f"{directory}"
-    if segments:
-        key += f"_{'-'.join(map(str, sorted(segments)))}"
-    return hashlib.md5(key.encode()).hexdigest()
+@st.cache_resource
+def get_gpx_cache():
+    """Cache disque des fichiers GPX parsés, partagé par toutes les sessions."""
+    return GpxFileCache(CACHE_DIR / "gpx")
 
 
-def save_to_cache(data, cache_key):
-    """Sauvegarde les données dans le cache"""
-    cache_file = CACHE_DIR / f"{cache_key}.pkl"
-    with open(cache_file, 'wb') as f:
-        pickle.dump(data, f)
+@st.cache_resource
+def get_map_cache():
+    """Cache LRU du HTML des cartes rendues (mémoire + disque), partagé par toutes les sessions."""
+    return MapHtmlCache(cache_dir=CACHE_DIR / "maps")
 
 
-def load_from_cache(cache_key):
-    """Charge les données depuis le cache si disponibles"""
-    cache_file = CACHE_DIR / f"{cache_key}.pkl"
-    if cache_file.exists():
-        with open(cache_file, 'rb') as f:
-            return pickle.load(f)
-    return None
+@st.cache_data(ttl=3600)
+def load_relay_manifest(directory, signature=None, _max_workers=4):
+    """
+    Manifeste du répertoire (manifest.py) : numéros, fichiers, longueurs et
+    indicateurs de tous les segments, sans parser les GPX tant que manifest.json
+    est à jour. Sinon, seuls les fichiers ajoutés ou modifiés sont parsés, en
+    mémoire : l'application ne réécrit pas manifest.json (dossier éventuellement
+    en lecture seule ou partagé ; il est produit par les notebooks ou manifest.py).
+    'signature' (cf. directory_signature) fait partie de la clé de cache
+    Streamlit : un répertoire régénéré est relu immédiatement.
+    """
+    return update_manifest(directory, max_workers=_max_workers, write=False)
 
 
-@st.cache_data(ttl=3600)
-def load_all_gpx_files(directory):
+@st.cache_resource(ttl=3600)
+def open_relay_archive(directory, signature=None):
     """
-    Charge tous les fichiers relai_*.gpx dans 'directory' et
-    retourne une liste de dicts {segment, points, file}.
+    Archive relais.arc du répertoire, ouverte en mémoire mappée (relay_archive.py),
+    ou None si elle est absente ou si les GPX ont changé depuis son écriture.
     """
-    cache_key = get_cache_key(directory)
-    cached_data = load_from_cache(cache_key)
-    if cached_data:
-        return cached_data
+    return RelayArchive.open(directory, signature)
 
-    if not os.path.exists(directory):
-        st.warning(f"Le répertoire {directory} n'existe pas!")
-        return []
 
-    gpx_files = sorted(
-        glob.glob(os.path.join(directory, "relai_*.gpx")),
-        key=lambda x: int(os.path.basename(x).split('_')[1].split('.')[0])
-    )
+@st.cache_data(ttl=3600)
+def load_gpx_traces(gpx_files, signature=None, _max_workers=4):
+    """
+    Charge les fichiers GPX demandés (tuple de chemins, cf. RelayManifest.paths) et
+    retourne un TraceStore (coordonnées en colonnes, un offset par segment).
 
+    Seuls les segments dessinés sont chargés : depuis l'archive du répertoire si
+    elle est à jour, sinon depuis le cache disque par fichier, les fichiers jamais
+    vus étant répartis sur un pool de '_max_workers' processus.
+    """
+    gpx_files = [gpx_file for gpx_file in gpx_files if os.path.exists(gpx_file)]
     if not gpx_files:
-        st.warning(f"Aucun fichier GPX trouvé dans {directory}")
-        return []
+        return TraceStore.empty()
+
+    archive = open_relay_archive(os.path.dirname(gpx_files[0]), signature) if signature is not None else None
+    if archive is not None:
+        # Chaque segment est lu en mémoire mappée : quelques pages, aucun parsing XML
+        return archive.trace_store([segment_number(gpx_file) for gpx_file in gpx_files], gpx_files)
+
+    gpx_cache = get_gpx_cache()
+    variant = "full"
+    parsed = {gpx_file: gpx_cache.lookup(gpx_file, variant) for gpx_file in gpx_files}
+    missing = [gpx_file for gpx_file, arrays in parsed.items() if arrays is None]
+
+    if missing:
+        # Chargement en parallèle (processus), à pleine résolution : la réduction du
+        # nombre de points est faite à l'affichage (cf. simplify_traces)
+        results, errors = ingest_gpx_files(
+            missing, with_time=False, mode="process", max_workers=_max_workers
+        )
+        for gpx_file, arrays in zip(missing, results):
+            if gpx_file in errors:
+                st.error(f"Erreur lors du chargement de {gpx_file}: {errors[gpx_file]}")
+                parsed[gpx_file] = {'coords': np.empty((0, 2))}
+                continue
+            parsed[gpx_file] = {'coords': arrays.coords}
+            gpx_cache.store(gpx_file, parsed[gpx_file], variant)
 
-    all_traces = []
+    traces = TraceStore.from_arrays(
+        (segment_number(gpx_file), gpx_file, arrays['coords']) for gpx_file, arrays in parsed.items()
+    )
 
-    def process_gpx_file(gpx_file):
-        try:
-            with open(gpx_file, 'r') as f:
-                gpx = gpxpy.parse(f)
-                track_points = []
-                for track in gpx.tracks:
-                    for segment in track.segments:
-                        points = segment.points
-                        # Echantillonnage si > 500 points
-                        if len(points) > 500:
-                            step = len(points) // 500 + 1
-                            points = points[::step]
-
-                        for point in points:
-                            track_points.append((point.latitude, point.longitude))
-
-                segment_num = int(os.path.basename(gpx_file).split('_')[1].split('.')[0])
-                return {
-                    'segment': segment_num,
-                    'points': track_points,
-                    'file': gpx_file
-                }
-        except Exception as e:
-            st.error(f"Erreur lors du chargement de {gpx_file}: {str(e)}")
-            return {'segment': 0, 'points': [], 'file': gpx_file}
+    gpx_cache.flush()
+    gpx_cache.evict()
+    return traces
 
-    # Chargement en parallèle
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        all_traces = list(executor.map(process_gpx_file, gpx_files))
 
-    all_traces = [t for t in all_traces if t is not None]
-    all_traces.sort(key=lambda x: x['segment'])
+@st.cache_data(ttl=3600, show_spinner=False)
+def export_relay_traces(directory, signature, fmt, _max_workers=4):
+    """
+    Export GeoParquet/Arrow (trace_export.py) de tous les segments du répertoire,
+    en octets : les tracés viennent de l'archive quand elle est à jour.
+    """
+    from trace_export import traces_bytes  # pyarrow n'est chargé qu'à l'export
 
-    save_to_cache(all_traces, cache_key)
-    return all_traces
+    manifest = load_relay_manifest(directory, signature, _max_workers)
+    traces = load_gpx_traces(manifest.paths(), signature, _max_workers)
+    return traces_bytes(traces, manifest, fmt)
+
+
+@st.cache_data(ttl=3600)
+def compute_simplification(_traces, traces_key):
+    """
+    Importance Douglas-Peucker (m) de chaque point du store, calculée une fois
+    pour tous les niveaux de simplification. traces_key sert de clé de cache.
+    """
+    return douglas_peucker_importance(_traces.offsets, _traces.coords)
+
+
+@st.cache_data(ttl=3600)
+def simplify_traces(_traces, traces_key, tolerance_m):
+    """Store simplifié : chaque tracé reste à moins de tolerance_m mètres du tracé complet."""
+    if tolerance_m <= 0:
+        return _traces
+    importance = compute_simplification(_traces, traces_key)
+    return _traces.subset(simplification_mask(importance, tolerance_m))
+
+
+@st.cache_resource
+def build_map_tiles(directory, signature, _max_workers=4):
+    """
+    Construit (une fois par état du répertoire) la pyramide de tuiles GeoJSON de la
+    carte d'ensemble et retourne son URL relative. Les tuiles couvrent tous les
+    segments du répertoire : la sélection est filtrée côté client, une seule
+    pyramide sert donc à toutes les sélections.
+    """
+    from tiles import prune_tile_pyramids, write_tile_pyramid
+
+    tiles_key = hashlib.sha1(repr((str(directory), tuple(signature))).encode('utf-8')).hexdigest()[:16]
+    manifest = load_relay_manifest(directory, signature, _max_workers)
+    all_traces = load_gpx_traces(manifest.paths(), signature, _max_workers)
+    importance = compute_simplification(all_traces, all_traces.fingerprint)
+    write_tile_pyramid(all_traces, importance, TILES_DIR / tiles_key)
+    prune_tile_pyramids(TILES_DIR)
+    return f"app/static/tiles/{tiles_key}/"
 
 
 def load_gpx_file_full(file_path):
-    """Charge tous les points d'un fichier GPX sans échantillonnage."""
+    """
+    Charge tous les points d'un fichier GPX sans échantillonnage.
+    Retourne un GpxArrays (colonnes lat, lon, ele, time).
+    """
     try:
-        with open(file_path, 'r') as f:
-            gpx = gpxpy.parse(f)
-            track_points = []
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        track_points.append(
-                            (point.latitude, point.longitude, point.elevation, point.time)
-                        )
-            return track_points
+        return parse_gpx(file_path)
     except Exception as e:
         st.error(f"Erreur lors du chargement de {file_path}: {str(e)}")
-        return []
+        return empty_gpx_arrays()
 
 
 def generate_color_palette(n):
     """Génère une palette de n couleurs distinctes."""
     if n <= 0:
         return []
+    import matplotlib.colors as mcolors
+    import matplotlib.pyplot as plt
+
     color_list = list(plt.cm.rainbow(np.linspace(0, 1, max(1, n))))
     return [mcolors.rgb2hex(color) for color in list(color_list)]
 
 
 @st.cache_data(ttl=3600)
-def convert_to_geojson(traces, selected_segments=None):
-    """Convertit les traces en GeoJSON pour un rendu plus efficace."""
+def convert_to_geojson(_traces, traces_key, selected_segments=None, tolerance_m=0.0):
+    """
+    Convertit les traces en GeoJSON pour un rendu plus efficace.
+    traces_key (empreinte du store) sert de clé de cache à la place de _traces.
+    Les tracés sont simplifiés à tolerance_m mètres (0 = tous les points).
+    """
+    from shapely.geometry import LineString
+
+    traces = _traces
     if not traces:
         return {"type": "FeatureCollection", "features": []}
 
     if not selected_segments:
-        selected_segments = [t['segment'] for t in traces]
+        selected_segments = traces.segment_ids
+
+    simplified = simplify_traces(traces, traces_key, tolerance_m)
+    point_counts = traces.point_counts()
 
     features = []
-    for trace in traces:
-        if trace['segment'] in selected_segments:
-            if not trace['points'] or len(trace['points']) < 2:
-                continue
-            coords = [(p[1], p[0]) for p in trace['points']]  # GeoJSON = (lon, lat)
-            try:
-                line = LineString(coords)  # On vérifie la validité
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "LineString",
-                        "coordinates": coords
-                    },
-                    "properties": {
-                        "segment": trace['segment'],
-                        "nb_points": len(trace['points'])
-                    }
+    for trace in simplified.select(selected_segments):
+        if len(trace.points) < 2:
+            continue
+        lonlat = trace.points[:, ::-1]  # GeoJSON = (lon, lat), vue sans copie
+        try:
+            LineString(lonlat)  # On vérifie la validité
+            feature = {
+                "type": "Feature",
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": lonlat.tolist()
+                },
+                "properties": {
+                    "segment": trace.segment,
+                    "nb_points": int(point_counts[traces.position(trace.segment)]),
+                    "nb_points_affiches": len(trace.points)
                 }
-                features.append(feature)
-            except Exception as e:
-                st.error(f"Erreur pour le segment {trace['segment']}: {str(e)}")
+            }
+            features.append(feature)
+        except Exception as e:
+            st.error(f"Erreur pour le segment {trace.segment}: {str(e)}")
 
     return {
         "type": "FeatureCollection",
@@ -394,12 +446,13 @@ def convert_to_geojson(traces, selected_segments=None):
 
 def create_single_segment_map(trace, with_markers=True):
     """Crée une carte pour un segment donné."""
-    if not trace or not trace.get('points'):
+    import folium.plugins  # importe aussi folium
+
+    if trace is None or len(trace.points) == 0:
         return folium.Map(location=[48.8566, 2.3522], zoom_start=12)
 
-    points = trace['points']
-    center_lat = sum(p[0] for p in points) / len(points)
-    center_lon = sum(p[1] for p in points) / len(points)
+    points = trace.points
+    center_lat, center_lon = points.mean(axis=0)
 
     tile_style = st.session_state['map_style']
     tile_attributions = {
@@ -418,24 +471,24 @@ def create_single_segment_map(trace, with_markers=True):
     )
 
     folium.PolyLine(
-        points,
+        points.tolist(),
         color='blue',
         weight=5,
         opacity=0.8,
-        tooltip=f"Segment {trace['segment']}"
+        tooltip=f"Segment {trace.segment}"
     ).add_to(m)
 
-    if with_markers and points:
+    if with_markers:
         folium.Marker(
-            location=points[0],
-            popup=f"Début du segment {trace['segment']}",
+            location=points[0].tolist(),
+            popup=f"Début du segment {trace.segment}",
             tooltip="Départ",
             icon=folium.Icon(color='green', icon='flag', prefix='fa')
         ).add_to(m)
 
         folium.Marker(
-            location=points[-1],
-            popup=f"Fin du segment {trace['segment']}",
+            location=points[-1].tolist(),
+            popup=f"Fin du segment {trace.segment}",
             tooltip="Arrivée",
             icon=folium.Icon(color='red', icon='flag-checkered', prefix='fa')
         ).add_to(m)
@@ -447,27 +500,63 @@ def create_single_segment_map(trace, with_markers=True):
     return m
 
 
-def create_optimized_map(traces, selected_segments=None):
-    """Crée une carte Folium optimisée en affichant un GeoJSON."""
+def single_segment_map_html(traces, trace, with_markers=True):
+    """HTML de la carte d'un segment, rendu une seule fois par (traces, segment, style, marqueurs)."""
+    key = map_cache_key(
+        "segment", traces.fingerprint, trace.segment, st.session_state['map_style'], with_markers
+    )
+    def render():
+        import folium
+        return folium.Figure().add_child(create_single_segment_map(trace, with_markers)).render()
+
+    return get_map_cache().get(key, render)
+
+
+def relay_animation_html(traces, filtered_traces, tolerance_m):
+    """
+    HTML de l'animation des relais, rendu une seule fois par
+    (traces, segments animés, simplification, vitesse).
+    """
+    key = map_cache_key(
+        "animation", traces.fingerprint, tuple(t.segment for t in filtered_traces), tolerance_m,
+        st.session_state.get('animation_speed_kms', 0.5)
+    )
+    return get_map_cache().get(key, lambda: create_animation_html(filtered_traces, len(filtered_traces)))
+
+
+def single_segment_animation_html(traces, trace):
+    """HTML de l'animation d'un segment, rendu une seule fois par (traces, segment, vitesse)."""
+    key = map_cache_key(
+        "segment_animation", traces.fingerprint, trace.segment,
+        st.session_state.get('segment_animation_speed_kms', 0.2)
+    )
+    return get_map_cache().get(key, lambda: create_segment_animation_html(trace))
+
+
+def create_optimized_map(traces, selected_segments=None, tolerance_m=0.0, tile_url=None):
+    """
+    Crée une carte Folium optimisée en affichant un GeoJSON simplifié à tolerance_m mètres.
+    Avec tile_url (cf. build_map_tiles), les tracés ne sont pas intégrés à la page :
+    le navigateur charge les tuiles visibles, simplifiées selon le zoom.
+    """
+    import branca.colormap as cm
+    import folium.plugins  # importe aussi folium
+
     if not traces:
         return folium.Map(location=[48.8566, 2.3522], zoom_start=12,
                           tiles="CartoDB positron", attr="CartoDB")
 
     if not selected_segments:
-        selected_segments = [t['segment'] for t in traces]
+        selected_segments = traces.segment_ids
 
-    all_points = []
-    for trace in traces:
-        if trace['segment'] in selected_segments and trace['points']:
-            # On prend quelques points pour le calcul du centre
-            sample_points = trace['points'][:1] + trace['points'][-1:]
-            all_points.extend(sample_points)
+    selected_traces = [t for t in traces.select(selected_segments) if len(t.points)]
 
-    if not all_points:
+    if not selected_traces:
         center_lat, center_lon = 48.8566, 2.3522
     else:
-        center_lat = sum(p[0] for p in all_points) / len(all_points)
-        center_lon = sum(p[1] for p in all_points) / len(all_points)
+        # On prend le premier et le dernier point de chaque segment pour le calcul du centre
+        sample_points = np.concatenate([t.points[[0, -1]] for t in selected_traces])
+        center_lat, center_lon = sample_points.mean(axis=0)
 
     tile_style = st.session_state['map_style']
     tile_attributions = {
@@ -485,15 +574,26 @@ def create_optimized_map(traces, selected_segments=None):
         attr=tile_attributions.get(tile_style, 'Map data contributors')
     )
 
-    geojson_data = convert_to_geojson(traces, selected_segments)
+    n_segments = len(traces.select(selected_segments))
+    colormap = cm.linear.YlOrRd_09.scale(1, max(1, n_segments))
+
+    if tile_url:
+        if not selected_traces:
+            st.warning("Aucune trace à afficher pour les segments sélectionnés.")
+            return m
+        from tiles import GeoJsonTileLoader
 
-    if not geojson_data["features"]:
-        st.warning("Aucune trace à afficher pour les segments sélectionnés.")
-        return m
+        GeoJsonTileLoader(
+            tile_url,
+            {t.segment: colormap(t.segment % max(1, n_segments)) for t in selected_traces}
+        ).add_to(m)
+    else:
+        geojson_data = convert_to_geojson(traces, traces.fingerprint, selected_segments, tolerance_m)
+
+        if not geojson_data["features"]:
+            st.warning("Aucune trace à afficher pour les segments sélectionnés.")
+            return m
 
-    n_segments = len([t for t in traces if t['segment'] in selected_segments])
-    if n_segments > 0:
-        colormap = cm.linear.YlOrRd_09.scale(1, max(1, n_segments))
         folium.GeoJson(
             geojson_data,
             name="Segments",
@@ -503,29 +603,28 @@ def create_optimized_map(traces, selected_segments=None):
                 "opacity": 0.7,
             },
             tooltip=folium.GeoJsonTooltip(
-                fields=["segment", "nb_points"],
-                aliases=["Segment", "Nombre de points"],
+                fields=["segment", "nb_points", "nb_points_affiches"],
+                aliases=["Segment", "Nombre de points", "Points affichés"],
                 localize=True
             )
         ).add_to(m)
 
     show_markers = st.session_state.get('show_markers', True)
     if show_markers and len(selected_segments) <= 30:
-        for trace in traces:
-            if trace['segment'] in selected_segments and trace['points']:
-                folium.Marker(
-                    location=trace['points'][0],
-                    popup=f"Début segment {trace['segment']}",
-                    tooltip=f"Début - Segment {trace['segment']}",
-                    icon=folium.Icon(color='green', icon='play', prefix='fa', icon_size=(15, 15))
-                ).add_to(m)
-
-                folium.Marker(
-                    location=trace['points'][-1],
-                    popup=f"Fin segment {trace['segment']}",
-                    tooltip=f"Fin - Segment {trace['segment']}",
-                    icon=folium.Icon(color='red', icon='stop', prefix='fa', icon_size=(15, 15))
-                ).add_to(m)
+        for trace in selected_traces:
+            folium.Marker(
+                location=trace.points[0].tolist(),
+                popup=f"Début segment {trace.segment}",
+                tooltip=f"Début - Segment {trace.segment}",
+                icon=folium.Icon(color='green', icon='play', prefix='fa', icon_size=(15, 15))
+            ).add_to(m)
+
+            folium.Marker(
+                location=trace.points[-1].tolist(),
+                popup=f"Fin segment {trace.segment}",
+                tooltip=f"Fin - Segment {trace.segment}",
+                icon=folium.Icon(color='red', icon='stop', prefix='fa', icon_size=(15, 15))
+            ).add_to(m)
 
     folium.LayerControl().add_to(m)
     folium.plugins.MeasureControl(
@@ -555,9 +654,11 @@ def create_animation_html(traces, max_segments=10, width=800, height=600):
         """
 
     limited_traces = traces[:min(max_segments, len(traces))]
-    animation_speed = st.session_state.get('animation_speed', 100)
+    animation_speed = st.session_state.get('animation_speed_kms', 0.5)
+    # Coordonnées encodées (différences quantifiées, base64) : décodées dans la page en Float32Array
+    payload = json.dumps(encode_traces(limited_traces))
 
-    html = """<!DOCTYPE html>
+    html_head = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -622,29 +723,16 @@ def create_animation_html(traces, max_segments=10, width=800, height=600):
     </div>
     <div id="map"></div>
     <script>
-        var map = L.map('map').setView([48.8566, 2.3522], 13);
+        var map = L.map('map', {preferCanvas: true}).setView([48.8566, 2.3522], 13);
         L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
             attribution: '&copy; OpenStreetMap contributors'
         }).addTo(map);
 
-        var traces = [
-    """
+"""
+
+    html_script = """
+        var traces = decodeTraces(PAYLOAD);
 
-    for trace in limited_traces:
-        if trace['points']:
-            html += f"""{{
-                segment: {trace['segment']},
-                points: {json.dumps(trace['points'])}
-            }},"""
-
-    html += """
-        ];
-
-        var animationId;
-        var currentSegmentIndex = 0;
-        var currentPointIndex = 0;
-        var speed = """ + str(animation_speed) + """;
-        var isPlaying = false;
         var colors = [];
 
         function generateColors(n) {
@@ -656,8 +744,6 @@ def create_animation_html(traces, max_segments=10, width=800, height=600):
 
         generateColors(traces.length);
 
-        var completedPaths = [];
-        var currentPath = null;
         var progressBar = document.getElementById('progress-bar');
         var infoBox = document.getElementById('info');
 
@@ -665,32 +751,17 @@ def create_animation_html(traces, max_segments=10, width=800, height=600):
             if (traces.length === 0) return;
             
             // D'abord centrer sur le premier point avec un zoom approprié
-            if (traces[0] && traces[0].points && traces[0].points.length > 0) {
-                var firstPoint = traces[0].points[0];
-                map.setView([firstPoint[0], firstPoint[1]], 15);
+            if (traces[0] && traces[0].length > 0) {
+                map.setView(latLng(traces[0].points, 0), 15);
             }
             
             // Fonction existante pour calculer les limites (utilisée par le bouton "Voir tout")
             function fitAllBounds() {
-                var allLats = [];
-                var allLngs = [];
-
-                traces.forEach(function(trace) {
-                    trace.points.forEach(function(pt) {
-                        allLats.push(pt[0]);
-                        allLngs.push(pt[1]);
-                    });
-                });
-
-                var minLat = Math.min(...allLats);
-                var maxLat = Math.max(...allLats);
-                var minLng = Math.min(...allLngs);
-                var maxLng = Math.max(...allLngs);
-
-                map.fitBounds([
-                    [minLat, minLng],
-                    [maxLat, maxLng]
-                ]);
+                var first = traces[0].points, last = traces[traces.length - 1].points;
+                // Toutes les vues partagent le même tableau : bornes calculées en une passe
+                var all = new Float32Array(first.buffer, first.byteOffset,
+                    (last.byteOffset + last.byteLength - first.byteOffset) / 4);
+                map.fitBounds(pointsBounds(all));
             }
             
             // Ajouter un bouton pour voir tous les segments
@@ -707,114 +778,59 @@ def create_animation_html(traces, max_segments=10, width=800, height=600):
             }
         }
 
-        function initAnimation() {
-            centerMap();
-            resetAnimation();
-        }
+        var animation = new RelayAnimation(map, traces, {
+            speedKmPerSec: ANIMATION_SPEED,
+            color: function(k) { return colors[k % colors.length]; },
+            weight: 4,
+            onProgress: function(state) {
+                progressBar.style.width = (state.fraction * 100) + '%';
+                infoBox.textContent = `Segment: ${state.segment} (${state.segmentIndex + 1}/${traces.length}) - ` +
+                    `${state.travelledKm.toFixed(2)} / ${state.totalKm.toFixed(2)} km`;
+            },
+            onEnd: function() { infoBox.textContent = 'Animation terminée'; }
+        });
 
         function resetAnimation() {
-            if (animationId) {
-                clearTimeout(animationId);
-            }
-            isPlaying = false;
-            currentSegmentIndex = 0;
-            currentPointIndex = 0;
-
-            completedPaths.forEach(function(path) {
-                map.removeLayer(path);
-            });
-            completedPaths = [];
-
-            if (currentPath) {
-                map.removeLayer(currentPath);
-                currentPath = null;
-            }
-
+            animation.reset();
             progressBar.style.width = '0%';
             infoBox.textContent = 'Cliquez sur Play pour démarrer';
         }
 
-        function animate() {
-            if (currentSegmentIndex >= traces.length) {
-                isPlaying = false;
-                infoBox.textContent = 'Animation terminée';
-                return;
-            }
-
-            var currentTrace = traces[currentSegmentIndex];
-            var points = currentTrace.points;
-
-            if (currentPointIndex === 0) {
-                if (currentPath) {
-                    completedPaths.push(currentPath);
-                }
-                currentPath = L.polyline([], {
-                    color: colors[currentSegmentIndex % colors.length],
-                    weight: 4
-                }).addTo(map);
-            }
-
-            currentPath.addLatLng(points[currentPointIndex]);
-            map.panTo(points[currentPointIndex]);
-
-            var totalPoints = traces.reduce((sum, t) => sum + t.points.length, 0);
-            var pointsProcessed = traces
-                .slice(0, currentSegmentIndex)
-                .reduce((s, t) => s + t.points.length, 0) + currentPointIndex;
-            var progress = (pointsProcessed / totalPoints) * 100;
-            progressBar.style.width = progress + '%';
-
-            infoBox.textContent = `Segment: ${currentTrace.segment} - Point: ${currentPointIndex+1}/${points.length}`;
-
-            currentPointIndex++;
-            if (currentPointIndex >= points.length) {
-                currentSegmentIndex++;
-                currentPointIndex = 0;
-            }
-
-            if (isPlaying) {
-                animationId = setTimeout(animate, speed);
-            }
-        }
-
-        document.getElementById('play').addEventListener('click', function() {
-            if (!isPlaying) {
-                isPlaying = true;
-                animate();
-            }
-        });
-
-        document.getElementById('pause').addEventListener('click', function() {
-            isPlaying = false;
-            if (animationId) {
-                clearTimeout(animationId);
-            }
-        });
-
+        document.getElementById('play').addEventListener('click', animation.play);
+        document.getElementById('pause').addEventListener('click', animation.pause);
         document.getElementById('reset').addEventListener('click', resetAnimation);
 
-        initAnimation();
+        centerMap();
+        resetAnimation();
     </script>
 </body>
 </html>
 """
-    return html
+    return "".join([
+        html_head,
+        DECODER_JS,
+        ANIMATION_ENGINE_JS,
+        "\n        var PAYLOAD = ", payload, ";",
+        "\n        var ANIMATION_SPEED = ", str(animation_speed), ";",
+        html_script
+    ])
 
 
 def create_segment_animation_html(trace, width=800, height=600):
     """
     Crée un code HTML contenant une animation Leaflet pour un seul segment.
     """
-    if not trace or not trace.get('points') or len(trace['points']) < 2:
+    if trace is None or len(trace.points) < 2:
         return """
         <div style="text-align:center;padding:20px;background-color:#f8f9fa;border-radius:5px;">
             <p>Pas assez de points pour créer une animation</p>
         </div>
         """
 
-    animation_speed = st.session_state.get('segment_animation_speed', 100)
+    animation_speed = st.session_state.get('segment_animation_speed_kms', 0.2)
+    payload = json.dumps(encode_traces([trace]))
 
-    html = """<!DOCTYPE html>
+    html_head = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -879,112 +895,62 @@ def create_segment_animation_html(trace, width=800, height=600):
     </div>
     <div id="map"></div>
     <script>
-        var map = L.map('map').setView([48.8566, 2.3522], 13);
+        var map = L.map('map', {preferCanvas: true}).setView([48.8566, 2.3522], 13);
         L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
             attribution: '&copy; OpenStreetMap contributors'
         }).addTo(map);
 
-        var points = """ + json.dumps(trace['points']) + """;
-        var segment = """ + str(trace['segment']) + """;
+"""
 
-        var animationId;
-        var currentPointIndex = 0;
-        var speed = """ + str(animation_speed) + """;
-        var isPlaying = false;
-        var color = '#3366cc';
+    html_script = """
+        var decoded = decodeTraces(PAYLOAD);
+        var points = decoded[0].points;
+        var nPoints = decoded[0].length;
 
-        var path = null;
         var progressBar = document.getElementById('progress-bar');
         var infoBox = document.getElementById('info');
 
         function centerMap() {
-            if (points.length === 0) return;
-            var allLats = [];
-            var allLngs = [];
-
-            points.forEach(function(pt) {
-                allLats.push(pt[0]);
-                allLngs.push(pt[1]);
-            });
-
-            var minLat = Math.min(...allLats);
-            var maxLat = Math.max(...allLats);
-            var minLng = Math.min(...allLngs);
-            var maxLng = Math.max(...allLngs);
-
-            map.fitBounds([
-                [minLat, minLng],
-                [maxLat, maxLng]
-            ]);
+            if (nPoints === 0) return;
+            map.fitBounds(pointsBounds(points));
         }
 
-        function initAnimation() {
-            centerMap();
-            resetAnimation();
-        }
+        var animation = new RelayAnimation(map, decoded, {
+            speedKmPerSec: ANIMATION_SPEED,
+            color: function() { return '#3366cc'; },
+            weight: 5,
+            onProgress: function(state) {
+                progressBar.style.width = (state.fraction * 100) + '%';
+                infoBox.textContent = `Point: ${state.point}/${nPoints} - ` +
+                    `${state.travelledKm.toFixed(2)} / ${state.totalKm.toFixed(2)} km`;
+            },
+            onEnd: function() { infoBox.textContent = 'Animation terminée'; }
+        });
 
         function resetAnimation() {
-            if (animationId) {
-                clearTimeout(animationId);
-            }
-            isPlaying = false;
-            currentPointIndex = 0;
-
-            if (path) {
-                map.removeLayer(path);
-            }
-            path = L.polyline([], {
-                color: color,
-                weight: 5
-            }).addTo(map);
-
+            animation.reset();
             progressBar.style.width = '0%';
             infoBox.textContent = 'Prêt à démarrer';
         }
 
-        function animate() {
-            if (currentPointIndex >= points.length) {
-                isPlaying = false;
-                infoBox.textContent = 'Animation terminée';
-                return;
-            }
-
-            path.addLatLng(points[currentPointIndex]);
-            map.panTo(points[currentPointIndex]);
-
-            var progress = (currentPointIndex / points.length) * 100;
-            progressBar.style.width = progress + '%';
-            infoBox.textContent = `Point: ${currentPointIndex+1}/${points.length}`;
-
-            currentPointIndex++;
-
-            if (isPlaying) {
-                animationId = setTimeout(animate, speed);
-            }
-        }
-
-        document.getElementById('play').addEventListener('click', function() {
-            if (!isPlaying) {
-                isPlaying = true;
-                animate();
-            }
-        });
-
-        document.getElementById('pause').addEventListener('click', function() {
-            isPlaying = false;
-            if (animationId) {
-                clearTimeout(animationId);
-            }
-        });
-
+        document.getElementById('play').addEventListener('click', animation.play);
+        document.getElementById('pause').addEventListener('click', animation.pause);
         document.getElementById('reset').addEventListener('click', resetAnimation);
 
-        initAnimation();
+        centerMap();
+        resetAnimation();
     </script>
 </body>
 </html>
 """
-    return html
+    return "".join([
+        html_head,
+        DECODER_JS,
+        ANIMATION_ENGINE_JS,
+        "\n        var PAYLOAD = ", payload, ";",
+        "\n        var ANIMATION_SPEED = ", str(animation_speed), ";",
+        html_script
+    ])
 
 
 import urllib.parse
@@ -994,7 +960,7 @@ def generate_google_maps_link(points):
     Génère un lien Google Maps pour visualiser l'itinéraire d'un tracé GPX.
     
     Args:
-        points: Liste de tuples (latitude, longitude) représentant le tracé.
+        points: Tableau (n, 2) ou liste de couples (latitude, longitude) représentant le tracé.
     
     Returns:
         str: URL Google Maps complète pour visualiser l'itinéraire.
@@ -1004,7 +970,7 @@ def generate_google_maps_link(points):
         - Utilise les coordonnées décimales pour l'itinéraire principal
         - Ajoute les coordonnées DMS pour le départ et l'arrivée en paramètres informatifs
     """
-    if not points or len(points) < 2:
+    if points is None or len(points) < 2:
         return "https://www.google.com/maps"
     
     # ----------- 1) Échantillonnage des points si trop nombreux (limite URL) ------------
@@ -1064,7 +1030,7 @@ def export_to_gpx(selected_trace):
     Exemple minimal de création d'un contenu GPX en chaîne de caractères.
     Adaptez si vous voulez inclure l'élévation, le temps, etc.
     """
-    if not selected_trace or not selected_trace.get('points'):
+    if selected_trace is None or len(selected_trace.points) == 0:
         return ""
 
     gpx_header = """<?xml version="1.0" encoding="UTF-8"?>
@@ -1072,7 +1038,7 @@ def export_to_gpx(selected_trace):
     <trk>
         <name>Segment_{}</name>
         <trkseg>
-""".format(selected_trace['segment'])
+""".format(selected_trace.segment)
 
     gpx_footer = """        </trkseg>
     </trk>
@@ -1080,7 +1046,7 @@ def export_to_gpx(selected_trace):
 """
 
     gpx_body = ""
-    for lat, lon in selected_trace['points']:
+    for lat, lon in selected_trace.points:
         gpx_body += f"            <trkpt lat=\"{lat}\" lon=\"{lon}\"></trkpt>\n"
 
     return gpx_header + gpx_body + gpx_footer
@@ -1135,11 +1101,20 @@ selected_dir = st.sidebar.selectbox(
 )
 gpx_directory = available_dirs[selected_dir]
 
-# Chargement des données
-with st.spinner('Chargement des données GPX...'):
-    traces = load_all_gpx_files(gpx_directory)
+# Chargement du manifeste : la barre latérale, les filtres et les statistiques
+# n'ont besoin d'aucun tracé ; seuls les segments dessinés sont chargés plus bas
+gpx_signature = directory_signature(gpx_directory, GPX_PATTERN)
+with st.spinner('Lecture du manifeste des segments...'):
+    manifest = load_relay_manifest(
+        gpx_directory,
+        gpx_signature,
+        _max_workers=st.session_state.get('max_workers', 4)
+    )
+
+for gpx_file, message in manifest.errors.items():
+    st.error(f"Erreur lors du chargement de {gpx_file}: {message}")
 
-if not traces:
+if not len(manifest):
     st.error(f"Aucune donnée GPX disponible dans le dossier {gpx_directory}")
     st.stop()
 
@@ -1155,7 +1130,7 @@ filter_mode = st.sidebar.radio(
     ["Tous les segments", "Plage de segments", "Segments spécifiques"],
     key="filter_mode_radio"
 )
-available_segments = [t['segment'] for t in traces]
+available_segments = manifest.segment_ids
 
 if not available_segments:
     st.warning("Pas de segments disponibles dans les fichiers GPX")
@@ -1189,40 +1164,78 @@ else:
         )
 
 selected_segments = st.session_state['selected_segments']
+with st.spinner('Chargement des tracés sélectionnés...'):
+    traces = load_gpx_traces(
+        manifest.paths(selected_segments),
+        gpx_signature,
+        _max_workers=st.session_state.get('max_workers', 4)
+    )
+
+# Options de la carte : dans la barre latérale, donc hors des fragments des onglets
+display_options = st.sidebar.expander("Options d'affichage", expanded=False)
+with display_options:
+    density = st.slider(
+        "Densité des points (1 = tous les points)",
+        min_value=1, max_value=10, value=3,
+        help="Réduire la densité pour améliorer les performances : chaque cran correspond "
+             "à un écart maximal (en mètres) entre le tracé affiché et le tracé complet"
+    )
+    tolerance_m = density_tolerance(density)
+    show_markers = st.checkbox(
+        "Afficher les marqueurs de début/fin",
+        value=True,
+        help="Désactiver pour améliorer les performances"
+    )
+    tile_mode = st.checkbox(
+        "Mode tuiles (zoom adaptatif)",
+        value=False,
+        help="Le navigateur ne charge que les tuiles visibles, simplifiées selon le zoom : "
+             "recommandé pour afficher tout le réseau de segments"
+    )
+st.session_state['show_markers'] = show_markers
+
+
+# Chaque onglet est un fragment : un widget placé dans un onglet ne réexécute que
+# cet onglet. Une réexécution complète (barre latérale) repasse par tous les
+# onglets, mais leurs rendus coûteux (cartes, animations, statistiques) sont
+# relus dans les caches tant que leurs entrées n'ont pas changé.
 
-# Onglets
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
-    "📊 Carte des tracés",
-    "🎬 Animation des relais",
-    "🔍 Détail d'un tracé",
-    "📈 Statistiques",
-    "⚙️ Configuration"
-])
 
 # -------------------------- TAB 1: Carte des tracés --------------------------
-with tab1:
+@st.fragment
+def render_map_tab(manifest, signature, traces, selected_segments, tolerance_m, show_markers, tile_mode):
+    """Onglet 1 : carte d'ensemble des segments sélectionnés."""
     st.header("Visualisation des tracés")
 
-    display_options = st.sidebar.expander("Options d'affichage", expanded=False)
-    with display_options:
-        density = st.slider(
-            "Densité des points (1 = tous les points)",
-            min_value=1, max_value=10, value=3,
-            help="Réduire la densité pour améliorer les performances"
-        )
-        show_markers = st.checkbox(
-            "Afficher les marqueurs de début/fin",
-            value=True,
-            help="Désactiver pour améliorer les performances"
-        )
-    st.session_state['show_markers'] = show_markers
-
-    st.info(f"Affichage de {len(selected_segments)} segments sur {len(available_segments)} disponibles.")
+    st.info(f"Affichage de {len(selected_segments)} segments sur {len(manifest)} disponibles.")
+    displayed_traces = simplify_traces(traces, traces.fingerprint, tolerance_m)
+    shown = traces.select(selected_segments)
+    shown_simplified = displayed_traces.select(selected_segments)
+    st.caption(
+        f"Simplification : écart maximal {tolerance_m:g} m — "
+        f"{sum(len(t.points) for t in shown_simplified)} points affichés sur {sum(len(t.points) for t in shown)}."
+    )
 
     with st.spinner("Génération de la carte..."):
         try:
-            map_obj = create_optimized_map(traces, selected_segments)
-            map_html = map_obj._repr_html_()
+            tile_url = None
+            if tile_mode:
+                if st.get_option("server.enableStaticServing"):
+                    tile_url = build_map_tiles(
+                        manifest.directory, signature, _max_workers=st.session_state.get('max_workers', 4)
+                    )
+                else:
+                    st.warning("Le mode tuiles nécessite server.enableStaticServing = true "
+                               "(cf. .streamlit/config.toml).")
+            # Carte rendue une seule fois par combinaison traces/sélection/style/marqueurs/simplification
+            map_key = map_cache_key(
+                "overview", traces.fingerprint, tuple(selected_segments),
+                st.session_state['map_style'], show_markers, tolerance_m, tile_url
+            )
+            map_html = get_map_cache().get(
+                map_key,
+                lambda: create_optimized_map(traces, selected_segments, tolerance_m, tile_url)._repr_html_()
+            )
             st.session_state['map_data'] = map_html
 
             st.markdown('<div class="map-container">', unsafe_allow_html=True)
@@ -1230,7 +1243,7 @@ with tab1:
             st.markdown('</div>', unsafe_allow_html=True)
 
             if st.button("🔄 Rafraîchir la carte"):
-                st.experimental_rerun()
+                st.rerun(scope="fragment")
 
         except Exception as e:
             st.error(f"Erreur lors de la création de la carte: {str(e)}")
@@ -1239,37 +1252,27 @@ with tab1:
         st.subheader("Informations sur les segments")
         with st.spinner("Calcul des statistiques..."):
             stats_data = []
-            for trace in traces:
-                if trace['segment'] in selected_segments:
-                    if not trace['points'] or len(trace['points']) < 2:
-                        continue
-                    distance = 0.0
-                    for i in range(len(trace['points']) - 1):
-                        lat1, lon1 = trace['points'][i]
-                        lat2, lon2 = trace['points'][i + 1]
-                        R = 6371
-                        dLat = math.radians(lat2 - lat1)
-                        dLon = math.radians(lon2 - lon1)
-                        a = math.sin(dLat / 2) * math.sin(dLat / 2) + \
-                            math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
-                            math.sin(dLon / 2) * math.sin(dLon / 2)
-                        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-                        dist_segment = R * c
-                        distance += dist_segment
-                    stats_data.append({
-                        'Segment': trace['segment'],
-                        'Points': len(trace['points']),
-                        'Distance (km)': round(distance, 2)
-                    })
+            for segment in selected_segments:
+                i = manifest.position(segment)
+                if i is None or manifest.point_counts[i] < 2:
+                    continue
+                stats_data.append({
+                    'Segment': segment,
+                    'Points': int(manifest.point_counts[i]),
+                    'Distance (km)': round(float(manifest.lengths_km[i]), 2)
+                })
 
             if stats_data:
+                import pandas as pd
                 st.dataframe(pd.DataFrame(stats_data), use_container_width=True)
             else:
                 st.info("Aucune statistique disponible pour les segments sélectionnés.")
 
 
 # -------------------------- TAB 2: Animation --------------------------
-with tab2:
+@st.fragment
+def render_animation_tab(manifest, traces, selected_segments, tolerance_m):
+    """Onglet 2 : animation des passages de relais."""
     st.header("Animation des passages de relais")
     st.markdown("""
     <div style='background-color: #f0f2f6; padding: 10px; border-radius: 5px; margin-bottom: 15px;'>
@@ -1282,23 +1285,23 @@ with tab2:
     col1, col2 = st.columns(2)
     with col1:
         animation_speed = st.slider(
-            "Vitesse d'animation (ms)",
-            min_value=50,
-            max_value=500,
-            value=st.session_state.get('animation_speed', 100),
-            step=10,
-            help="Contrôle la vitesse de l'animation (ms entre deux points)"
+            "Vitesse d'animation (km/s)",
+            min_value=0.05,
+            max_value=5.0,
+            value=st.session_state.get('animation_speed_kms', 0.5),
+            step=0.05,
+            help="Distance parcourue par seconde d'animation, quel que soit le nombre de points"
         )
-        st.session_state['animation_speed'] = animation_speed
+        st.session_state['animation_speed_kms'] = animation_speed
     
-    # Filtrer les traces selon les segments sélectionnés
-    filtered_traces = [t for t in traces if t['segment'] in selected_segments]
+    # Filtrer les traces selon les segments sélectionnés (tracés simplifiés comme sur la carte)
+    filtered_traces = simplify_traces(traces, traces.fingerprint, tolerance_m).select(selected_segments)
     
     if not filtered_traces:
         st.warning("Aucun segment sélectionné pour l'animation. Veuillez sélectionner au moins un segment dans les filtres.")
     else:
         with st.spinner("Préparation de l'animation..."):
-            animation_html = create_animation_html(filtered_traces, len(filtered_traces))
+            animation_html = relay_animation_html(traces, filtered_traces, tolerance_m)
             st.session_state['animation_data'] = animation_html
 
             st.markdown('<div class="map-container">', unsafe_allow_html=True)
@@ -1306,13 +1309,15 @@ with tab2:
             st.markdown('</div>', unsafe_allow_html=True)
 
             if st.button("🔄 Rafraîchir l'animation"):
-                st.experimental_rerun()
+                st.rerun(scope="fragment")
 
-        st.info(f"L'animation montre {len(filtered_traces)} segments filtrés sur {len(traces)} au total.")
+        st.info(f"L'animation montre {len(filtered_traces)} segments filtrés sur {len(manifest)} au total.")
 
 
 # -------------------------- TAB 3: Détail d'un tracé --------------------------
-with tab3:
+@st.fragment
+def render_segment_tab(manifest, signature):
+    """Onglet 3 : détail, animation et export d'un segment."""
     st.header("Détail d'un tracé")
     st.markdown("""
     <div style='background-color: #f0f2f6; padding: 10px; border-radius: 5px; margin-bottom: 15px;'>
@@ -1322,19 +1327,23 @@ with tab3:
 
     segment_to_view = st.selectbox(
         "Sélectionner un segment à visualiser",
-        [t['segment'] for t in traces],
+        manifest.segment_ids,
         format_func=lambda x: f"Segment {x}"
     )
-    selected_trace = next((t for t in traces if t['segment'] == segment_to_view), None)
+    # Seul le segment affiché est chargé
+    traces = load_gpx_traces(
+        manifest.paths([segment_to_view]), signature, _max_workers=st.session_state.get('max_workers', 4)
+    )
+    selected_trace = traces.get(segment_to_view)
 
     if selected_trace:
-        st.session_state['segment_animation_speed'] = st.slider(
-            "Vitesse d'animation du segment (ms)",
-            min_value=10,
-            max_value=500,
-            value=st.session_state.get('segment_animation_speed', 100),
-            step=10,
-            help="Contrôle la vitesse de l'animation (ms entre deux points)"
+        st.session_state['segment_animation_speed_kms'] = st.slider(
+            "Vitesse d'animation du segment (km/s)",
+            min_value=0.02,
+            max_value=2.0,
+            value=st.session_state.get('segment_animation_speed_kms', 0.2),
+            step=0.02,
+            help="Distance parcourue par seconde d'animation, quel que soit le nombre de points"
         )
         
         tabs = st.tabs(["📊 Informations", "🎬 Animation", "🗺️ Carte statique"])
@@ -1342,32 +1351,20 @@ with tab3:
         with tabs[0]:
             col1, col2 = st.columns(2)
             with col1:
-                st.subheader(f"Segment {selected_trace['segment']}")
-                if selected_trace['points'] and len(selected_trace['points']) >= 2:
-                    distance = 0.0
-                    for i in range(len(selected_trace['points']) - 1):
-                        lat1, lon1 = selected_trace['points'][i]
-                        lat2, lon2 = selected_trace['points'][i + 1]
-                        R = 6371
-                        dLat = math.radians(lat2 - lat1)
-                        dLon = math.radians(lon2 - lon1)
-                        a = math.sin(dLat/2) * math.sin(dLat/2) + \
-                            math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
-                            math.sin(dLon/2) * math.sin(dLon/2)
-                        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                        dist_segment = R * c
-                        distance += dist_segment
+                st.subheader(f"Segment {selected_trace.segment}")
+                if len(selected_trace.points) >= 2:
+                    distance = manifest.lengths_km[manifest.position(selected_trace.segment)]
 
                     st.metric("Distance", f"{distance:.2f} km")
-                    st.metric("Nombre de points", len(selected_trace['points']))
-                    start_point = selected_trace['points'][0]
-                    end_point = selected_trace['points'][-1]
+                    st.metric("Nombre de points", len(selected_trace.points))
+                    start_point = selected_trace.points[0]
+                    end_point = selected_trace.points[-1]
 
                     st.markdown(f"**Point de départ:** {start_point[0]:.6f}, {start_point[1]:.6f}")
                     st.markdown(f"**Point d'arrivée:** {end_point[0]:.6f}, {end_point[1]:.6f}")
 
                     st.markdown("### Export")
-                    gmaps_url = generate_google_maps_link(selected_trace['points'])
+                    gmaps_url = generate_google_maps_link(selected_trace.points)
                     st.markdown(
                         f'<a href="{gmaps_url}" class="export-btn" target="_blank">🗺️ Ouvrir dans Google Maps</a>',
                         unsafe_allow_html=True
@@ -1377,7 +1374,7 @@ with tab3:
                     if gpx_content:
                         download_link = generate_download_link(
                             gpx_content,
-                            f"segment_{selected_trace['segment']}.gpx",
+                            f"segment_{selected_trace.segment}.gpx",
                             "📥 Télécharger le fichier GPX"
                         )
                         st.markdown(download_link, unsafe_allow_html=True)
@@ -1385,67 +1382,56 @@ with tab3:
                     st.warning("Ce segment ne contient pas suffisamment de points pour calculer des statistiques.")
 
             with col2:
-                segment_map = create_single_segment_map(selected_trace)
+                segment_map_html = single_segment_map_html(traces, selected_trace)
                 st.markdown('<div class="map-container">', unsafe_allow_html=True)
-                folium_static(segment_map, width=600, height=500)
+                st.components.v1.html(segment_map_html, width=600, height=510)
                 st.markdown('</div>', unsafe_allow_html=True)
                 
         with tabs[1]:
             st.subheader("Animation du tracé")
-            if selected_trace['points'] and len(selected_trace['points']) >= 2:
+            if len(selected_trace.points) >= 2:
                 with st.spinner("Préparation de l'animation du segment..."):
-                    segment_animation_html = create_segment_animation_html(selected_trace)
+                    segment_animation_html = single_segment_animation_html(traces, selected_trace)
                     st.markdown('<div class="map-container">', unsafe_allow_html=True)
                     st.components.v1.html(segment_animation_html, height=600, scrolling=False)
                     st.markdown('</div>', unsafe_allow_html=True)
                     
-                    st.info(f"Animation basée sur les {len(selected_trace['points'])} points du segment {selected_trace['segment']}.")
-                    
-                    if len(selected_trace['points']) > 500:
-                        st.warning(f"Ce segment contient beaucoup de points ({len(selected_trace['points'])}). L'animation peut être lente sur certains appareils.")
+                    st.info(f"Animation basée sur les {len(selected_trace.points)} points du segment {selected_trace.segment}.")
+
             else:
                 st.warning("Ce segment ne contient pas suffisamment de points pour l'animation.")
                 
         with tabs[2]:
             st.subheader("Carte statique")
-            segment_map = create_single_segment_map(selected_trace)
+            segment_map_html = single_segment_map_html(traces, selected_trace)
             st.markdown('<div class="map-container">', unsafe_allow_html=True)
-            folium_static(segment_map, width=800, height=600)
+            st.components.v1.html(segment_map_html, width=800, height=610)
             st.markdown('</div>', unsafe_allow_html=True)
     else:
         st.error(f"Segment {segment_to_view} introuvable dans les traces.")
 
 
 # -------------------------- TAB 4: Statistiques --------------------------
-with tab4:
+@st.fragment
+def render_statistics_tab(manifest, signature):
+    """Onglet 4 : statistiques et indicateurs par segment, lus dans le manifeste."""
     st.header("📈 Statistiques détaillées")
     with st.spinner("Calcul des statistiques..."):
-        total_segments = len(traces)
-        total_points = sum(len(t['points']) for t in traces)
-        total_distance = 0
-        segment_distances = []
-
-        for trace in traces:
-            if trace['points'] and len(trace['points']) >= 2:
-                distance = 0
-                for i in range(len(trace['points']) - 1):
-                    lat1, lon1 = trace['points'][i]
-                    lat2, lon2 = trace['points'][i + 1]
-                    R = 6371
-                    dLat = math.radians(lat2 - lat1)
-                    dLon = math.radians(lon2 - lon1)
-                    a = math.sin(dLat/2) * math.sin(dLat/2) + \
-                        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
-                        math.sin(dLon/2) * math.sin(dLon/2)
-                    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                    dist = R * c
-                    distance += dist
-                segment_distances.append(distance)
-                total_distance += distance
+        total_segments = len(manifest)
+        total_points = manifest.n_points
+        total_distance = manifest.total_km
+        # Les segments de moins de 2 points n'ont pas de distance mesurable
+        measured = manifest.point_counts >= 2
+        segment_distances = manifest.lengths_km[measured]
 
         avg_distance = total_distance / total_segments if total_segments > 0 else 0
-        max_distance = max(segment_distances) if segment_distances else 0
-        min_distance = min(segment_distances) if segment_distances else 0
+        max_distance = segment_distances.max() if len(segment_distances) else 0
+        min_distance = segment_distances.min() if len(segment_distances) else 0
+        analytics = manifest.metrics
+        total_turns = int(analytics.turns.sum())
+        turns_per_km = total_turns / total_distance if total_distance > 0 else 0
+        avg_straightness = analytics.straightness[measured].mean() if measured.any() else 0
+        total_gain = np.nansum(analytics.elevation_gain_m)
 
     st.markdown("<h3 style='text-align: center;'>Statistiques globales</h3>", unsafe_allow_html=True)
     col1, col2, col3, col4 = st.columns(4)
@@ -1490,28 +1476,66 @@ with tab4:
             unsafe_allow_html=True
         )
 
+    col1, col2, col3, col4 = st.columns(4)
+    for col, title, value in (
+        (col1, f"Virages (≥ {manifest.turn_threshold_deg:.0f}°)", f"{total_turns}"),
+        (col2, "Virages/km", f"{turns_per_km:.2f}"),
+        (col3, "Rectitude moyenne", f"{avg_straightness:.2f}"),
+        (col4, "Dénivelé positif", f"{total_gain:.0f} m"),
+    ):
+        with col:
+            st.markdown(
+                f"""
+                <div class='stat-card'>
+                    <h3>{title}</h3>
+                    <p>{value}</p>
+                </div>
+                """,
+                unsafe_allow_html=True
+            )
+
     st.subheader("Distribution des distances par segment")
-    stats_df = pd.DataFrame({
-        'Segment': [t['segment'] for t in traces],
-        'Points': [len(t['points']) for t in traces],
-        'Distance (km)': segment_distances if segment_distances else [0]*len(traces)
-    })
+    stats_df = metrics_table(manifest.segment_ids, analytics)
+    stats_df.insert(1, 'Points', manifest.point_counts)
     st.bar_chart(stats_df.set_index('Segment')['Distance (km)'])
 
+    st.subheader("Virages par km et par segment")
+    st.bar_chart(stats_df.set_index('Segment')['Virages/km'])
+
     st.subheader("Données détaillées par segment")
     st.dataframe(stats_df, use_container_width=True)
 
-    csv = stats_df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'data:file/csv;base64,{b64}'
+    st.download_button(
+        "📥 Télécharger les statistiques (CSV)",
+        stats_df.to_csv(index=False),
+        file_name="paris_run_stats.csv",
+        mime="text/csv"
+    )
+
+    st.subheader("Export des tracés")
     st.markdown(
-        f'<a href="{href}" download="paris_run_stats.csv" class="export-btn">📥 Télécharger les statistiques (CSV)</a>',
-        unsafe_allow_html=True
+        "Tous les segments du répertoire, avec leurs indicateurs, en un seul fichier "
+        "columnaire (géométrie WKB), lisible par pandas, geopandas ou DuckDB."
     )
+    export_format = st.radio("Format", ["GeoParquet", "Arrow IPC"], horizontal=True)
+    if st.checkbox("Préparer l'export de tous les tracés"):
+        fmt = "parquet" if export_format == "GeoParquet" else "arrow"
+        with st.spinner("Préparation de l'export..."):
+            content = export_relay_traces(
+                manifest.directory, signature, fmt, _max_workers=st.session_state.get('max_workers', 4)
+            )
+        st.download_button(
+            f"📥 Télécharger les tracés ({export_format})",
+            content,
+            file_name=f"paris_run_segments.{fmt}",
+            mime="application/vnd.apache.parquet" if fmt == "parquet" else "application/vnd.apache.arrow.file"
+        )
 
 
 # -------------------------- TAB 5: Configuration --------------------------
-with tab5:
+@st.fragment
+def render_configuration_tab():
+    """Onglet 5 : configuration et gestion des caches."""
     st.header("⚙️ Configuration avancée")
     st.markdown("""
     <div style='background-color: #f0f2f6; padding: 10px; border-radius: 5px; margin-bottom: 15px;'>
@@ -1536,7 +1560,8 @@ with tab5:
             min_value=1,
             max_value=16,
             value=4,
-            help="Contrôle le nombre de tâches exécutées en parallèle"
+            key="max_workers",
+            help="Nombre de processus utilisés pour parser les fichiers GPX au chargement"
         )
 
     st.subheader("Affichage")
@@ -1553,12 +1578,17 @@ with tab5:
     st.subheader("Gestion du cache")
     col1, col2 = st.columns(2)
     with col1:
+        st.caption(f"Cache disque des GPX : {get_gpx_cache().size_bytes() / 1e6:.1f} Mo")
         if st.button("🗑️ Vider le cache complet"):
-            for file in CACHE_DIR.glob("*.pkl"):
-                try:
-                    file.unlink()
-                except Exception as e:
-                    st.error(f"Erreur lors de la suppression du cache: {str(e)}")
+            try:
+                from tiles import prune_tile_pyramids
+
+                get_gpx_cache().clear()
+                get_map_cache().clear()
+                prune_tile_pyramids(TILES_DIR, keep=0)
+                build_map_tiles.clear()
+            except Exception as e:
+                st.error(f"Erreur lors de la suppression du cache: {str(e)}")
             st.cache_data.clear()
             st.success("Cache vidé avec succès!")
 
@@ -1566,7 +1596,7 @@ with tab5:
         if st.button("🔄 Recharger toutes les données"):
             st.cache_data.clear()
             st.success("Cache Streamlit vidé, les données seront rechargées au prochain accès.")
-            st.experimental_rerun()
+            st.rerun()
 
     st.subheader("À propos")
     st.info("""
@@ -1576,3 +1606,23 @@ with tab5:
 
     Pour toute question ou suggestion d'amélioration, contactez l'administrateur.
     """)
+
+
+# Onglets
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    "📊 Carte des tracés",
+    "🎬 Animation des relais",
+    "🔍 Détail d'un tracé",
+    "📈 Statistiques",
+    "⚙️ Configuration"
+])
+with tab1:
+    render_map_tab(manifest, gpx_signature, traces, selected_segments, tolerance_m, show_markers, tile_mode)
+with tab2:
+    render_animation_tab(manifest, traces, selected_segments, tolerance_m)
+with tab3:
+    render_segment_tab(manifest, gpx_signature)
+with tab4:
+    render_statistics_tab(manifest, gpx_signature)
+with tab5:
+    render_configuration_tab()
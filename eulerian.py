@@ -0,0 +1,150 @@
+"""
+Circuit eulérien à virages minimaux sur le graphe des rues (street_graph.StreetGraph).
+
+Algorithme de Hierholzer sur des tableaux : chaque arête du multigraphe
+(arêtes du graphe + arêtes dupliquées par l'appariement, cf. matching.py)
+apparaît deux fois dans l'adjacence CSR de ses extrémités, une fois par sens.
+Les caps de départ et d'arrivée de chaque sens sont précalculés à partir du
+premier et du dernier tronçon de la géométrie. En chaque nœud, on emprunte
+l'arête libre qui minimise l'angle de virage par rapport au cap d'arrivée
+(à égalité, la première dans l'ordre d'adjacence) ; un pointeur par nœud
+saute les arêtes déjà empruntées. Le circuit est écrit directement en GPX.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from geometry import angle_difference_deg, bearing_deg
+
+
+class EulerCircuit(NamedTuple):
+    """Circuit eulérien : suite d'arêtes du StreetGraph et sens de parcours."""
+    edges: np.ndarray    # (k,) indice de l'arête (StreetGraph) à chaque étape
+    forward: np.ndarray  # (k,) True si l'arête est parcourue de edge_u vers edge_v
+    nodes: np.ndarray    # (k+1,) nœuds successifs (indices StreetGraph)
+    turns: np.ndarray    # (k-1,) angle de virage entre étapes consécutives (degrés)
+    length_km: float
+
+
+def edge_end_bearings(graph):
+    """
+    Caps (degrés) de chaque arête, parcourue de u vers v : (départ de u, arrivée en v),
+    calculés sur le premier et le dernier tronçon de sa géométrie.
+    """
+    offsets = np.asarray(graph.geom_offsets)
+    coords = np.asarray(graph.geom_coords)
+    first, last = offsets[:-1], offsets[1:] - 1
+    # Géométrie réduite à un point (boucle dégénérée) : cap nul
+    second, before_last = np.minimum(first + 1, last), np.maximum(last - 1, first)
+    depart = bearing_deg(coords[first, 0], coords[first, 1], coords[second, 0], coords[second, 1])
+    arrive = bearing_deg(coords[before_last, 0], coords[before_last, 1], coords[last, 0], coords[last, 1])
+    return depart, arrive
+
+
+def eulerian_circuit(graph, source, extra_edges=()):
+    """
+    Circuit eulérien à virages minimaux depuis le nœud source (indice StreetGraph),
+    sur les arêtes du graphe plus extra_edges (indices d'arêtes à dupliquer).
+    Lève ValueError si le multigraphe n'est pas eulérien.
+    """
+    base = np.concatenate((np.arange(graph.n_edges, dtype=np.int64), np.asarray(extra_edges, dtype=np.int64)))
+    u = np.asarray(graph.edge_u, dtype=np.int64)[base]
+    v = np.asarray(graph.edge_v, dtype=np.int64)[base]
+    degree = np.bincount(u, minlength=graph.n_nodes) + np.bincount(v, minlength=graph.n_nodes)
+    if (degree % 2).any():
+        raise ValueError(f"Graphe non eulérien : {int(np.count_nonzero(degree % 2))} nœuds de degré impair")
+
+    # Adjacence CSR des demi-arêtes : (arête du multigraphe, sens) ; sens 0 = u -> v
+    m = len(base)
+    tails = np.concatenate((u, v))
+    order = np.argsort(tails, kind='stable')
+    indptr = np.zeros(graph.n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=graph.n_nodes), out=indptr[1:])
+    half_edge = np.concatenate((np.arange(m), np.arange(m)))[order].tolist()
+    half_dir = np.concatenate((np.zeros(m, dtype=np.int64), np.ones(m, dtype=np.int64)))[order].tolist()
+    heads = [v.tolist(), u.tolist()]
+
+    depart_uv, arrive_uv = edge_end_bearings(graph)
+    # Sens v -> u : caps des mêmes tronçons, retournés
+    depart = [depart_uv[base].tolist(), ((arrive_uv[base] + 180) % 360).tolist()]
+    arrive = [arrive_uv[base].tolist(), ((depart_uv[base] + 180) % 360).tolist()]
+
+    used = bytearray(m)
+    pointer = indptr[:-1].tolist()
+    ends = indptr[1:].tolist()
+    stack = [(source, -1, 0)]  # (nœud, arête du multigraphe par laquelle on y est arrivé, sens)
+    steps = []
+    while stack:
+        node, arrived_by, arrived_dir = stack[-1]
+        # Pointeur : saute les arêtes déjà empruntées en tête de liste
+        p = pointer[node]
+        while p < ends[node] and used[half_edge[p]]:
+            p += 1
+        pointer[node] = p
+        if p == ends[node]:
+            stack.pop()
+            if arrived_by >= 0:
+                steps.append((arrived_by, arrived_dir))
+            continue
+
+        best = p
+        if arrived_by >= 0:
+            heading = arrive[arrived_dir][arrived_by]
+            best_turn = 181.0
+            for q in range(p, ends[node]):
+                e = half_edge[q]
+                if used[e]:
+                    continue
+                diff = abs(heading - depart[half_dir[q]][e]) % 360
+                turn = min(diff, 360 - diff)
+                if turn < best_turn:
+                    best, best_turn = q, turn
+        e, direction = half_edge[best], half_dir[best]
+        used[e] = 1
+        stack.append((heads[direction][e], e, direction))
+
+    if len(steps) != m:
+        raise ValueError("Graphe non connexe : certaines arêtes ne sont pas atteintes depuis la source")
+
+    steps.reverse()
+    step_edges = np.array([e for e, _ in steps], dtype=np.int64)
+    forward = np.array([direction == 0 for _, direction in steps], dtype=bool)
+    nodes = np.empty(m + 1, dtype=np.int64)
+    nodes[0] = source
+    nodes[1:] = np.where(forward, v[step_edges], u[step_edges])
+    depart_steps = np.where(forward, depart_uv[base[step_edges]], (arrive_uv[base[step_edges]] + 180) % 360)
+    arrive_steps = np.where(forward, arrive_uv[base[step_edges]], (depart_uv[base[step_edges]] + 180) % 360)
+    turns = angle_difference_deg(arrive_steps[:-1], depart_steps[1:])
+    length_km = float(np.asarray(graph.edge_length)[base].sum()) / 1000
+    return EulerCircuit(base[step_edges], forward, nodes, turns, length_km)
+
+
+def circuit_coords(graph, circuit):
+    """Points (n, 2) lat/lon du circuit, géométries bout à bout (points de jonction non répétés)."""
+    offsets = np.asarray(graph.geom_offsets)
+    coords = np.asarray(graph.geom_coords)
+    starts, stops = offsets[circuit.edges], offsets[circuit.edges + 1]
+    counts = stops - starts
+    if not len(counts):
+        return np.empty((0, 2))
+    # Indices des points de chaque arête, dans le sens de parcours, sans son premier point
+    # (sauf pour la première arête)
+    step_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=step_offsets[1:])
+    within = np.arange(step_offsets[-1]) - np.repeat(step_offsets[:-1], counts)
+    step = np.repeat(np.arange(len(counts)), counts)
+    index = np.where(circuit.forward[step], starts[step] + within, stops[step] - 1 - within)
+    keep = (within > 0) | (step == 0)
+    return coords[index[keep]]
+
+
+def write_circuit_gpx(graph, circuit, path, name="Circuit eulérien"):
+    """Écrit le circuit dans un fichier GPX (une trace, un segment)."""
+    points = circuit_coords(graph, circuit)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="Chinese_sub_optimal_improved" xmlns="http://www.topografix.com/GPX/1/1">\n'
+                f'  <trk>\n    <name>{name}</name>\n    <trkseg>\n')
+        f.writelines(f'      <trkpt lat="{lat!r}" lon="{lon!r}"></trkpt>\n' for lat, lon in points.tolist())
+        f.write('    </trkseg>\n  </trk>\n</gpx>\n')
+    return len(points)
@@ -0,0 +1,252 @@
+"""
+Géocodage inverse hors ligne, à partir des noms de rues du graphe OSM.
+
+StreetIndex échantillonne les arêtes nommées du graphe (Chinese_sub_optimal_improved.ipynb)
+tous les sample_m mètres et range ces points dans un cKDTree : l'adresse d'une
+coordonnée est le nom de la rue la plus proche (dans un rayon max_distance_m).
+Une requête coûte quelques microsecondes, sans réseau ni limite de débit.
+L'index se sauvegarde en .npz (STREET_INDEX_FILE).
+
+ReverseGeocoder ajoute un mémo persistant (JSON) des coordonnées déjà résolues
+et, en dernier recours, un géocodeur en ligne (Nominatim) limité à une requête
+par seconde.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from geometry import local_xy_m
+from street_graph import edge_name
+
+STREET_INDEX_FILE = "streets_index.npz"
+DEFAULT_SAMPLE_M = 10.0
+DEFAULT_MAX_DISTANCE_M = 150.0
+NOT_FOUND = "Adresse introuvable"
+
+
+def densify(coords, sample_m):
+    """Points (lat, lon) le long d'une polyligne, espacés d'au plus sample_m mètres."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < 2:
+        return coords
+    xy = local_xy_m(coords)
+    along = np.zeros(len(coords))
+    np.cumsum(np.hypot(*np.diff(xy, axis=0).T), out=along[1:])
+    samples = np.linspace(0.0, along[-1], max(2, int(np.ceil(along[-1] / sample_m)) + 1))
+    return np.column_stack((np.interp(samples, along, coords[:, 0]), np.interp(samples, along, coords[:, 1])))
+
+
+class StreetIndex:
+    """
+    Points échantillonnés des rues nommées, indexés spatialement.
+
+    - lat, lon : coordonnées des points échantillonnés
+    - name_ids : indice du nom (dans names) de chaque point
+    - locality : suffixe ajouté aux adresses (ex. "Paris, France")
+    """
+
+    def __init__(self, lat, lon, name_ids, names, locality=""):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.name_ids = np.asarray(name_ids, dtype=np.int64)
+        self.names = list(names)
+        self.locality = locality
+        coords = np.column_stack((self.lat, self.lon))
+        self._ref_lat = float(self.lat.mean()) if len(self.lat) else 0.0
+        self._tree = cKDTree(local_xy_m(coords, self._ref_lat)) if len(coords) else None
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_lines(cls, lines, sample_m=DEFAULT_SAMPLE_M, locality=""):
+        """Construit l'index à partir d'un itérable de (nom, polyligne (n, 2) lat/lon)."""
+        names, name_positions = [], {}
+        lat, lon, name_ids = [], [], []
+        for name, coords in lines:
+            points = densify(coords, sample_m)
+            if not len(points):
+                continue
+            name_id = name_positions.setdefault(name, len(names))
+            if name_id == len(names):
+                names.append(name)
+            lat.append(points[:, 0])
+            lon.append(points[:, 1])
+            name_ids.append(np.full(len(points), name_id))
+        if not names:
+            return cls([], [], [], [], locality)
+        return cls(np.concatenate(lat), np.concatenate(lon), np.concatenate(name_ids), names, locality)
+
+    @classmethod
+    def from_graph(cls, graph, sample_m=DEFAULT_SAMPLE_M, locality=""):
+        """
+        Construit l'index à partir d'un graphe OSMnx/NetworkX : arêtes ayant un
+        attribut 'name', géométrie 'geometry' (LineString lon/lat) ou, à défaut,
+        segment entre les nœuds (attributs x, y).
+        """
+        def lines():
+            for u, v, data in graph.edges(data=True):
+                if 'name' not in data:
+                    continue
+                if 'geometry' in data:
+                    lonlat = np.asarray(data['geometry'].coords, dtype=np.float64)
+                else:
+                    lonlat = np.array([(graph.nodes[u]['x'], graph.nodes[u]['y']),
+                                       (graph.nodes[v]['x'], graph.nodes[v]['y'])])
+                yield edge_name(data['name']), lonlat[:, ::-1]
+        return cls.from_lines(lines(), sample_m, locality)
+
+    def save(self, path=STREET_INDEX_FILE):
+        np.savez_compressed(path, lat=self.lat, lon=self.lon, name_ids=self.name_ids,
+                            names=np.array(self.names, dtype=str), locality=np.array(self.locality))
+
+    @classmethod
+    def load(cls, path=STREET_INDEX_FILE):
+        with np.load(path) as data:
+            return cls(data['lat'], data['lon'], data['name_ids'], data['names'].tolist(), str(data['locality']))
+
+    def query(self, coords, max_distance_m=DEFAULT_MAX_DISTANCE_M):
+        """
+        Rue la plus proche de chaque point (n, 2) lat/lon, en une requête vectorisée.
+        Retourne (adresses, distances en m) ; adresse None au-delà de max_distance_m.
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if self._tree is None or not len(coords):
+            return [None] * len(coords), np.full(len(coords), np.inf)
+        distances, nearest = self._tree.query(local_xy_m(coords, self._ref_lat), distance_upper_bound=max_distance_m)
+        found = np.isfinite(distances)
+        addresses = [None] * len(coords)
+        for i in np.flatnonzero(found):
+            name = self.names[self.name_ids[nearest[i]]]
+            addresses[i] = f"{name}, {self.locality}" if self.locality else name
+        return addresses, distances
+
+    def reverse(self, lat, lon, max_distance_m=DEFAULT_MAX_DISTANCE_M):
+        """Adresse (rue la plus proche) d'un point, ou None."""
+        return self.query([(lat, lon)], max_distance_m)[0][0]
+
+
+class ReverseGeocoder:
+    """
+    Géocodage inverse : mémo persistant, puis index des rues hors ligne, puis
+    géocodeur en ligne optionnel (online(lat, lon) -> adresse ou None, peut
+    lever une exception), appelé au plus une fois toutes les
+    min_online_interval_s secondes.
+
+    Les coordonnées sont arrondies à precision décimales (5 : ~1 m) pour le mémo.
+    """
+
+    def __init__(self, index=None, memo_file=None, max_distance_m=DEFAULT_MAX_DISTANCE_M,
+                 precision=5, min_online_interval_s=1.0):
+        self.index = index
+        self.memo_file = Path(memo_file) if memo_file else None
+        self.max_distance_m = max_distance_m
+        self.precision = precision
+        self.min_online_interval_s = min_online_interval_s
+        self._memo = self._load_memo()
+        self._lock = threading.Lock()
+        self._last_online = 0.0
+        self.stats = {"memo": 0, "offline": 0, "online": 0, "not_found": 0, "errors": 0}
+
+    @classmethod
+    def open(cls, index_file=STREET_INDEX_FILE, memo_file=None, **options):
+        """Géocodeur sur l'index sauvegardé dans index_file (sans index s'il n'existe pas)."""
+        index = StreetIndex.load(index_file) if index_file and os.path.exists(index_file) else None
+        return cls(index, memo_file, **options)
+
+    def _load_memo(self):
+        if not self.memo_file:
+            return {}
+        try:
+            with open(self.memo_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data.get("addresses", {}) if data.get("precision") == self.precision else {}
+
+    def save(self):
+        """Écrit le mémo sur disque (écriture atomique)."""
+        if not self.memo_file:
+            return
+        with self._lock:
+            content = {"precision": self.precision, "addresses": dict(self._memo)}
+        self.memo_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.memo_file.with_name(f"{self.memo_file.name}.{threading.get_ident()}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(content, f, ensure_ascii=False)
+        os.replace(tmp, self.memo_file)
+
+    def _key(self, lat, lon):
+        return f"{lat:.{self.precision}f},{lon:.{self.precision}f}"
+
+    def _online(self, online, lat, lon):
+        wait = self._last_online + self.min_online_interval_s - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            return online(lat, lon)
+        finally:
+            self._last_online = time.monotonic()
+
+    def reverse(self, lat, lon, online=None):
+        """
+        Adresse d'un point : NOT_FOUND si aucune source ne la connaît,
+        "Erreur: ..." si le géocodeur en ligne échoue (exception).
+        """
+        key = self._key(lat, lon)
+        address = self._memo.get(key)
+        if address is not None:
+            self.stats["memo"] += 1
+            return address
+
+        from_online = False
+        if self.index is not None:
+            address = self.index.reverse(lat, lon, self.max_distance_m)
+        if address is not None:
+            self.stats["offline"] += 1
+        elif online is not None:
+            try:
+                address = self._online(online, lat, lon)
+            except Exception as e:
+                # Erreur non mémorisée : le point sera retenté au prochain appel
+                self.stats["errors"] += 1
+                return f"Erreur: {str(e)[:100]}"
+            self.stats["online"] += 1
+            from_online = True
+        if address is None:
+            self.stats["not_found"] += 1
+            return NOT_FOUND
+
+        with self._lock:
+            self._memo[key] = address
+        if from_online:
+            self.save()  # résultat en ligne : coûteux à obtenir, sauvegardé aussitôt
+        return address
+
+    def reverse_many(self, coords, online=None):
+        """
+        Adresses d'une série de points (n, 2) lat/lon : mémo, puis une seule requête
+        d'index pour tous les points non mémorisés, puis reverse (en ligne) pour les autres.
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        keys = [self._key(lat, lon) for lat, lon in coords]
+        results = [self._memo.get(key) for key in keys]
+        missing = [i for i, address in enumerate(results) if address is None]
+        self.stats["memo"] += len(results) - len(missing)
+        if self.index is not None and missing:
+            addresses, _ = self.index.query(coords[missing], self.max_distance_m)
+            with self._lock:
+                for i, address in zip(missing, addresses):
+                    if address is not None:
+                        self._memo[keys[i]] = results[i] = address
+                        self.stats["offline"] += 1
+        for i in missing:
+            if results[i] is None:
+                results[i] = self.reverse(*coords[i], online)
+        self.save()
+        return results
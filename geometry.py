@@ -0,0 +1,183 @@
+"""
+Calculs de distances et de caps vectorisés (NumPy) partagés par l'application
+et les notebooks de découpage.
+
+Toutes les fonctions travaillent sur des tableaux : aucune boucle Python par
+paire de points. haversine_km (sphère) suffit pour l'affichage ; vincenty_km
+(ellipsoïde WGS84, précision de geopy.distance.geodesic) sert au découpage.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Ellipsoïde WGS84
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B_KM = WGS84_A_KM * (1 - WGS84_F)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance haversine (km) entre deux séries de points, en degrés."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def step_distances_km(coords):
+    """Distances (km) entre points consécutifs d'un tableau (n, 2) lat/lon."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < 2:
+        return np.zeros(0)
+    return haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+
+
+def path_length_km(coords):
+    """Longueur totale (km) d'une polyligne (n, 2) lat/lon."""
+    return float(step_distances_km(coords).sum())
+
+
+def local_xy_m(coords, ref_lat=None):
+    """
+    Projection équirectangulaire (m) d'un tableau (n, 2) lat/lon, centrée sur ref_lat :
+    une latitude (moyenne des points par défaut) ou une latitude de référence par point.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if ref_lat is None:
+        ref_lat = float(coords[:, 0].mean()) if len(coords) else 0.0
+    radius_m = EARTH_RADIUS_KM * 1000.0
+    return np.column_stack((
+        radius_m * np.radians(coords[:, 1]) * np.cos(np.radians(ref_lat)),
+        radius_m * np.radians(coords[:, 0])
+    ))
+
+
+class TraceDistances(NamedTuple):
+    """Distances de tous les segments d'un store, calculées en une passe."""
+    cumulative: np.ndarray  # (N,) distance depuis le début du segment, en km, alignée sur coords
+    lengths: np.ndarray     # (n_segments,) longueur de chaque segment, en km
+    total: float            # somme des longueurs, en km
+
+
+def trace_distances(offsets, coords):
+    """
+    Calcule en une seule passe les distances de tous les segments décrits par
+    (offsets, coords) : coords est le tableau (N, 2) lat/lon concaténé et
+    offsets les bornes des segments (cf. TraceStore).
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    offsets = offsets - offsets[0]
+    n = len(coords)
+
+    # steps[i] = distance entre le point i-1 et le point i, remise à zéro au début de chaque segment
+    steps = np.zeros(n)
+    steps[1:] = step_distances_km(coords)
+    starts, stops = offsets[:-1], offsets[1:]
+    counts = stops - starts
+    non_empty = counts > 0
+    steps[starts[non_empty]] = 0.0
+
+    running = np.cumsum(steps)
+    base = np.zeros(len(counts))
+    base[non_empty] = running[starts[non_empty]]
+    lengths = np.zeros(len(counts))
+    lengths[non_empty] = running[stops[non_empty] - 1] - base[non_empty]
+    cumulative = running - np.repeat(base, counts)
+
+    return TraceDistances(cumulative, lengths, float(lengths.sum()))
+
+
+def vincenty_km(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    """
+    Distance géodésique (km) sur l'ellipsoïde WGS84 (formule inverse de Vincenty),
+    entre deux séries de points en degrés. Écart à geopy.distance.geodesic
+    inférieur au millimètre ; les rares paires quasi antipodales qui ne convergent
+    pas retombent sur la distance haversine.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (lat1, lon1, lat2, lon2)))
+    f = WGS84_F
+    u1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    big_l = np.radians(lon2 - lon1)
+    sin_u1, cos_u1, sin_u2, cos_u2 = np.sin(u1), np.cos(u1), np.sin(u2), np.cos(u2)
+
+    lam = big_l.copy()
+    active = np.ones(lam.shape, dtype=bool)
+    sin_sigma = cos_sigma = sigma = cos2_alpha = cos_2sigma_m = np.zeros(lam.shape)
+    for _ in range(max_iter):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(sin_sigma > 0, cos_u1 * cos_u2 * sin_lam / sin_sigma, 0.0)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Lignes équatoriales : cos2_alpha = 0
+            cos_2sigma_m = np.where(cos2_alpha > 0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha, 0.0)
+        c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        lam_new = big_l + (1 - c) * f * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+        )
+        active = np.abs(lam_new - lam) > tol
+        lam = lam_new
+        if not active.any():
+            break
+
+    u_sq = cos2_alpha * (WGS84_A_KM ** 2 - WGS84_B_KM ** 2) / WGS84_B_KM ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+    ))
+    distance = WGS84_B_KM * big_a * (sigma - delta_sigma)
+    distance = np.where(sin_sigma == 0, 0.0, distance)
+    if active.any():
+        distance = np.where(active, haversine_km(lat1, lon1, lat2, lon2), distance)
+    return distance
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    """Cap initial (degrés, 0-360) de chaque point 1 vers le point 2 correspondant."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    y = np.sin(lon2 - lon1) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+    return (np.degrees(np.arctan2(y, x)) + 360) % 360
+
+
+def angle_difference_deg(bearing1, bearing2):
+    """Écart angulaire (0-180°) entre deux séries de caps : 0 = tout droit, 180 = demi-tour."""
+    diff = np.abs(np.asarray(bearing1, dtype=np.float64) - np.asarray(bearing2, dtype=np.float64)) % 360
+    return np.minimum(diff, 360 - diff)
+
+
+class TrackProfile(NamedTuple):
+    """Distances et caps le long d'une trace (n points)."""
+    cumulative: np.ndarray  # (n,) distance depuis le premier point, en km
+    bearings: np.ndarray    # (n-1,) cap du pas i -> i+1, en degrés
+    total: float            # longueur totale, en km
+
+
+def track_profile(coords, geodesic=True):
+    """
+    Distances cumulées et caps de chaque pas d'une trace (n, 2) lat/lon,
+    en une passe vectorisée (Vincenty si geodesic, haversine sinon).
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    cumulative = np.zeros(len(coords))
+    if len(coords) < 2:
+        return TrackProfile(cumulative, np.zeros(0), 0.0)
+    lat1, lon1, lat2, lon2 = coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1]
+    steps = vincenty_km(lat1, lon1, lat2, lon2) if geodesic else haversine_km(lat1, lon1, lat2, lon2)
+    np.cumsum(steps, out=cumulative[1:])
+    return TrackProfile(cumulative, bearing_deg(lat1, lon1, lat2, lon2), float(cumulative[-1]))
+
+
+def count_turns(bearings, turn_threshold_deg):
+    """Nombre de changements de cap consécutifs supérieurs ou égaux au seuil."""
+    bearings = np.asarray(bearings, dtype=np.float64)
+    if len(bearings) < 2:
+        return 0
+    return int((angle_difference_deg(bearings[:-1], bearings[1:]) >= turn_threshold_deg).sum())
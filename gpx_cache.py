@@ -0,0 +1,151 @@
+"""
+Cache disque des fichiers GPX parsés, fichier par fichier.
+
+- Un index associe chaque chemin à (mtime, taille, empreinte SHA-1 du contenu) :
+  tant que mtime et taille sont inchangés, le fichier n'est même pas relu.
+- Les données parsées sont stockées sous le nom de l'empreinte du contenu
+  (<sha1>_<variante>.npz) : un fichier régénéré à l'identique réutilise son entrée,
+  un fichier modifié est seul reparsé.
+- La taille du dossier est bornée : les entrées les moins récemment utilisées
+  sont supprimées au-delà de max_bytes.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """Empreinte SHA-1 du contenu d'un fichier."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def directory_signature(directory, pattern="relai_*.gpx"):
+    """
+    Signature légère d'un répertoire (nom, mtime, taille de chaque fichier),
+    obtenue sans lire les fichiers. Change dès qu'un fichier est ajouté, supprimé ou réécrit.
+    """
+    if not os.path.isdir(directory):
+        return ()
+    entries = []
+    for path in sorted(Path(directory).glob(pattern)):
+        stat = path.stat()
+        entries.append((path.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+
+class GpxFileCache:
+    """Cache disque des résultats de parsing, indexé par chemin/mtime/taille/contenu."""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_file = self.cache_dir / "index.json"
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._index = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _content_hash(self, path):
+        """Empreinte du fichier, relue seulement si mtime ou taille ont changé."""
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._index.get(key)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['sha1']
+
+        digest = file_content_hash(path)
+        with self._lock:
+            self._index[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': digest}
+            self._dirty = True
+        return digest
+
+    def _blob(self, path, variant):
+        return self.cache_dir / f"{self._content_hash(path)}_{variant}.npz"
+
+    def lookup(self, path, variant="default"):
+        """Tableaux en cache pour le contenu actuel de 'path', ou None."""
+        blob = self._blob(path, variant)
+        if not blob.exists():
+            return None
+        try:
+            with np.load(blob) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(blob)  # marque l'entrée comme récemment utilisée
+            return arrays
+        except (OSError, ValueError):
+            blob.unlink(missing_ok=True)
+            return None
+
+    def store(self, path, arrays, variant="default"):
+        """Enregistre les tableaux parsés de 'path' (dict nom -> ndarray)."""
+        blob = self._blob(path, variant)
+        tmp = blob.with_name(f"{blob.stem}.{threading.get_ident()}.tmp.npz")
+        np.savez(tmp, **arrays)
+        os.replace(tmp, blob)
+
+    def get(self, path, parse, variant="default"):
+        """
+        Retourne les tableaux parsés de 'path' (dict nom -> ndarray).
+        'parse(path)' n'est appelé que si aucune entrée ne correspond au contenu actuel.
+        'variant' distingue les paramètres de parsing (échantillonnage, colonnes...).
+        """
+        arrays = self.lookup(path, variant)
+        if arrays is None:
+            arrays = parse(path)
+            self.store(path, arrays, variant)
+        return arrays
+
+    def flush(self):
+        """Écrit l'index sur disque s'il a changé."""
+        with self._lock:
+            if not self._dirty:
+                return
+            index = dict(self._index)
+            self._dirty = False
+        tmp = self.index_file.with_suffix(".json.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, self.index_file)
+
+    def size_bytes(self):
+        return sum(blob.stat().st_size for blob in self.cache_dir.glob("*.npz"))
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées tant que le cache dépasse max_bytes."""
+        blobs = [(blob.stat(), blob) for blob in self.cache_dir.glob("*.npz")]
+        total = sum(stat.st_size for stat, _ in blobs)
+        removed = 0
+        for stat, blob in sorted(blobs, key=lambda item: item[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            blob.unlink(missing_ok=True)
+            total -= stat.st_size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Vide entièrement le cache et son index."""
+        for blob in self.cache_dir.glob("*.npz"):
+            blob.unlink(missing_ok=True)
+        with self._lock:
+            self._index = {}
+            self._dirty = False
+        self.index_file.unlink(missing_ok=True)
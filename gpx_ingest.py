@@ -0,0 +1,151 @@
+"""
+Ingestion parallèle d'un lot de fichiers GPX.
+
+Le parsing est limité par le CPU et par le GIL : en mode "process", les fichiers
+sont répartis par paquets entre des processus. Chaque paquet revient sous forme
+compacte (quelques tableaux NumPy concaténés + offsets) plutôt que comme une
+liste d'objets Python à dépickler point par point.
+"""
+import concurrent.futures
+import contextlib
+import multiprocessing
+import sys
+import threading
+import types
+
+import numpy as np
+
+from gpx_parser import GpxArrays, empty_gpx_arrays, parse_gpx
+
+INGEST_MODES = ("process", "thread", "serial")
+
+
+def _parse_chunk(files, max_points, with_time):
+    """Parse un paquet de fichiers et renvoie (offsets, lat, lon, ele, time, erreurs)."""
+    parsed = []
+    errors = {}
+    for path in files:
+        try:
+            parsed.append(parse_gpx(path, max_points=max_points, with_time=with_time))
+        except Exception as e:
+            errors[path] = str(e)
+            parsed.append(empty_gpx_arrays())
+
+    offsets = np.zeros(len(parsed) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in parsed], out=offsets[1:])
+    columns = [np.concatenate([getattr(p, name) for p in parsed]) for name in GpxArrays._fields]
+    return (offsets, *columns, errors)
+
+
+def _split_chunk(result):
+    """Découpe le résultat compact d'un paquet en un GpxArrays (vues) par fichier."""
+    offsets, *columns, errors = result
+    arrays = [
+        GpxArrays(*(column[start:stop] for column in columns))
+        for start, stop in zip(offsets[:-1], offsets[1:])
+    ]
+    return arrays, errors
+
+
+# sys.modules['__main__'] est partagé par tous les threads (une session Streamlit
+# par thread) : un seul démarrage de pool à la fois le masque
+_MAIN_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def _isolated_main():
+    """
+    Masque le module __main__ pendant le démarrage des processus "spawn".
+
+    Streamlit exécute le script de l'application comme __main__ : sans cela,
+    chaque processus fils réimporterait (et relancerait) toute l'application.
+    Les fonctions exécutées par le pool vivent dans ce module, pas dans __main__.
+    """
+    main_module = sys.modules.get('__main__')
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main_module
+
+
+def _wait_for_pool(barrier):
+    """Initialiseur des processus : attend que tout le pool soit démarré."""
+    try:
+        barrier.wait(timeout=60)
+    except threading.BrokenBarrierError:
+        pass
+
+
+def _noop():
+    return None
+
+
+def _start_processes(executor, n_workers):
+    """
+    Démarre les n_workers processus du pool, __main__ masqué sous verrou, puis
+    rétablit __main__ avant toute tâche de parsing. Chaque processus attend les
+    autres dans son initialiseur (_wait_for_pool) : aucun n'est libre avant que
+    tous soient lancés, chaque soumission démarre donc un nouveau processus.
+    """
+    with _MAIN_LOCK, _isolated_main():
+        for _ in range(n_workers):
+            executor.submit(_noop)
+
+
+def _chunks(files, chunk_size):
+    return [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+
+
+def ingest_gpx_files(files, max_points=None, with_time=True, mode="process", max_workers=4, chunk_size=None):
+    """
+    Parse une liste de fichiers GPX.
+
+    mode        : "process" (pool de processus), "thread" (pool de threads) ou "serial".
+    max_workers : taille du pool (réglage "Nombre max de processus parallèles").
+    chunk_size  : nombre de fichiers par tâche ; par défaut ~4 tâches par worker.
+
+    Retourne (liste de GpxArrays alignée sur files, dict {fichier: message d'erreur}).
+    """
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Mode d'ingestion inconnu : {mode}")
+    files = list(files)
+    if not files:
+        return [], {}
+
+    max_workers = max(1, int(max_workers))
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(files) // (max_workers * 4)))
+    chunks = _chunks(files, chunk_size)
+
+    if mode == "serial" or max_workers == 1 or len(chunks) == 1:
+        results = [_parse_chunk(chunk, max_points, with_time) for chunk in chunks]
+    else:
+        n_workers = min(max_workers, len(chunks))
+        try:
+            if mode == "process":
+                # "spawn" : pas de fork d'un serveur multi-threadé (Streamlit)
+                context = multiprocessing.get_context("spawn")
+                executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=n_workers, mp_context=context,
+                    initializer=_wait_for_pool, initargs=(context.Barrier(n_workers),)
+                )
+            else:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=n_workers)
+            with executor:
+                if mode == "process":
+                    _start_processes(executor, n_workers)
+                results = list(executor.map(
+                    _parse_chunk, chunks, [max_points] * len(chunks), [with_time] * len(chunks)
+                ))
+        except (concurrent.futures.process.BrokenProcessPool, OSError):
+            # Pool inutilisable (processus tué, environnement sans fork/spawn) : on parse sur place
+            results = [_parse_chunk(chunk, max_points, with_time) for chunk in chunks]
+
+    all_arrays = []
+    all_errors = {}
+    for result in results:
+        arrays, errors = _split_chunk(result)
+        all_arrays.extend(arrays)
+        all_errors.update(errors)
+    return all_arrays, all_errors
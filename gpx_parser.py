@@ -0,0 +1,114 @@
+"""
+Lecture rapide des points de trace (trkpt) d'un fichier GPX.
+
+Contrairement à gpxpy, aucun objet Python n'est conservé par point : le fichier
+est parcouru en flux (iterparse) et latitude, longitude et élévation sont écrites
+dans des tableaux NumPy agrandis au fil de la lecture. Chaque élément terminé est
+retiré de son parent : l'arbre XML se limite à l'élément en cours de lecture.
+L'échantillonnage (max_points) s'applique une fois le nombre de points connu ;
+seuls les horodatages des points gardés sont convertis.
+"""
+import xml.etree.ElementTree as ET
+from io import BytesIO
+from typing import NamedTuple
+
+import numpy as np
+
+
+class GpxArrays(NamedTuple):
+    """Colonnes des points de trace d'un fichier GPX."""
+    lat: np.ndarray   # float64, degrés
+    lon: np.ndarray   # float64, degrés
+    ele: np.ndarray   # float64, mètres (NaN si absente)
+    time: np.ndarray  # datetime64[ms] (NaT si absent)
+
+    @property
+    def coords(self):
+        """Tableau (n, 2) lat/lon."""
+        return np.column_stack((self.lat, self.lon))
+
+    def __len__(self):
+        return len(self.lat)
+
+
+def empty_gpx_arrays():
+    return GpxArrays(np.empty(0), np.empty(0), np.empty(0), np.empty(0, dtype='datetime64[ms]'))
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_time(text):
+    """Convertit un horodatage ISO 8601 GPX en datetime64[ms] (fuseau ignoré, supposé UTC)."""
+    text = text.strip()
+    if text.endswith('Z'):
+        text = text[:-1]
+    elif len(text) > 19 and text[-6] in '+-' and text[-3] == ':':
+        text = text[:-6]
+    try:
+        return np.datetime64(text, 'ms')
+    except ValueError:
+        return np.datetime64('NaT', 'ms')
+
+
+def _grow(columns, size):
+    """Agrandit les colonnes (lat, lon, ele) à size éléments."""
+    lat, lon, ele = (np.resize(column, size) for column in columns)
+    ele[len(columns[2]):] = np.nan
+    return lat, lon, ele
+
+
+def parse_gpx(source, max_points=None, with_time=True):
+    """
+    Lit les points de trace d'un fichier GPX (chemin, fichier binaire ou bytes).
+
+    max_points : si le fichier contient plus de points, on n'en garde qu'un sur
+                 step = n // max_points + 1 (même règle que l'ancien échantillonnage).
+    with_time  : désactiver pour ne pas convertir les horodatages.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(bytes(source))
+
+    lat, lon, ele = np.empty(1024), np.empty(1024), np.full(1024, np.nan)
+    time_texts = []
+    n = 0
+    parents = []
+    trkpt_tag = ele_tag = time_tag = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if trkpt_tag is None and _local_name(elem.tag) == 'trkpt':
+                # Balises qualifiées par l'espace de noms du fichier, résolues une seule fois
+                prefix = elem.tag[:-len('trkpt')]
+                trkpt_tag, ele_tag, time_tag = elem.tag, prefix + 'ele', prefix + 'time'
+            parents.append(elem)
+            continue
+
+        parents.pop()
+        if elem.tag == trkpt_tag:
+            if n == len(lat):
+                lat, lon, ele = _grow((lat, lon, ele), 2 * n)
+            lat[n] = float(elem.get('lat'))
+            lon[n] = float(elem.get('lon'))
+            child = elem.find(ele_tag)
+            if child is not None and child.text:
+                ele[n] = float(child.text)
+            if with_time:
+                child = elem.find(time_tag)
+                time_texts.append(child.text if child is not None else None)
+            n += 1
+        elif parents and parents[-1].tag == trkpt_tag:
+            continue  # <ele>, <time>... lus à la fin de leur point
+        if parents:
+            parents[-1].remove(elem)
+
+    step = 1
+    if max_points and n > max_points:
+        step = n // max_points + 1
+    times = np.full(len(range(0, n, step)), np.datetime64('NaT', 'ms'))
+    for k, text in enumerate(time_texts[::step]):
+        if text:
+            times[k] = _parse_time(text)
+    if step > 1:
+        return GpxArrays(lat[:n:step].copy(), lon[:n:step].copy(), ele[:n:step].copy(), times)
+    return GpxArrays(lat[:n], lon[:n], ele[:n], times)
@@ -0,0 +1,269 @@
+"""
+Manifeste d'un répertoire de relais : manifest.json, à côté des relai_*.gpx.
+
+Une entrée par segment : numéro, fichier, nombre de points, emprise, longueur,
+points de départ et d'arrivée, empreinte du contenu, et indicateurs de virages
+et de dénivelé (analytics.py). L'application remplit la barre latérale, les
+filtres et les statistiques à partir du seul manifeste, et ne parse que les
+segments qu'elle dessine.
+
+Le manifeste est écrit par les notebooks de découpage juste après les GPX, ou
+reconstruit en ligne de commande :
+
+    python manifest.py Relais_gpx_greedy Relais_gpx_dp [--force]
+
+update_manifest ne reparse que les fichiers ajoutés ou modifiés : une entrée
+est reprise telle quelle si le nom, le mtime et la taille du fichier sont
+inchangés, ou si son contenu (SHA-1) est identique.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from analytics import DEFAULT_TURN_THRESHOLD_DEG, SegmentMetrics, segment_metrics
+from gpx_cache import directory_signature, file_content_hash
+from gpx_ingest import ingest_gpx_files
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+GPX_PATTERN = "relai_*.gpx"
+
+
+def segment_number(gpx_file):
+    """Numéro de segment d'un fichier relai_<n>.gpx."""
+    return int(os.path.basename(gpx_file).split('_')[1].split('.')[0])
+
+
+def remove_stale_segments(directory, n_segments):
+    """
+    Supprime les relai_<k>.gpx hors de 1..n_segments laissés par un découpage
+    précédent plus long (sinon repris dans le manifeste). Retourne les fichiers supprimés.
+    """
+    stale = [path for path in sorted(Path(directory).glob(GPX_PATTERN))
+             if not 1 <= segment_number(path) <= n_segments]
+    for path in stale:
+        path.unlink()
+    return stale
+
+
+def _number(value):
+    """Flottant JSON : NaN écrit null."""
+    return None if value is None or not np.isfinite(value) else float(value)
+
+
+def _array(rows, key, shape=()):
+    return np.array([np.nan if row[key] is None else row[key] for row in rows], dtype=np.float64).reshape(-1, *shape)
+
+
+class RelayManifest:
+    """
+    Manifeste en colonnes (une ligne par segment, triées par numéro).
+
+    - segments, files (noms relatifs au répertoire), point_counts
+    - bbox (n, 4) : lat min, lon min, lat max, lon max ; starts, ends (n, 2) lat/lon
+    - sha1, mtime_ns, sizes : identité des fichiers sources
+    - metrics : SegmentMetrics (analytics.py), au seuil turn_threshold_deg
+    - errors : {fichier: message} des fichiers illisibles
+    """
+
+    def __init__(self, directory, rows, turn_threshold_deg=DEFAULT_TURN_THRESHOLD_DEG):
+        rows = sorted(rows, key=lambda row: row["segment"])
+        self.directory = str(directory)
+        self.turn_threshold_deg = float(turn_threshold_deg)
+        self.segments = np.array([row["segment"] for row in rows], dtype=np.int64)
+        self.files = [row["file"] for row in rows]
+        self.point_counts = np.array([row["points"] for row in rows], dtype=np.int64)
+        self.bbox = _array(rows, "bbox", (4,)) if rows else np.empty((0, 4))
+        self.starts = _array(rows, "start", (2,)) if rows else np.empty((0, 2))
+        self.ends = _array(rows, "end", (2,)) if rows else np.empty((0, 2))
+        self.sha1 = [row["sha1"] for row in rows]
+        self.mtime_ns = np.array([row["mtime_ns"] for row in rows], dtype=np.int64)
+        self.sizes = np.array([row["size"] for row in rows], dtype=np.int64)
+        self.metrics = SegmentMetrics(*(
+            np.array([row["metrics"][field] for row in rows], dtype=np.int64) if field == "turns"
+            else np.array([np.nan if row["metrics"][field] is None else row["metrics"][field] for row in rows],
+                          dtype=np.float64)
+            for field in SegmentMetrics._fields
+        ))
+        self.errors = {row["file"]: row["error"] for row in rows if row.get("error")}
+        self._positions = {int(s): i for i, s in enumerate(self.segments)}
+
+    def __len__(self):
+        return len(self.segments)
+
+    @property
+    def segment_ids(self):
+        """Liste des numéros de segments, dans l'ordre du manifeste."""
+        return self.segments.tolist()
+
+    @property
+    def lengths_km(self):
+        return self.metrics.lengths_km
+
+    @property
+    def total_km(self):
+        return float(self.metrics.lengths_km.sum())
+
+    @property
+    def n_points(self):
+        return int(self.point_counts.sum())
+
+    def position(self, segment):
+        """Indice du segment dans le manifeste, ou None s'il est absent."""
+        return self._positions.get(int(segment))
+
+    def paths(self, segments=None):
+        """Chemins des fichiers des segments demandés (tous par défaut), dans l'ordre du manifeste."""
+        if segments is None:
+            return tuple(os.path.join(self.directory, f) for f in self.files)
+        wanted = {int(s) for s in segments}
+        return tuple(os.path.join(self.directory, f) for s, f in zip(self.segments.tolist(), self.files)
+                     if s in wanted)
+
+    def signature(self):
+        """Signature des fichiers décrits, comparable à gpx_cache.directory_signature."""
+        return tuple(sorted(zip(self.files, self.mtime_ns.tolist(), self.sizes.tolist())))
+
+    def rows(self):
+        """Entrées du manifeste (une par segment), telles qu'écrites dans manifest.json."""
+        rows = []
+        for i, segment in enumerate(self.segment_ids):
+            row = {
+                "segment": segment,
+                "file": self.files[i],
+                "points": int(self.point_counts[i]),
+                "bbox": [_number(v) for v in self.bbox[i]],
+                "length_km": _number(self.metrics.lengths_km[i]),
+                "start": [_number(v) for v in self.starts[i]],
+                "end": [_number(v) for v in self.ends[i]],
+                "sha1": self.sha1[i],
+                "mtime_ns": int(self.mtime_ns[i]),
+                "size": int(self.sizes[i]),
+                "metrics": {field: (int(values[i]) if field == "turns" else _number(values[i]))
+                            for field, values in zip(SegmentMetrics._fields, self.metrics)},
+            }
+            if self.files[i] in self.errors:
+                row["error"] = self.errors[self.files[i]]
+            rows.append(row)
+        return rows
+
+    def save(self):
+        """Écrit manifest.json dans le répertoire (écriture atomique)."""
+        path = Path(self.directory) / MANIFEST_FILE
+        content = {"version": MANIFEST_VERSION, "turn_threshold_deg": self.turn_threshold_deg, "segments": self.rows()}
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(content, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def load_manifest(directory):
+    """Manifeste enregistré dans directory, ou None (absent, illisible ou d'une autre version)."""
+    try:
+        with open(Path(directory) / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if content.get("version") != MANIFEST_VERSION:
+        return None
+    return RelayManifest(directory, content["segments"], content["turn_threshold_deg"])
+
+
+def manifest_rows(paths, turn_threshold_deg=DEFAULT_TURN_THRESHOLD_DEG, mode="process", max_workers=4):
+    """Entrées du manifeste des fichiers GPX donnés : un parsing par fichier, indicateurs en une passe."""
+    parsed, errors = ingest_gpx_files(paths, with_time=False, mode=mode, max_workers=max_workers)
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum([len(arrays) for arrays in parsed], out=offsets[1:])
+    coords = np.concatenate([arrays.coords for arrays in parsed]) if parsed else np.empty((0, 2))
+    elevations = np.concatenate([arrays.ele for arrays in parsed]) if parsed else np.empty(0)
+    metrics = segment_metrics(offsets, coords, elevations, turn_threshold_deg)
+
+    rows = []
+    for i, path in enumerate(paths):
+        points = coords[offsets[i]:offsets[i + 1]]
+        stat = os.stat(path)
+        empty = not len(points)
+        row = {
+            "segment": segment_number(path),
+            "file": os.path.basename(path),
+            "points": len(points),
+            "bbox": [None] * 4 if empty else [*points.min(axis=0).tolist(), *points.max(axis=0).tolist()],
+            "start": [None, None] if empty else points[0].tolist(),
+            "end": [None, None] if empty else points[-1].tolist(),
+            "sha1": file_content_hash(path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "metrics": {field: (int(values[i]) if field == "turns" else _number(values[i]))
+                        for field, values in zip(SegmentMetrics._fields, metrics)},
+        }
+        row["length_km"] = row["metrics"]["lengths_km"]
+        if path in errors:
+            row["error"] = errors[path]
+        rows.append(row)
+    return rows
+
+
+def update_manifest(directory, force=False, turn_threshold_deg=DEFAULT_TURN_THRESHOLD_DEG, mode="process",
+                    max_workers=4, write=True):
+    """
+    Manifeste à jour du répertoire : relit manifest.json, reparse les seuls fichiers
+    ajoutés ou modifiés (tous si force ou si le seuil a changé) et réécrit le
+    manifeste s'il a changé.
+    """
+    signature = directory_signature(directory, GPX_PATTERN)
+    current = None if force else load_manifest(directory)
+    if current is not None and current.turn_threshold_deg != float(turn_threshold_deg):
+        current = None
+    if current is not None and current.signature() == signature:
+        return current
+
+    by_stat, by_hash = {}, {}
+    if current is not None:
+        for row in current.rows():
+            by_stat[(row["file"], row["mtime_ns"], row["size"])] = row
+            by_hash[row["sha1"]] = row
+
+    rows, missing = [], []
+    for name, mtime_ns, size in signature:
+        path = os.path.join(directory, name)
+        row = by_stat.get((name, mtime_ns, size))
+        if row is None and by_hash:
+            row = by_hash.get(file_content_hash(path))
+            if row is not None:
+                row = dict(row, file=name, segment=segment_number(name), mtime_ns=mtime_ns, size=size)
+        if row is None:
+            missing.append(path)
+        else:
+            rows.append(row)
+    if missing:
+        rows.extend(manifest_rows(missing, turn_threshold_deg, mode, max_workers))
+
+    manifest = RelayManifest(directory, rows, turn_threshold_deg)
+    if write and os.path.isdir(directory):
+        manifest.save()
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit ou met à jour le manifest.json de répertoires de relais.")
+    parser.add_argument("directories", nargs="+", help="répertoires contenant des relai_*.gpx")
+    parser.add_argument("--force", action="store_true", help="reparse tous les fichiers")
+    parser.add_argument("--turn-threshold", type=float, default=DEFAULT_TURN_THRESHOLD_DEG,
+                        help="seuil des virages (degrés)")
+    parser.add_argument("--workers", type=int, default=4, help="processus de parsing")
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            parser.error(f"{directory} n'est pas un répertoire")
+        manifest = update_manifest(directory, args.force, args.turn_threshold, max_workers=args.workers)
+        print(f"{directory} : {len(manifest)} segments, {manifest.total_km:.2f} km, {manifest.n_points} points")
+        for name, message in manifest.errors.items():
+            print(f"  erreur {name} : {message}")
+
+
+if __name__ == "__main__":
+    main()
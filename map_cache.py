@@ -0,0 +1,102 @@
+"""
+Cache du HTML des cartes Folium déjà rendues.
+
+Construire une carte (GeoJSON, marqueurs, _repr_html_) coûte cher alors que le
+résultat ne dépend que de quelques paramètres : contenu des traces, segments
+sélectionnés, style de fond, marqueurs, niveau de simplification... Ces paramètres
+forment la clé ; le HTML est conservé en mémoire (LRU, max_entries entrées) et,
+si cache_dir est fourni, sur disque (LRU par mtime, borné à max_bytes).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def map_cache_key(*parts):
+    """Clé stable (SHA-1) construite à partir des paramètres de rendu d'une carte."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+class MapHtmlCache:
+    """Cache LRU du HTML des cartes, en mémoire et optionnellement sur disque."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        return self.cache_dir / f"{key}.html"
+
+    def lookup(self, key):
+        """HTML associé à la clé, ou None."""
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html
+        if not self.cache_dir:
+            return None
+        path = self._file(key)
+        try:
+            html = path.read_text(encoding='utf-8')
+            os.utime(path)  # marque l'entrée comme récemment utilisée
+        except OSError:
+            return None
+        self._remember(key, html)
+        return html
+
+    def _remember(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def store(self, key, html):
+        self._remember(key, html)
+        if self.cache_dir:
+            path = self._file(key)
+            tmp = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp")
+            tmp.write_text(html, encoding='utf-8')
+            os.replace(tmp, path)
+            self.evict()
+
+    def get(self, key, render):
+        """HTML de la carte 'key' ; render() n'est appelé qu'en l'absence d'entrée."""
+        html = self.lookup(key)
+        if html is None:
+            html = render()
+            self.store(key, html)
+        return html
+
+    def evict(self):
+        """Supprime les fichiers les moins récemment utilisés tant que le cache disque dépasse max_bytes."""
+        if not self.cache_dir:
+            return 0
+        files = [(path.stat(), path) for path in self.cache_dir.glob("*.html")]
+        total = sum(stat.st_size for stat, _ in files)
+        removed = 0
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir:
+            for path in self.cache_dir.glob("*.html"):
+                path.unlink(missing_ok=True)
@@ -0,0 +1,325 @@
+"""
+Appariement des nœuds de degré impair (problème du postier chinois) sur les
+distances réelles du graphe des rues (street_graph.StreetGraph).
+
+1. Distances : Dijkstra bornée (radius_m mètres) depuis chaque nœud impair,
+   par lots, sur l'adjacence CSR (scipy.sparse.csgraph) ; seules les paires
+   de nœuds impairs à moins de radius_m sont conservées.
+2. Appariement sur le graphe des k plus proches voisins de chaque nœud :
+   glouton (paires les plus courtes d'abord), puis réoptimisation exacte
+   (blossom, networkx) par fenêtres spatiales de taille bornée, décalées d'une
+   passe à l'autre, et échanges 2-opt. Les nœuds sans partenaire dans le
+   rayon sont appariés entre eux sans borne de distance.
+3. Chemins : le plus court chemin de chaque paire, à dupliquer dans le graphe
+   pour le rendre eulérien (added_km = longueur ajoutée).
+"""
+from typing import NamedTuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from geometry import local_xy_m
+
+DEFAULT_RADIUS_M = 1500.0
+# Voisins retenus par nœud impair : 6 suffisent à retrouver l'optimum en pratique
+DEFAULT_K_NEAREST = 6
+# Fenêtres spatiales réoptimisées par blossom (coût superlinéaire en leur taille)
+DEFAULT_WINDOW_NODES = 200
+DEFAULT_PASSES = 4
+_BATCH = 64
+
+
+class OddMatching(NamedTuple):
+    """Appariement des nœuds impairs (indices de nœuds du StreetGraph)."""
+    pairs: np.ndarray      # (k, 2) nœuds appariés
+    distances: np.ndarray  # (k,) longueur du plus court chemin de chaque paire (m)
+    added_km: float        # longueur totale ajoutée au graphe
+    method: str
+
+
+def odd_nodes(graph):
+    """Indices des nœuds de degré impair."""
+    return np.flatnonzero(graph.degrees() % 2 == 1)
+
+
+def length_matrix(graph):
+    """Matrice d'adjacence CSR symétrique, pondérée par la longueur (m) ; arête la plus courte par paire de nœuds."""
+    n = graph.n_nodes
+    u = np.asarray(graph.edge_u, dtype=np.int64)
+    v = np.asarray(graph.edge_v, dtype=np.int64)
+    length = np.asarray(graph.edge_length, dtype=np.float64)
+    keep = u != v
+    rows = np.concatenate((u[keep], v[keep]))
+    cols = np.concatenate((v[keep], u[keep]))
+    weights = np.concatenate((length[keep], length[keep]))
+    # csr_matrix additionne les doublons : on ne garde que le minimum de chaque paire
+    order = np.lexsort((weights, cols, rows))
+    rows, cols, weights = rows[order], cols[order], weights[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    # Longueur nulle : csgraph ignorerait l'arête, on la remplace par un epsilon
+    return csr_matrix((np.maximum(weights[first], 1e-9), (rows[first], cols[first])), shape=(n, n))
+
+
+def odd_pair_distances(matrix, odd, radius_m=DEFAULT_RADIUS_M):
+    """
+    Distances (m) entre nœuds impairs à moins de radius_m l'un de l'autre.
+    Retourne (i, j, d) : positions dans odd (i < j) et distances.
+    """
+    odd = np.asarray(odd, dtype=np.int64)
+    rows, cols, dists = [], [], []
+    for start in range(0, len(odd), _BATCH):
+        sources = odd[start:start + _BATCH]
+        distances = dijkstra(matrix, directed=False, indices=sources, limit=radius_m)[:, odd]
+        i, j = np.nonzero(np.isfinite(distances))
+        i_global = i + start
+        keep = i_global < j
+        rows.append(i_global[keep])
+        cols.append(j[keep])
+        dists.append(distances[i[keep], j[keep]])
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(dists)
+
+
+def _greedy(i, j, d, mate):
+    """Apparie les paires les plus courtes d'abord (mate : -1 = libre), en place."""
+    order = np.argsort(d, kind='stable')
+    for a, b in zip(i[order].tolist(), j[order].tolist()):
+        if mate[a] < 0 and mate[b] < 0:
+            mate[a], mate[b] = b, a
+
+
+def _two_opt(mate, distance, max_passes=20):
+    """
+    Échanges 2-opt : (a,b)+(c,d) -> (a,c)+(b,d) ou (a,d)+(b,c) si la somme baisse,
+    pour c voisin connu de a. distance : dict de dicts (distances connues).
+    """
+    for _ in range(max_passes):
+        improved = False
+        for a in range(len(mate)):
+            b = mate[a]
+            if b < 0:
+                continue
+            for c, d_ac in distance[a].items():
+                d = mate[c]
+                if c == b or d < 0 or d == a:
+                    continue
+                current = distance[a][b] + distance[c][d]
+                d_bd = distance[b].get(d)
+                if d_bd is not None and d_ac + d_bd < current - 1e-9:
+                    mate[a], mate[c], mate[b], mate[d] = c, a, d, b
+                    improved = True
+                    break
+                d_ad, d_bc = distance[a].get(d), distance[b].get(c)
+                if d_ad is not None and d_bc is not None and d_ad + d_bc < current - 1e-9:
+                    mate[a], mate[d], mate[b], mate[c] = d, a, c, b
+                    improved = True
+                    break
+        if not improved:
+            break
+
+
+def nearest_pairs(i, j, d, k):
+    """Sous-ensemble des paires (i, j, d) : les k plus proches voisins de chaque nœud (union)."""
+    src = np.concatenate((i, j))
+    dst = np.concatenate((j, i))
+    dist = np.concatenate((d, d))
+    order = np.lexsort((dist, src))
+    src, dst, dist = src[order], dst[order], dist[order]
+    group_start = np.flatnonzero(np.r_[True, src[1:] != src[:-1]])
+    rank = np.arange(len(src)) - np.repeat(group_start, np.diff(np.r_[group_start, len(src)]))
+    keep = rank < k
+    a, b = np.minimum(src[keep], dst[keep]), np.maximum(src[keep], dst[keep])
+    _, unique = np.unique(a * (int(b.max(initial=0)) + 1) + b, return_index=True)
+    return a[unique], b[unique], dist[keep][unique]
+
+
+def spatial_clusters(xy, max_size):
+    """Étiquettes de groupes de points d'au plus max_size éléments (bissections successives à la médiane)."""
+    labels = np.zeros(len(xy), dtype=np.int64)
+    stack = [np.arange(len(xy))]
+    n_labels = 0
+    while stack:
+        members = stack.pop()
+        if len(members) <= max_size:
+            labels[members] = n_labels
+            n_labels += 1
+            continue
+        extent = np.ptp(xy[members], axis=0)
+        order = members[np.argsort(xy[members, int(np.argmax(extent))], kind='stable')]
+        stack.extend((order[:len(order) // 2], order[len(order) // 2:]))
+    return labels
+
+
+def _blossom(i, j, d, mate):
+    """Appariement de poids minimal (networkx, blossom) du graphe des paires données, en place."""
+    import networkx as nx
+
+    G = nx.Graph()
+    G.add_weighted_edges_from(zip(i.tolist(), j.tolist(), d.tolist()))
+    for a, b in nx.min_weight_matching(G):
+        mate[a], mate[b] = b, a
+
+
+def _improve_by_windows(mate, distance, i, j, d, xy, max_size, passes):
+    """
+    Réoptimise l'appariement par fenêtres spatiales d'environ max_size nœuds,
+    découpées différemment à chaque passe (rotation, décalage). Chaque fenêtre,
+    complétée par les partenaires de ses nœuds, est réappariée par blossom sur
+    les paires candidates (i, j, d) et les paires actuelles : jamais moins de
+    nœuds appariés, jamais plus long à nombre égal.
+    """
+    n = len(mate)
+    for p in range(passes):
+        angle = 0.5 * np.pi * p / passes
+        rotated = xy @ np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        order = np.argsort(rotated[:, 0], kind='stable')
+        shift = (p * max_size) // (2 * passes)
+        labels = np.zeros(n, dtype=np.int64)
+        labels[order[shift:]] = 1 + spatial_clusters(rotated[order[shift:]], max_size)
+        for label in np.unique(labels):
+            members = np.flatnonzero(labels == label)
+            nodes = np.union1d(members, mate[members[mate[members] >= 0]])
+            if len(nodes) < 2:
+                continue
+            in_window = np.zeros(n, dtype=bool)
+            in_window[nodes] = True
+            selected = in_window[i] & in_window[j]
+            current_i = nodes[nodes < mate[nodes]]
+            current_j = mate[current_i]
+            current_d = np.array([distance[a][b] for a, b in zip(current_i.tolist(), current_j.tolist())])
+            mate[nodes] = -1
+            _blossom(np.concatenate((i[selected], current_i)), np.concatenate((j[selected], current_j)),
+                     np.concatenate((d[selected], current_d)), mate)
+
+
+def _pair_leftovers(matrix, odd, mate, sparse, k_nearest=DEFAULT_K_NEAREST):
+    """
+    Apparie entre eux (glouton, sans borne de distance) les nœuds restés sans
+    partenaire dans le rayon, en place. sparse : nœuds ayant moins de k_nearest
+    voisins dans le rayon (dont les nœuds libres), qui reçoivent comme candidats
+    leurs k_nearest nœuds impairs les plus proches, sans borne.
+    Retourne ((i, j, d) des paires formées, (i, j, d) des candidats).
+    """
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+    sparse = np.union1d(sparse, np.flatnonzero(mate < 0))
+    if not len(sparse):
+        return empty, empty
+    distances = dijkstra(matrix, directed=False, indices=odd[sparse])[:, odd]
+
+    formed = empty
+    free = np.flatnonzero(mate[sparse] < 0)
+    if len(free) >= 2:
+        a, b = np.triu_indices(len(free), 1)
+        among = distances[free][:, sparse[free]][a, b]
+        reachable = np.isfinite(among)
+        fi, fj, fd = sparse[free[a[reachable]]], sparse[free[b[reachable]]], among[reachable]
+        _greedy(fi, fj, fd, mate)
+        paired = mate[fi] == fj
+        formed = (fi[paired], fj[paired], fd[paired])
+
+    distances[np.arange(len(sparse)), sparse] = np.inf
+    nearest = np.argsort(distances, axis=1, kind='stable')[:, :k_nearest]
+    rows = np.repeat(np.arange(len(sparse)), nearest.shape[1])
+    ki, kj, kd = sparse[rows], nearest.ravel(), distances[rows, nearest.ravel()]
+    known = np.isfinite(kd)
+    ki, kj, kd = ki[known], kj[known], kd[known]
+    return formed, (np.minimum(ki, kj), np.maximum(ki, kj), kd)
+
+
+def match_odd_nodes(graph, radius_m=DEFAULT_RADIUS_M, method="auto", k_nearest=DEFAULT_K_NEAREST,
+                    window_nodes=DEFAULT_WINDOW_NODES, passes=DEFAULT_PASSES, matrix=None):
+    """
+    Apparie les nœuds impairs de graph (StreetGraph) en minimisant la somme des
+    plus courts chemins. Appariement initial glouton (paires à moins de radius_m,
+    puis nœuds restants entre eux sans borne) ; les paires candidates sont les
+    k_nearest plus proches voisins de chaque nœud (dans le rayon, ou sans borne
+    pour les nœuds qui y ont moins de k_nearest voisins) et les paires de cet
+    appariement initial, qui est donc toujours réalisable. method :
+    - "auto"    : blossom par fenêtres spatiales d'environ window_nodes nœuds
+      (passes découpages) ;
+    - "blossom" : appariement parfait de poids minimal (blossom) sur tout le
+      graphe des paires candidates, exact si ce graphe est complet ;
+    - "greedy"  : appariement initial seul.
+    Des échanges 2-opt terminent chaque méthode ; le résultat n'est jamais plus
+    long que l'appariement initial.
+    """
+    if method not in ("auto", "blossom", "greedy"):
+        raise ValueError(f"Méthode d'appariement inconnue : {method}")
+    if matrix is None:
+        matrix = length_matrix(graph)
+    odd = odd_nodes(graph)
+    if not len(odd):
+        return OddMatching(np.zeros((0, 2), dtype=np.int64), np.zeros(0), 0.0, method)
+
+    i, j, d = odd_pair_distances(matrix, odd, radius_m)
+    mate = np.full(len(odd), -1, dtype=np.int64)
+    _greedy(i, j, d, mate)
+    # Nœuds sans partenaire dans le rayon : appariés entre eux avant toute
+    # réoptimisation, pour que fenêtres et 2-opt puissent revenir sur ces paires
+    neighbours = np.bincount(np.concatenate((i, j)), minlength=len(odd))
+    (fi, fj, fd), (li, lj, ld) = _pair_leftovers(matrix, odd, mate, np.flatnonzero(neighbours < k_nearest), k_nearest)
+    if (mate < 0).any():
+        raise ValueError("Appariement incomplet : nœuds impairs non reliés (graphe non connexe ?)")
+
+    initial = mate[i] == j
+    ni, nj, nd = nearest_pairs(i, j, d, k_nearest)
+    ci, cj, cd = (np.concatenate(parts) for parts in (
+        (ni, i[initial], fi, li), (nj, j[initial], fj, lj), (nd, d[initial], fd, ld)
+    ))
+
+    # Distances connues : voisinage élargi (pour 2-opt) et paires candidates
+    distance = [dict() for _ in range(len(odd))]
+    wi, wj, wd = nearest_pairs(i, j, d, 4 * k_nearest)
+    for a, b, dist in zip(np.r_[wi, ci].tolist(), np.r_[wj, cj].tolist(), np.r_[wd, cd].tolist()):
+        distance[a][b] = distance[b][a] = dist
+
+    if method == "blossom":
+        mate[:] = -1
+        _blossom(ci, cj, cd, mate)
+    elif method == "auto":
+        xy = local_xy_m(np.column_stack((np.asarray(graph.lat)[odd], np.asarray(graph.lon)[odd])))
+        _improve_by_windows(mate, distance, ci, cj, cd, xy, window_nodes, passes)
+
+    _two_opt(mate, distance)
+
+    first = np.flatnonzero(mate > np.arange(len(odd)))
+    pairs = np.column_stack((odd[first], odd[mate[first]]))
+    lengths = np.array([distance[a][mate[a]] for a in first.tolist()])
+    return OddMatching(pairs, lengths, float(lengths.sum()) / 1000, method)
+
+
+def matching_paths(graph, matching, matrix=None):
+    """
+    Plus court chemin de chaque paire de l'appariement, sous forme de tableaux
+    d'indices d'arêtes du StreetGraph (arêtes à dupliquer).
+    """
+    if matrix is None:
+        matrix = length_matrix(graph)
+    # Arête la plus courte de chaque paire de nœuds
+    shortest_edge = {}
+    lengths = graph.edge_length.tolist()
+    for e, (u, v) in enumerate(zip(graph.edge_u.tolist(), graph.edge_v.tolist())):
+        key = (min(u, v), max(u, v))
+        if key not in shortest_edge or lengths[e] < lengths[shortest_edge[key]]:
+            shortest_edge[key] = e
+
+    paths = []
+    pairs = np.asarray(matching.pairs)
+    for start in range(0, len(pairs), _BATCH):
+        batch = pairs[start:start + _BATCH]
+        limit = float(np.max(matching.distances[start:start + _BATCH])) * (1 + 1e-9) + 1e-6
+        _, predecessors = dijkstra(matrix, directed=False, indices=batch[:, 0], return_predecessors=True, limit=limit)
+        for row, (source, target) in enumerate(batch.tolist()):
+            edges = []
+            node = target
+            while node != source:
+                previous = int(predecessors[row, node])
+                if previous < 0:
+                    raise ValueError(f"Pas de chemin entre les nœuds {source} et {target}")
+                edges.append(shortest_edge[(min(node, previous), max(node, previous))])
+                node = previous
+            paths.append(np.array(edges[::-1], dtype=np.int64))
+    return paths
@@ -0,0 +1,265 @@
+"""
+Archive binaire d'un répertoire de relais (relais.arc), ouverte en mémoire mappée.
+
+Un seul fichier remplace la lecture de centaines de petits GPX :
+
+- en-tête (64 octets) : magic, version, nombre de segments et de points,
+  pas de quantification, empreinte de la signature des GPX décrits ;
+- table des segments : numéros (int64, n) et offsets des points (int64, n+1) ;
+- colonnes quantifiées : latitude et longitude (int32, 1e-7 degré, ~1 cm),
+  altitude (int32, cm, INT32_MIN si absente), temps (int64, ms depuis
+  l'époque, NaT = INT64_MIN, lu directement comme datetime64[ms]).
+
+Chaque section commence sur une frontière de 64 octets. RelayArchive ouvre le
+fichier avec np.memmap : les colonnes sont des vues sans copie, et lire un
+segment ne touche que les pages de ses points.
+
+L'archive est écrite par les notebooks de découpage (write_relay_archive, à
+partir des points en mémoire) ou convertie depuis un dossier de GPX existant :
+
+    python relay_archive.py Relais_gpx_greedy Relais_gpx_dp
+
+Elle n'est utilisée que tant que les GPX du dossier n'ont pas changé depuis son
+écriture (empreinte de gpx_cache.directory_signature).
+"""
+import argparse
+import hashlib
+import os
+import struct
+from datetime import timezone
+from pathlib import Path
+
+import numpy as np
+
+from gpx_cache import directory_signature
+from gpx_ingest import ingest_gpx_files
+from gpx_parser import GpxArrays
+from manifest import GPX_PATTERN, segment_number
+from trace_store import TraceStore
+
+ARCHIVE_FILE = "relais.arc"
+ARCHIVE_MAGIC = b"RELAIS\x00A"
+ARCHIVE_VERSION = 1
+COORD_SCALE = 1e7   # unités par degré
+ELE_SCALE = 100.0   # unités par mètre
+ELE_MISSING = np.iinfo(np.int32).min
+
+# magic, version, n_segments, n_points, coord_scale, ele_scale, empreinte SHA-1 (20 octets), réservé
+_HEADER = struct.Struct("<8sIIQdd20s4x")
+_ALIGN = 64
+
+
+def _aligned(position):
+    return -(-position // _ALIGN) * _ALIGN
+
+
+def _layout(n_segments, n_points):
+    """Positions (octets) des sections : segments, offsets, lat, lon, ele, time, puis taille totale."""
+    sizes = (8 * n_segments, 8 * (n_segments + 1), 4 * n_points, 4 * n_points, 4 * n_points, 8 * n_points)
+    positions, position = [], _aligned(_HEADER.size)
+    for size in sizes:
+        positions.append(position)
+        position = _aligned(position + size)
+    return positions, position
+
+
+def signature_digest(signature):
+    """Empreinte (20 octets) d'une signature de répertoire (cf. directory_signature)."""
+    return hashlib.sha1(repr(tuple(signature)).encode('utf-8')).digest()
+
+
+def arrays_from_points(points):
+    """GpxArrays d'une liste de points gpxpy (latitude, longitude, elevation, time)."""
+    lat = np.array([p.latitude for p in points], dtype=np.float64)
+    lon = np.array([p.longitude for p in points], dtype=np.float64)
+    ele = np.array([np.nan if p.elevation is None else p.elevation for p in points], dtype=np.float64)
+    times = np.array([
+        np.datetime64('NaT', 'ms') if p.time is None
+        else np.datetime64((p.time.astimezone(timezone.utc) if p.time.tzinfo else p.time).replace(tzinfo=None), 'ms')
+        for p in points
+    ], dtype='datetime64[ms]')
+    return GpxArrays(lat, lon, ele, times)
+
+
+def write_archive(path, segments, arrays, signature=()):
+    """
+    Écrit une archive : segments (numéros) et arrays (GpxArrays alignés) ;
+    signature est celle des GPX décrits (cf. directory_signature). Écriture atomique.
+    """
+    segments = np.asarray(segments, dtype=np.int64)
+    arrays = list(arrays)
+    if len(segments) != len(arrays):
+        raise ValueError("Un GpxArrays par segment est attendu")
+    order = np.argsort(segments, kind='stable')
+    segments = segments[order]
+    arrays = [arrays[i] for i in order]
+
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    n_points = int(offsets[-1])
+
+    def column(name, dtype):
+        return np.concatenate([np.asarray(getattr(a, name), dtype=dtype) for a in arrays]) if arrays else np.empty(0, dtype)
+
+    lat, lon, ele = column('lat', np.float64), column('lon', np.float64), column('ele', np.float64)
+    times = column('time', 'datetime64[ms]')
+    ele_q = np.full(n_points, ELE_MISSING, dtype=np.int32)
+    known = np.isfinite(ele)
+    ele_q[known] = np.round(ele[known] * ELE_SCALE)
+    sections = (
+        segments.astype('<i8'), offsets.astype('<i8'),
+        np.round(lat * COORD_SCALE).astype('<i4'), np.round(lon * COORD_SCALE).astype('<i4'),
+        ele_q.astype('<i4'), times.view(np.int64).astype('<i8'),
+    )
+
+    positions, total = _layout(len(segments), n_points)
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, len(segments), n_points,
+                             COORD_SCALE, ELE_SCALE, signature_digest(signature)))
+        for position, section in zip(positions, sections):
+            f.seek(position)
+            f.write(section.tobytes())
+        f.truncate(total)
+    os.replace(tmp, path)
+    return path
+
+
+def write_relay_archive(directory, arrays, segments=None):
+    """
+    Archive des segments d'un répertoire de relais, écrite à partir des points
+    en mémoire juste après les relai_<n>.gpx (segments : 1..n par défaut).
+    """
+    arrays = list(arrays)
+    if segments is None:
+        segments = range(1, len(arrays) + 1)
+    segments = list(segments)
+    signature = directory_signature(directory, GPX_PATTERN)
+    if sorted(segment_number(name) for name, _, _ in signature) != sorted(segments):
+        raise ValueError(f"Les relai_*.gpx de {directory} ne correspondent pas aux segments de l'archive")
+    return write_archive(Path(directory) / ARCHIVE_FILE, segments, arrays, signature)
+
+
+def convert_gpx_directory(directory, mode="process", max_workers=4):
+    """Convertit les relai_*.gpx d'un répertoire en archive. Retourne (chemin, erreurs de parsing)."""
+    signature = directory_signature(directory, GPX_PATTERN)
+    paths = [os.path.join(directory, name) for name, _, _ in signature]
+    arrays, errors = ingest_gpx_files(paths, with_time=True, mode=mode, max_workers=max_workers)
+    path = write_archive(Path(directory) / ARCHIVE_FILE, [segment_number(p) for p in paths], arrays, signature)
+    return path, errors
+
+
+class RelayArchive:
+    """
+    Archive ouverte en mémoire mappée : segments, offsets et colonnes quantifiées
+    sont des vues sur le fichier ; les accès par segment ne décodent que ses points.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._map = np.memmap(self.path, dtype=np.uint8, mode='r')
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{self.path} : archive tronquée")
+        magic, version, n_segments, n_points, self.coord_scale, self.ele_scale, self.digest = \
+            _HEADER.unpack(self._map[:_HEADER.size].tobytes())
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            raise ValueError(f"{self.path} : format d'archive inconnu")
+        positions, total = _layout(n_segments, n_points)
+        if len(self._map) < total:
+            raise ValueError(f"{self.path} : archive tronquée")
+
+        def view(position, dtype, count):
+            return self._map[position:position + count * np.dtype(dtype).itemsize].view(dtype)
+
+        self.segments = view(positions[0], '<i8', n_segments)
+        self.offsets = view(positions[1], '<i8', n_segments + 1)
+        self.lat_q = view(positions[2], '<i4', n_points)
+        self.lon_q = view(positions[3], '<i4', n_points)
+        self.ele_q = view(positions[4], '<i4', n_points)
+        self.times = view(positions[5], '<i8', n_points).view('datetime64[ms]')
+        self._positions = {int(s): i for i, s in enumerate(self.segments.tolist())}
+
+    @classmethod
+    def open(cls, directory, signature=None):
+        """
+        Archive du répertoire, ou None si elle est absente, illisible ou, quand
+        signature est donnée, si les GPX ont changé depuis son écriture.
+        """
+        path = Path(directory) / ARCHIVE_FILE
+        if not path.exists():
+            return None
+        try:
+            archive = cls(path)
+        except (OSError, ValueError):
+            return None
+        if signature is not None and not archive.matches(signature):
+            return None
+        return archive
+
+    def __len__(self):
+        return len(self.segments)
+
+    @property
+    def n_points(self):
+        return len(self.lat_q)
+
+    def matches(self, signature):
+        """Vrai si l'archive a été écrite pour ces GPX (cf. directory_signature)."""
+        return self.digest == signature_digest(signature)
+
+    def position(self, segment):
+        """Indice du segment dans l'archive, ou None s'il est absent."""
+        return self._positions.get(int(segment))
+
+    def _bounds(self, segment):
+        i = self.position(segment)
+        if i is None:
+            raise KeyError(segment)
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def points(self, segment):
+        """Tableau (n, 2) lat/lon du segment."""
+        start, stop = self._bounds(segment)
+        points = np.empty((stop - start, 2))
+        np.divide(self.lat_q[start:stop], self.coord_scale, out=points[:, 0])
+        np.divide(self.lon_q[start:stop], self.coord_scale, out=points[:, 1])
+        return points
+
+    def arrays(self, segment):
+        """GpxArrays (lat, lon, ele, time) du segment."""
+        start, stop = self._bounds(segment)
+        ele_q = self.ele_q[start:stop]
+        ele = np.where(ele_q == ELE_MISSING, np.nan, ele_q / self.ele_scale)
+        points = self.points(segment)
+        return GpxArrays(points[:, 0].copy(), points[:, 1].copy(), ele, np.array(self.times[start:stop]))
+
+    def trace_store(self, segments=None, files=None):
+        """TraceStore des segments demandés (tous par défaut) ; files : chemins associés."""
+        segments = self.segments.tolist() if segments is None else [int(s) for s in segments]
+        files = files if files is not None else [str(self.path.with_name(f"relai_{s}.gpx")) for s in segments]
+        return TraceStore.from_arrays(
+            (segment, file, self.points(segment))
+            for segment, file in zip(segments, files) if self.position(segment) is not None
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convertit des répertoires de relai_*.gpx en archive relais.arc.")
+    parser.add_argument("directories", nargs="+", help="répertoires contenant des relai_*.gpx")
+    parser.add_argument("--workers", type=int, default=4, help="processus de parsing")
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            parser.error(f"{directory} n'est pas un répertoire")
+        path, errors = convert_gpx_directory(directory, max_workers=args.workers)
+        archive = RelayArchive(path)
+        print(f"{directory} : {len(archive)} segments, {archive.n_points} points -> {path} "
+              f"({path.stat().st_size / 1e6:.1f} Mo)")
+        for gpx_file, message in errors.items():
+            print(f"  erreur {gpx_file} : {message}")
+
+
+if __name__ == "__main__":
+    main()
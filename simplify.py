@@ -0,0 +1,115 @@
+"""
+Simplification des traces par Douglas-Peucker, avec une tolérance en mètres.
+
+Plutôt que de relancer l'algorithme pour chaque niveau de détail, on calcule une
+seule fois, pour chaque point, son "importance" : la plus grande tolérance pour
+laquelle Douglas-Peucker le conserve. La simplification à une tolérance donnée
+se réduit alors à un masque (importance > tolérance), et le tracé simplifié reste
+à moins de 'tolérance' mètres du tracé complet (distance point-segment, mesurée
+dans une projection équirectangulaire locale à chaque segment).
+
+Le calcul est vectorisé sur tout le store : à chaque itération, tous les
+intervalles en attente (tous segments confondus) sont découpés en même temps.
+"""
+import numpy as np
+
+from geometry import local_xy_m
+
+# Tolérance (m) associée à chaque cran du curseur "Densité des points" (1 = tous les points)
+DENSITY_TOLERANCES_M = (0.0, 1.0, 2.0, 3.0, 5.0, 8.0, 12.0, 20.0, 30.0, 50.0)
+
+# En dessous de cette déviation, un intervalle n'est plus découpé : tous ses points
+# intérieurs reçoivent la même importance (exacte pour toute tolérance >= MIN_TOLERANCE_M).
+MIN_TOLERANCE_M = 0.5
+
+
+def density_tolerance(density):
+    """Tolérance en mètres correspondant à un cran (1 à 10) du curseur de densité."""
+    density = min(max(int(density), 1), len(DENSITY_TOLERANCES_M))
+    return DENSITY_TOLERANCES_M[density - 1]
+
+
+def _segment_ref_lat(offsets, coords):
+    """Latitude moyenne (degrés) du segment de chaque point."""
+    counts = np.diff(offsets)
+    sums = np.add.reduceat(coords[:, 0], offsets[:-1][counts > 0]) if len(coords) else np.zeros(0)
+    ref = np.zeros(len(counts))
+    ref[counts > 0] = sums / counts[counts > 0]
+    return np.repeat(ref, counts)
+
+
+def _segment_distances(px, py, ax, ay, bx, by):
+    """Distance (m) des points p aux segments [a, b], élément par élément."""
+    dx, dy = bx - ax, by - ay
+    norm2 = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = ((px - ax) * dx + (py - ay) * dy) / norm2
+    t = np.where(norm2 > 0, np.clip(t, 0.0, 1.0), 0.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def douglas_peucker_importance(offsets, coords, min_tolerance_m=MIN_TOLERANCE_M):
+    """
+    Importance (m) de chaque point de (offsets, coords), alignée sur coords.
+
+    Un point est conservé par Douglas-Peucker à la tolérance eps si et seulement
+    si importance > eps. Les extrémités de segment ont une importance infinie.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    offsets = offsets - offsets[0]
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    importance = np.zeros(len(coords))
+    if not len(coords):
+        return importance
+
+    # Projection équirectangulaire centrée sur la latitude moyenne de chaque segment
+    x, y = local_xy_m(coords, _segment_ref_lat(offsets, coords)).T
+    starts, stops = offsets[:-1], offsets[1:]
+    non_empty = stops > starts
+    importance[starts[non_empty]] = np.inf
+    importance[stops[non_empty] - 1] = np.inf
+
+    # Intervalles [first, last] en attente, avec l'importance de leur parent
+    first = starts[stops - starts >= 3]
+    last = stops[stops - starts >= 3] - 1
+    parent = np.full(len(first), np.inf)
+
+    while len(first):
+        n_inner = last - first - 1
+        bounds = np.zeros(len(first) + 1, dtype=np.int64)
+        np.cumsum(n_inner, out=bounds[1:])
+        owner = np.repeat(np.arange(len(first)), n_inner)
+        idx = first[owner] + 1 + (np.arange(bounds[-1]) - bounds[owner])
+
+        dist = _segment_distances(
+            x[idx], y[idx], x[first[owner]], y[first[owner]], x[last[owner]], y[last[owner]]
+        )
+        dmax = np.maximum.reduceat(dist, bounds[:-1])
+        # Premier point atteignant le maximum de chaque intervalle (même choix que la version récursive)
+        hits = np.flatnonzero(dist == dmax[owner])
+        _, first_hit = np.unique(owner[hits], return_index=True)
+        split = idx[hits[first_hit]]
+        level = np.minimum(dmax, parent)
+
+        # Intervalles presque rectilignes : tous les points intérieurs partagent la même importance
+        flat = dmax < min_tolerance_m
+        inner_flat = flat[owner]
+        importance[idx[inner_flat]] = level[owner[inner_flat]]
+
+        keep = ~flat
+        split, level = split[keep], level[keep]
+        importance[split] = level
+        new_first = np.concatenate((first[keep], split))
+        new_last = np.concatenate((split, last[keep]))
+        new_parent = np.concatenate((level, level))
+        pending = new_last - new_first >= 2
+        first, last, parent = new_first[pending], new_last[pending], new_parent[pending]
+
+    return importance
+
+
+def simplification_mask(importance, tolerance_m):
+    """Masque des points conservés à la tolérance donnée (tous si tolérance nulle)."""
+    if tolerance_m <= 0:
+        return np.ones(len(importance), dtype=bool)
+    return importance > tolerance_m
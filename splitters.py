@@ -0,0 +1,388 @@
+"""
+Moteurs de découpage d'une trace en relais, partagés par les notebooks.
+
+split_dp résout la programmation dynamique de split_gpx_dp (minimisation de la
+somme des angles de coupe) sans parcourir chaque couple (i, j) en Python :
+- les distances cumulées donnent, par recherche dichotomique, la fenêtre des
+  points de départ i admissibles pour chaque point d'arrivée j ;
+- les coûts de coupe de toute la fenêtre sont calculés en une opération NumPy.
+Le coût total est O(n·w) opérations vectorisées (w = taille de fenêtre).
+
+split_greedy et split_min_turns sont les boucles de split_gpx_greedy et
+split_gpx_optimize_turns, sans entrées/sorties, pour être appelées sur une
+trace déjà chargée (balayages de paramètres, cf. sweep).
+
+split_shortest_path remplace le graphe quasi complet de split_gpx_reuse_segments :
+les arcs i -> j ne sont jamais stockés, ils sont générés à l'expansion d'un
+nœud à partir de sa fenêtre de distances, et la recherche (Dijkstra, ou A*
+quand une pénalité de longueur donne une borne sur le reste du parcours)
+s'arrête dès que le dernier point est atteint.
+"""
+import bisect
+import heapq
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from geometry import angle_difference_deg, bearing_deg, track_profile
+
+
+class SplitResult(NamedTuple):
+    """Découpage d'une trace : indices des points de coupe, du premier au dernier point."""
+    cuts: np.ndarray     # (k+1,) indices croissants, cuts[0] = 0
+    cost: float          # coût total du découpage
+    lengths: np.ndarray  # (k,) longueur de chaque segment, en km
+
+
+class SearchStats(NamedTuple):
+    """Compteurs d'une recherche de plus court chemin, pour comparer les variantes."""
+    nodes_expanded: int  # nœuds sortis du tas et développés
+    edges_relaxed: int   # arcs i -> j évalués
+    heap_pushes: int     # insertions dans le tas
+
+
+def feasible_windows(cumulative, min_km, max_km):
+    """
+    Fenêtres de prédécesseurs : pour chaque point j, les départs i admissibles
+    (min_km <= cumulative[j] - cumulative[i] <= max_km, i < j) forment
+    l'intervalle [lo[j], hi[j]).
+
+    Les bornes issues de searchsorted sont corrigées pour que la condition soit
+    évaluée exactement comme cumulative[j] - cumulative[i] (mêmes arrondis que
+    la boucle d'origine).
+    """
+    cum = np.asarray(cumulative, dtype=np.float64)
+    n = len(cum)
+    if not n:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    lo = np.searchsorted(cum, cum - max_km, side='left')
+    hi = np.searchsorted(cum, cum - min_km, side='right')
+
+    while True:
+        up = cum - cum[lo] > max_km
+        down = (lo > 0) & (cum - cum[np.maximum(lo - 1, 0)] <= max_km) & ~up
+        lo = lo + up - down
+        if not (up.any() or down.any()):
+            break
+    while True:
+        up = (hi < n) & (cum - cum[np.minimum(hi, n - 1)] >= min_km)
+        down = (hi > 0) & (cum - cum[np.maximum(hi - 1, 0)] < min_km) & ~up
+        hi = hi + up - down
+        if not (up.any() or down.any()):
+            break
+    return lo.astype(np.int64), np.minimum(hi, np.arange(n)).astype(np.int64)
+
+
+def window_cut_costs(coords, incoming, i_start, i_stop, j):
+    """
+    Angles de coupe (degrés) des segments [i, j] pour i dans [i_start, i_stop) :
+    écart entre le cap i -> j et le cap d'arrivée en j (incoming[j]).
+    Nul au dernier point, où aucune coupe n'a lieu.
+    """
+    if j >= len(coords) - 1:
+        return np.zeros(i_stop - i_start)
+    starts = coords[i_start:i_stop]
+    return angle_difference_deg(bearing_deg(starts[:, 0], starts[:, 1], coords[j, 0], coords[j, 1]), incoming[j])
+
+
+def split_dp(coords, min_km, max_km, n_segments=None, target_km=None, length_penalty=0.0, profile=None,
+             candidates=None):
+    """
+    Découpage optimal d'une trace (n, 2) lat/lon en segments de min_km à max_km.
+
+    Coût d'un segment [i, j] : angle de coupe en j, plus
+    length_penalty * (longueur - target_km)² pour pénaliser l'écart à une
+    longueur cible (target_km : longueur moyenne si n_segments est fixé,
+    milieu de [min_km, max_km] sinon).
+
+    n_segments : impose le nombre de segments (ValueError si impossible).
+    candidates : indices des seuls points où couper (cf. candidates.CandidateIndex),
+    le premier et le dernier point étant toujours ajoutés.
+    Sans n_segments ni candidates, même résultat que la DP de split_gpx_dp :
+    à coût égal le départ le plus proche du début est retenu, et si la fin est
+    inatteignable le découpage s'arrête au meilleur point puis rejoint la fin.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    if n < 2:
+        return SplitResult(np.zeros(min(n, 1), dtype=np.int64), 0.0, np.zeros(0))
+    if profile is None:
+        profile = track_profile(coords)
+    if target_km is None:
+        target_km = profile.total / n_segments if n_segments else (min_km + max_km) / 2
+    incoming = np.concatenate(([0.0], profile.bearings))  # incoming[j] = cap j-1 -> j
+
+    # La DP travaille sur les nœuds retenus ; sans candidats, tous les points
+    nodes = np.arange(n) if candidates is None else np.union1d(np.asarray(candidates, dtype=np.int64), [0, n - 1])
+    full_cum = profile.cumulative
+    cum, incoming, points = full_cum[nodes], incoming[nodes], coords[nodes]
+    n = len(nodes)
+
+    # Une ligne par nombre de segments si n_segments est fixé, une seule ligne sinon
+    rows = 1 if n_segments is None else n_segments + 1
+    dp = np.full((rows, n), np.inf)
+    parent = np.full((rows, n), -1, dtype=np.int64)
+    dp[0, 0] = 0.0
+    src, dst = (dp, dp) if n_segments is None else (dp[:-1], dp[1:])
+    dst_parent = parent if n_segments is None else parent[1:]
+
+    lo, hi = feasible_windows(cum, min_km, max_km)
+    for j in np.flatnonzero(hi > lo):
+        a, b = lo[j], hi[j]
+        window = src[:, a:b]
+        if not np.isfinite(window).any():
+            continue
+        cost = window_cut_costs(points, incoming, a, b, j)
+        if length_penalty:
+            cost = cost + length_penalty * (cum[j] - cum[a:b] - target_km) ** 2
+        totals = window + cost
+        best = np.argmin(totals, axis=1)  # premier minimum : plus petit i, comme l'inégalité stricte d'origine
+        values = totals[np.arange(len(totals)), best]
+        reached = values < np.inf
+        dst[reached, j] = values[reached]
+        dst_parent[reached, j] = a + best[reached]
+
+    row, end = rows - 1, n - 1
+    if n_segments is not None:
+        if not np.isfinite(dp[row, end]):
+            raise ValueError(f"Aucun découpage en {n_segments} segments de {min_km} à {max_km} km")
+    elif not np.isfinite(dp[0, end]):
+        end = int(np.argmin(dp[0]))
+
+    path = []
+    cur = end
+    while cur > 0:
+        path.append(cur)
+        cur = parent[row, cur]
+        if n_segments is not None:
+            row -= 1
+    path.append(0)
+    path.reverse()
+    cost = float(dp[rows - 1, end])
+    if path[-1] != n - 1:
+        path.append(n - 1)
+    cuts = nodes[path]
+    return SplitResult(cuts, cost, full_cum[cuts[1:]] - full_cum[cuts[:-1]])
+
+
+def split_greedy(coords, min_km, max_km, profile=None, candidates=None):
+    """
+    Découpage glouton : depuis chaque point de coupe, le suivant est le point
+    de la fenêtre [min_km, max_km] qui minimise l'angle de coupe (premier
+    minimum). Coût : somme des angles de coupe. Mêmes coupes que split_gpx_greedy.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    if n < 2:
+        return SplitResult(np.zeros(min(n, 1), dtype=np.int64), 0.0, np.zeros(0))
+    if profile is None:
+        profile = track_profile(coords)
+    cum = profile.cumulative
+    incoming = np.concatenate(([0.0], profile.bearings))
+    allowed = None
+    if candidates is not None:
+        allowed = np.zeros(n, dtype=bool)
+        allowed[np.asarray(candidates, dtype=np.int64)] = True
+    lo, hi = successor_windows(cum, min_km, max_km)
+
+    cuts = [0]
+    cost = 0.0
+    current = 0
+    while current < n - 1:
+        window = np.arange(lo[current], hi[current])
+        if allowed is not None:
+            window = window[allowed[window]]
+        if not len(window):
+            cuts.append(n - 1)
+            break
+        turns = angle_difference_deg(
+            bearing_deg(coords[current, 0], coords[current, 1], coords[window, 0], coords[window, 1]),
+            incoming[window]
+        )
+        turns[window == n - 1] = 0
+        k = int(np.argmin(turns))
+        cost += float(turns[k])
+        current = int(window[k])
+        cuts.append(current)
+    cuts = np.asarray(cuts, dtype=np.int64)
+    return SplitResult(cuts, cost, cum[cuts[1:]] - cum[cuts[:-1]])
+
+
+def split_min_turns(coords, min_km, max_km, turn_threshold_deg, profile=None, candidates=None):
+    """
+    Découpage de split_gpx_optimize_turns : depuis chaque point de coupe, le
+    premier segment admissible sans virage (>= turn_threshold_deg), prolongé
+    tant qu'aucun virage n'apparaît, sinon celui qui en compte le moins.
+    Coût : nombre total de virages dans les segments.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    if n < 2:
+        return SplitResult(np.zeros(min(n, 1), dtype=np.int64), 0.0, np.zeros(0))
+    if profile is None:
+        profile = track_profile(coords)
+    distances = profile.cumulative.tolist()
+    step_turns = angle_difference_deg(profile.bearings[:-1], profile.bearings[1:])  # virage au point i (i >= 1)
+    turn_points = (np.flatnonzero(step_turns >= turn_threshold_deg) + 1).tolist()
+    cut_points = list(range(n)) if candidates is None else np.union1d(candidates, [n - 1]).tolist()
+
+    def turns_between(start_idx, end_idx):
+        """Nombre de virages dans (start_idx, end_idx]."""
+        return bisect.bisect_right(turn_points, end_idx) - bisect.bisect_right(turn_points, start_idx)
+
+    cuts = [0]
+    current = 0
+    while current < n - 1:
+        best_end = None
+        lowest_turns = math.inf
+        start_dist = distances[current]
+
+        first_pos = bisect.bisect_right(cut_points, current)
+        for pos in range(first_pos, len(cut_points)):
+            end = cut_points[pos]
+            segment_dist = distances[end] - start_dist
+            if segment_dist > max_km:
+                break
+            if segment_dist < min_km:
+                continue
+            segment_turns = turns_between(current, end)
+            if segment_turns == 0:
+                # Segment sans virage : on le prolonge tant qu'aucun virage n'apparaît
+                best_end = end
+                while pos + 1 < len(cut_points) and distances[cut_points[pos + 1]] - start_dist <= max_km:
+                    if turns_between(end, cut_points[pos + 1]):
+                        break
+                    pos += 1
+                    end = cut_points[pos]
+                    best_end = end
+                break
+            if segment_turns < lowest_turns:
+                lowest_turns = segment_turns
+                best_end = end
+
+        if best_end is None:
+            # Aucun segment dans [min_km, max_km] : le plus court au-delà de min_km, sinon la fin
+            best_end = next((end for end in cut_points[first_pos:] if distances[end] - start_dist >= min_km), n - 1)
+        cuts.append(best_end)
+        current = best_end
+
+    cuts = np.asarray(cuts, dtype=np.int64)
+    cost = float(sum(turns_between(a, b) for a, b in zip(cuts[:-1], cuts[1:])))
+    return SplitResult(cuts, cost, profile.cumulative[cuts[1:]] - profile.cumulative[cuts[:-1]])
+
+
+def successor_windows(cumulative, min_km, max_km):
+    """
+    Fenêtres de successeurs : pour chaque point i, les arrivées j admissibles
+    (min_km <= cumulative[j] - cumulative[i] <= max_km, j > i) forment
+    l'intervalle [lo[i], hi[i]). Mêmes corrections d'arrondi que feasible_windows.
+    """
+    cum = np.asarray(cumulative, dtype=np.float64)
+    n = len(cum)
+    if not n:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    lo = np.searchsorted(cum, cum + min_km, side='left')
+    hi = np.searchsorted(cum, cum + max_km, side='right')
+
+    while True:
+        up = (lo < n) & (cum[np.minimum(lo, n - 1)] - cum < min_km)
+        down = (lo > 0) & (cum[np.maximum(lo - 1, 0)] - cum >= min_km) & ~up
+        lo = lo + up - down
+        if not (up.any() or down.any()):
+            break
+    while True:
+        up = (hi < n) & (cum[np.minimum(hi, n - 1)] - cum <= max_km)
+        down = (hi > 0) & (cum[np.maximum(hi - 1, 0)] - cum > max_km) & ~up
+        hi = hi + up - down
+        if not (up.any() or down.any()):
+            break
+    lo = np.maximum(lo, np.arange(n) + 1)
+    return lo.astype(np.int64), np.maximum(hi, lo).astype(np.int64)
+
+
+def _remaining_penalty_bound(remaining_km, min_km, max_km, target_km, length_penalty):
+    """
+    Minorant de la pénalité de longueur restant à payer pour couvrir remaining_km
+    (heuristique A*) : avec k segments, la somme des (l - cible)² vaut au moins
+    k·(remaining/k - cible)² ; on prend le meilleur k admissible.
+    """
+    if not length_penalty or remaining_km <= 0:
+        return 0.0
+    k_min = max(1, math.ceil(remaining_km / max_km - 1e-9))
+    k_max = math.floor(remaining_km / min_km + 1e-9) if min_km > 0 else max(k_min, math.ceil(remaining_km / target_km) + 1)
+    if k_max < k_min:
+        return 0.0
+    # (remaining - k·cible)² / k est convexe en k : minimum au voisinage de remaining / cible
+    best_k = remaining_km / target_km if target_km > 0 else k_max
+    candidates = {min(max(k, k_min), k_max) for k in (math.floor(best_k), math.ceil(best_k))}
+    return length_penalty * min((remaining_km - k * target_km) ** 2 / k for k in candidates)
+
+
+def split_shortest_path(coords, min_km, max_km, target_km=None, length_penalty=0.0, profile=None):
+    """
+    Découpage par plus court chemin sur le graphe implicite des points :
+    un arc i -> j existe si min_km <= distance le long de la trace <= max_km,
+    de coût l'angle entre le cap i -> j et le cap j -> j+1 (nul au dernier
+    point), plus length_penalty * (longueur - target_km)².
+
+    Retourne (SplitResult, SearchStats). Si le dernier point est inatteignable,
+    le chemin s'arrête au point atteint le plus loin.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    if n < 2:
+        return SplitResult(np.zeros(min(n, 1), dtype=np.int64), 0.0, np.zeros(0)), SearchStats(0, 0, 0)
+    if profile is None:
+        profile = track_profile(coords)
+    cum = profile.cumulative
+    outgoing = np.append(profile.bearings, 0.0)  # outgoing[j] = cap j -> j+1
+    if target_km is None:
+        target_km = (min_km + max_km) / 2
+    lo, hi = successor_windows(cum, min_km, max_km)
+
+    dist = np.full(n, np.inf)
+    parent = np.full(n, -1, dtype=np.int64)
+    dist[0] = 0.0
+    heap = [(_remaining_penalty_bound(profile.total, min_km, max_km, target_km, length_penalty), 0.0, 0)]
+    expanded = relaxed = pushes = 0
+    while heap:
+        _, g, i = heapq.heappop(heap)
+        if g > dist[i]:
+            continue
+        if i == n - 1:
+            break
+        expanded += 1
+        a, b = lo[i], hi[i]
+        if b <= a:
+            continue
+        js = np.arange(a, b)
+        cost = angle_difference_deg(bearing_deg(coords[i, 0], coords[i, 1], coords[a:b, 0], coords[a:b, 1]), outgoing[a:b])
+        cost[js == n - 1] = 0.0
+        if length_penalty:
+            cost += length_penalty * (cum[a:b] - cum[i] - target_km) ** 2
+        candidate = g + cost
+        relaxed += int(b - a)
+        better = np.flatnonzero(candidate < dist[a:b])
+        if not len(better):
+            continue
+        improved = js[better]
+        dist[improved] = candidate[better]
+        parent[improved] = i
+        for j, g_j in zip(improved.tolist(), candidate[better].tolist()):
+            h = _remaining_penalty_bound(profile.total - cum[j], min_km, max_km, target_km, length_penalty)
+            heapq.heappush(heap, (g_j + h, g_j, j))
+        pushes += len(improved)
+
+    end = n - 1
+    if not np.isfinite(dist[end]):
+        end = int(np.flatnonzero(np.isfinite(dist))[-1])
+    path = []
+    cur = end
+    while cur != -1:
+        path.append(cur)
+        cur = parent[cur]
+    path.reverse()
+    cuts = np.asarray(path, dtype=np.int64)
+    result = SplitResult(cuts, float(dist[end]), cum[cuts[1:]] - cum[cuts[:-1]])
+    return result, SearchStats(expanded, relaxed, pushes)
@@ -0,0 +1,310 @@
+"""
+Graphe des rues nettoyé, persisté en tableaux NumPy relus en mémoire mappée.
+
+Le graphe piéton de Chinese_sub_optimal_improved.ipynb (osmnx) est téléchargé
+et nettoyé une seule fois (build_street_graph) :
+- géométrie reconstruite pour les arêtes qui n'en ont pas ;
+- suppression des arêtes sans 'name' et des routes exclues ;
+- conservation de la plus grande composante connexe ;
+- arêtes parallèles fusionnées (la plus courte est conservée).
+
+Le résultat est écrit dans un répertoire de fichiers .npy (nœuds, arêtes,
+adjacence CSR, géométries concaténées) et un meta.json ; StreetGraph.load le
+relit en mode mmap, sans osmnx ni réseau :
+
+    python street_graph.py paris_walk_graph --place "Paris, France"
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from geometry import local_xy_m
+
+FORMAT_VERSION = 1
+STREET_GRAPH_DIR = "paris_walk_graph"
+DEFAULT_PLACE = "Paris, France"
+WALK_FILTER = ('["highway"~"residential|primary|secondary|tertiary|unclassified|pedestrian|tertiary_link|'
+               'living_street|steps|secondary_link|primary_link|road|busway"]')
+EXCLUDED_ROADS = ["Quai de Bercy", "Quai de la Rapée", "Place de la Porte de Pantin",
+                  "Avenue de la Porte de Pantin", "Tunnel Vers Porte de la vilette",
+                  "Tunnel Chaumont Pantin", "Rue Robert-Etlin", "Port de Bercy",
+                  "Rue du Général de Langle de Cary"]
+
+_ARRAYS = ("node_ids", "lat", "lon", "edge_u", "edge_v", "edge_length", "edge_name",
+           "geom_offsets", "geom_coords", "indptr", "adj_node", "adj_edge")
+
+
+def edge_name(name):
+    """Nom d'une arête OSM : 'name' peut être une chaîne ou une liste de noms."""
+    if isinstance(name, (list, tuple)):
+        return " / ".join(dict.fromkeys(str(n) for n in name))
+    return str(name)
+
+
+def _is_excluded(name, excluded):
+    if isinstance(name, list):
+        return any(route in name for route in excluded)
+    return name in excluded
+
+
+def clean_street_graph(G, excluded_names=()):
+    """
+    Nettoie un graphe osmnx (MultiDiGraph) comme le notebook : retourne
+    (MultiGraph simplifié, statistiques de nettoyage).
+    """
+    import networkx as nx
+    from shapely.geometry import LineString
+
+    stats = {"highway_km": {}}
+    G = G.copy()
+    for u, v, key, data in G.edges(keys=True, data=True):
+        if 'geometry' not in data:
+            data['geometry'] = LineString([(G.nodes[u]['x'], G.nodes[u]['y']), (G.nodes[v]['x'], G.nodes[v]['y'])])
+        highway = data.get('highway')
+        highway = ", ".join(highway) if isinstance(highway, list) else str(highway)
+        stats["highway_km"][highway] = stats["highway_km"].get(highway, 0.0) + data['length'] / 1000
+
+    G_proj = nx.MultiGraph(G.to_undirected())
+
+    def remove(label, predicate):
+        edges = [(u, v, key, data['length']) for u, v, key, data in G_proj.edges(keys=True, data=True) if predicate(data)]
+        G_proj.remove_edges_from([edge[:3] for edge in edges])
+        stats[label] = {"arêtes": len(edges), "km": sum(edge[3] for edge in edges) / 1000}
+
+    remove("sans_nom", lambda data: 'name' not in data)
+    excluded = set(excluded_names)
+    remove("routes_exclues", lambda data: _is_excluded(data['name'], excluded))
+
+    components = list(nx.connected_components(G_proj))
+    stats["composantes"] = len(components)
+    if len(components) > 1:
+        G_proj = G_proj.subgraph(max(components, key=len)).copy()
+
+    # Arêtes parallèles : on ne garde que la plus courte (la première à longueur égale)
+    G_simple = nx.MultiGraph()
+    G_simple.add_nodes_from((n, G_proj.nodes[n]) for n in G_proj.nodes())
+    for u, v, key, data in G_proj.edges(keys=True, data=True):
+        if G_simple.has_edge(u, v):
+            existing_edges = G_simple.get_edge_data(u, v)
+            min_key = min(existing_edges, key=lambda k: existing_edges[k]['length'])
+            if data['length'] < existing_edges[min_key]['length']:
+                G_simple.remove_edge(u, v, key=min_key)
+                G_simple.add_edge(u, v, key=key, **data)
+        else:
+            G_simple.add_edge(u, v, key=key, **data)
+    G_simple.graph.update(G_proj.graph)
+    return G_simple, stats
+
+
+class StreetGraph:
+    """
+    Graphe non orienté en tableaux (éventuellement mappés en mémoire).
+
+    - node_ids, lat, lon : identifiant OSM et coordonnées de chaque nœud
+    - edge_u, edge_v, edge_length (m), edge_name : extrémités, longueur et
+      indice du nom (dans names, -1 si aucun) de chaque arête
+    - geom_offsets, geom_coords : géométrie (lat/lon, de u vers v) de l'arête e
+      = geom_coords[geom_offsets[e]:geom_offsets[e+1]]
+    - indptr, adj_node, adj_edge : adjacence CSR ; les voisins du nœud i sont
+      adj_node[indptr[i]:indptr[i+1]], par les arêtes adj_edge[...]
+    """
+
+    def __init__(self, node_ids, lat, lon, edge_u, edge_v, edge_length, edge_name, geom_offsets, geom_coords,
+                 names, indptr=None, adj_node=None, adj_edge=None, meta=None):
+        self.node_ids, self.lat, self.lon = node_ids, lat, lon
+        self.edge_u, self.edge_v, self.edge_length, self.edge_name = edge_u, edge_v, edge_length, edge_name
+        self.geom_offsets, self.geom_coords = geom_offsets, geom_coords
+        self.names = list(names)
+        if indptr is None:
+            indptr, adj_node, adj_edge = self._csr(len(node_ids), edge_u, edge_v)
+        self.indptr, self.adj_node, self.adj_edge = indptr, adj_node, adj_edge
+        self.meta = dict(meta or {})
+        self._tree = None
+
+    @staticmethod
+    def _csr(n_nodes, edge_u, edge_v):
+        edges = np.arange(len(edge_u), dtype=np.int32)
+        sources = np.concatenate((edge_u, edge_v))
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n_nodes), out=indptr[1:])
+        adj_node = np.concatenate((edge_v, edge_u))[order].astype(np.int32)
+        adj_edge = np.concatenate((edges, edges))[order]
+        return indptr, adj_node, adj_edge
+
+    @property
+    def n_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self):
+        return len(self.edge_u)
+
+    @property
+    def total_km(self):
+        return float(self.edge_length.sum()) / 1000
+
+    def degrees(self):
+        """Degré de chaque nœud (une boucle compte deux fois, comme networkx)."""
+        return np.diff(self.indptr)
+
+    def neighbors(self, node):
+        """(voisins, arêtes) du nœud d'indice node."""
+        start, stop = self.indptr[node], self.indptr[node + 1]
+        return self.adj_node[start:stop], self.adj_edge[start:stop]
+
+    def edge_geometry(self, edge):
+        """Vue (k, 2) lat/lon de la géométrie de l'arête, orientée de edge_u vers edge_v."""
+        return self.geom_coords[self.geom_offsets[edge]:self.geom_offsets[edge + 1]]
+
+    def edge_street(self, edge):
+        name_id = self.edge_name[edge]
+        return self.names[name_id] if name_id >= 0 else None
+
+    def named_lines(self):
+        """(nom, géométrie lat/lon) de chaque arête nommée, pour geocoder.StreetIndex.from_lines."""
+        for edge in np.flatnonzero(np.asarray(self.edge_name) >= 0):
+            yield self.names[self.edge_name[edge]], self.edge_geometry(edge)
+
+    def nearest_node(self, lat, lon):
+        """Indice du nœud le plus proche d'un point."""
+        if self._tree is None:
+            self._ref_lat = float(np.mean(self.lat))
+            self._tree = cKDTree(local_xy_m(np.column_stack((self.lat, self.lon)), self._ref_lat))
+        return int(self._tree.query(local_xy_m([(lat, lon)], self._ref_lat)[0])[1])
+
+    @classmethod
+    def from_networkx(cls, G, meta=None):
+        """Convertit un graphe networkx (nœuds x/y, arêtes length/name/geometry en lon/lat)."""
+        node_ids = np.array(sorted(G.nodes()), dtype=np.int64)
+        position = {int(n): i for i, n in enumerate(node_ids)}
+        lat = np.array([G.nodes[n]['y'] for n in node_ids.tolist()], dtype=np.float64)
+        lon = np.array([G.nodes[n]['x'] for n in node_ids.tolist()], dtype=np.float64)
+
+        names, name_positions = [], {}
+        edge_u, edge_v, edge_length, edge_names, geometries = [], [], [], [], []
+        for u, v, data in G.edges(data=True):
+            iu, iv = position[u], position[v]
+            if 'geometry' in data:
+                geometry = np.asarray(data['geometry'].coords, dtype=np.float64)[:, ::-1]
+            else:
+                geometry = np.array([(lat[iu], lon[iu]), (lat[iv], lon[iv])])
+            # Géométrie orientée de u vers v
+            if np.abs(geometry[0] - (lat[iu], lon[iu])).sum() > np.abs(geometry[-1] - (lat[iu], lon[iu])).sum():
+                geometry = geometry[::-1]
+            name_id = -1
+            if 'name' in data:
+                name = edge_name(data['name'])
+                name_id = name_positions.setdefault(name, len(names))
+                if name_id == len(names):
+                    names.append(name)
+            edge_u.append(iu)
+            edge_v.append(iv)
+            edge_length.append(data['length'])
+            edge_names.append(name_id)
+            geometries.append(geometry)
+
+        geom_offsets = np.zeros(len(geometries) + 1, dtype=np.int64)
+        np.cumsum([len(g) for g in geometries], out=geom_offsets[1:])
+        geom_coords = np.concatenate(geometries) if geometries else np.empty((0, 2))
+        return cls(node_ids, lat, lon, np.array(edge_u, dtype=np.int32), np.array(edge_v, dtype=np.int32),
+                   np.array(edge_length, dtype=np.float64), np.array(edge_names, dtype=np.int32),
+                   geom_offsets, geom_coords, names, meta=meta)
+
+    def to_networkx(self):
+        """MultiGraph networkx équivalent (attributs osmnx : x, y, length, name, geometry, crs)."""
+        import networkx as nx
+        from shapely.geometry import LineString
+
+        G = nx.MultiGraph(crs="epsg:4326")
+        node_ids = self.node_ids.tolist()
+        G.add_nodes_from((n, {"x": x, "y": y}) for n, x, y in zip(node_ids, self.lon.tolist(), self.lat.tolist()))
+        for e, (u, v, length, name_id) in enumerate(zip(self.edge_u.tolist(), self.edge_v.tolist(),
+                                                       self.edge_length.tolist(), self.edge_name.tolist())):
+            data = {"length": length, "geometry": LineString(self.edge_geometry(e)[:, ::-1])}
+            if name_id >= 0:
+                data["name"] = self.names[name_id]
+            G.add_edge(node_ids[u], node_ids[v], **data)
+        return G
+
+    def save(self, directory=STREET_GRAPH_DIR):
+        """Écrit le graphe dans directory (remplacé d'un bloc, via un répertoire temporaire)."""
+        directory = Path(directory)
+        tmp = directory.with_name(f"{directory.name}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name in _ARRAYS:
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        meta = dict(self.meta, version=FORMAT_VERSION, nodes=self.n_nodes, edges=self.n_edges)
+        with open(tmp / "names.json", 'w', encoding='utf-8') as f:
+            json.dump(self.names, f, ensure_ascii=False)
+        with open(tmp / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp, directory)
+
+    @classmethod
+    def load(cls, directory=STREET_GRAPH_DIR, mmap=True):
+        """Relit un graphe écrit par save ; les tableaux sont mappés en mémoire si mmap."""
+        directory = Path(directory)
+        with open(directory / "meta.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Format de graphe non supporté : {meta.get('version')}")
+        with open(directory / "names.json", 'r', encoding='utf-8') as f:
+            names = json.load(f)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode='r' if mmap else None) for name in _ARRAYS}
+        return cls(names=names, meta=meta, **arrays)
+
+
+def build_street_graph(place=DEFAULT_PLACE, custom_filter=WALK_FILTER, excluded_names=EXCLUDED_ROADS):
+    """Télécharge (osmnx) et nettoie le graphe piéton de place ; retourne le StreetGraph."""
+    import osmnx as ox
+
+    G = ox.graph_from_place(place, network_type='walk', custom_filter=custom_filter)
+    G_simple, stats = clean_street_graph(G, excluded_names)
+    meta = {"place": place, "custom_filter": custom_filter, "excluded_names": list(excluded_names), "stats": stats}
+    return StreetGraph.from_networkx(G_simple, meta)
+
+
+def load_or_build_street_graph(directory=STREET_GRAPH_DIR, place=DEFAULT_PLACE, custom_filter=WALK_FILTER,
+                               excluded_names=EXCLUDED_ROADS):
+    """
+    Graphe relu depuis directory s'il a été construit avec les mêmes paramètres,
+    sinon construit (osmnx, réseau) puis sauvegardé.
+    """
+    wanted = {"place": place, "custom_filter": custom_filter, "excluded_names": list(excluded_names)}
+    try:
+        graph = StreetGraph.load(directory)
+        if all(graph.meta.get(key) == value for key, value in wanted.items()):
+            return graph
+    except (OSError, ValueError):
+        pass
+    graph = build_street_graph(place, custom_filter, excluded_names)
+    graph.save(directory)
+    return StreetGraph.load(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit et sauvegarde le graphe des rues nettoyé")
+    parser.add_argument("directory", nargs="?", default=STREET_GRAPH_DIR)
+    parser.add_argument("--place", default=DEFAULT_PLACE)
+    parser.add_argument("--filter", default=WALK_FILTER, dest="custom_filter")
+    parser.add_argument("--exclude", nargs="*", default=EXCLUDED_ROADS, help="noms de routes à supprimer")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = build_street_graph(args.place, args.custom_filter, args.exclude)
+    graph.save(args.directory)
+    print(f"{graph.n_nodes} nœuds, {graph.n_edges} arêtes, {graph.total_km:.2f} km "
+          f"écrits dans {args.directory} en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Balayage de paramètres des méthodes de découpage (Greedy, DP, Optimisé, Reuse).
+
+La trace GPX est lue une seule fois ; ses coordonnées sont transmises une fois à
+chaque processus du pool (initializer), qui calcule le profil (distances, caps)
+et les points candidats puis évalue les configurations
+(méthode, min_km, max_km, seuil de virage) qu'on lui confie. Le résultat est une
+table longue, une ligne par segment, écrite en parquet (ou CSV) : c'est d'elle
+que sont tirés comparaison_methodes.xlsx et les graphiques de comparaison.
+
+    python sweep.py circuit.gpx --min 3 4 5 6 7 --max 10 12 15 18 20 --thresholds 25 40
+"""
+import argparse
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from candidates import DEFAULT_SPACING_M, build_candidate_index
+from geometry import count_turns, track_profile
+from gpx_parser import parse_gpx
+from splitters import split_dp, split_greedy, split_min_turns, split_shortest_path
+
+METHODS = ("Greedy", "DP", "Optimisé", "Reuse")
+RESULT_COLUMNS = [
+    "Méthode", "Min (km)", "Max (km)", "Seuil virage (°)", "Candidats",
+    "Segment", "Distance (km)", "Nombre de virages", "Coût", "Durée (s)"
+]
+
+# État d'un processus du pool : trace partagée et index de candidats par seuil
+_worker = {}
+
+
+def load_track(gpx_file):
+    """Coordonnées (n, 2) lat/lon de tous les points de trace du fichier."""
+    return parse_gpx(gpx_file, with_time=False).coords
+
+
+def sweep_grid(methods=METHODS, min_kms=(5.0,), max_kms=(15.0,), thresholds=(25.0,)):
+    """Configurations (méthode, min_km, max_km, seuil) du produit cartésien, min_km < max_km."""
+    return [
+        (method, float(min_km), float(max_km), float(threshold))
+        for method, min_km, max_km, threshold in itertools.product(methods, min_kms, max_kms, thresholds)
+        if min_km < max_km
+    ]
+
+
+def _init_worker(coords, use_candidates, spacing_m):
+    _worker.clear()
+    _worker.update(
+        coords=coords,
+        profile=track_profile(coords),
+        use_candidates=use_candidates,
+        spacing_m=spacing_m,
+        candidates={}
+    )
+
+
+def _candidates(threshold):
+    if not _worker["use_candidates"]:
+        return None
+    if threshold not in _worker["candidates"]:
+        index = build_candidate_index(_worker["coords"], _worker["profile"], spacing_m=_worker["spacing_m"],
+                                      turn_threshold_deg=threshold)
+        _worker["candidates"][threshold] = index.indices
+    return _worker["candidates"][threshold]
+
+
+def _run_config(config):
+    """Évalue une configuration ; retourne ses lignes (une par segment)."""
+    method, min_km, max_km, threshold = config
+    coords, profile = _worker["coords"], _worker["profile"]
+    start = time.perf_counter()
+    if method == "Greedy":
+        result = split_greedy(coords, min_km, max_km, profile=profile, candidates=_candidates(threshold))
+    elif method == "DP":
+        result = split_dp(coords, min_km, max_km, profile=profile, candidates=_candidates(threshold))
+    elif method == "Optimisé":
+        result = split_min_turns(coords, min_km, max_km, threshold, profile=profile,
+                                 candidates=_candidates(threshold))
+    elif method == "Reuse":
+        result, _ = split_shortest_path(coords, min_km, max_km, profile=profile)
+    else:
+        raise ValueError(f"Méthode inconnue : {method}")
+    elapsed = time.perf_counter() - start
+
+    rows = []
+    for k, (first, last) in enumerate(zip(result.cuts[:-1], result.cuts[1:]), start=1):
+        rows.append((
+            method, min_km, max_km, threshold, _worker["use_candidates"] and method != "Reuse",
+            k, float(profile.cumulative[last] - profile.cumulative[first]),
+            count_turns(profile.bearings[first:last], threshold), result.cost, elapsed
+        ))
+    return rows
+
+
+def run_sweep(coords, configs, max_workers=None, use_candidates=True, spacing_m=DEFAULT_SPACING_M):
+    """
+    Évalue les configurations sur la trace coords, en parallèle sur max_workers
+    processus (tous les cœurs par défaut). Retourne la table des résultats
+    (DataFrame, colonnes RESULT_COLUMNS).
+    """
+    coords = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 2)
+    configs = list(configs)
+    max_workers = max(1, int(max_workers or os.cpu_count() or 1))
+    init_args = (coords, use_candidates, spacing_m)
+
+    def run_serial():
+        _init_worker(*init_args)
+        return [_run_config(config) for config in configs]
+
+    if max_workers == 1 or len(configs) <= 1:
+        results = run_serial()
+    else:
+        try:
+            # "spawn" comme gpx_ingest : pas de fork d'un processus multi-threadé
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(max_workers, len(configs)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=init_args
+            ) as executor:
+                chunksize = max(1, len(configs) // (max_workers * 4))
+                results = list(executor.map(_run_config, configs, chunksize=chunksize))
+        except (concurrent.futures.process.BrokenProcessPool, OSError):
+            results = run_serial()
+
+    return pd.DataFrame([row for rows in results for row in rows], columns=RESULT_COLUMNS)
+
+
+def write_results(results, path):
+    """Écrit la table en parquet (.parquet) ou CSV (sans pyarrow, repli sur un CSV voisin) ; retourne le chemin écrit."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        try:
+            results.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            path = path.with_suffix(".csv")
+    results.to_csv(path, index=False)
+    return path
+
+
+def read_results(path):
+    path = Path(path)
+    return pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+
+
+def summarize_sweep(results):
+    """Une ligne par configuration : segments, distance, virages, écart-type des longueurs, coût, durée."""
+    keys = ["Méthode", "Min (km)", "Max (km)", "Seuil virage (°)"]
+    summary = results.groupby(keys, sort=False).agg(**{
+        "Segments": ("Segment", "count"),
+        "Distance totale (km)": ("Distance (km)", "sum"),
+        "Nombre total de virages": ("Nombre de virages", "sum"),
+        "Écart-type longueurs (km)": ("Distance (km)", "std"),
+        "Coût": ("Coût", "first"),
+        "Durée (s)": ("Durée (s)", "first"),
+    }).reset_index()
+    summary["Virages/km"] = summary["Nombre total de virages"] / summary["Distance totale (km)"]
+    return summary
+
+
+def method_tables(results, min_km, max_km, threshold):
+    """Segments de chaque méthode pour une configuration : {méthode: DataFrame}."""
+    selected = results[
+        np.isclose(results["Min (km)"], min_km)
+        & np.isclose(results["Max (km)"], max_km)
+        & np.isclose(results["Seuil virage (°)"], threshold)
+    ]
+    if selected.empty:
+        raise ValueError(f"Configuration absente du balayage : min {min_km} km, max {max_km} km, "
+                         f"seuil {threshold}° (à ajouter à sweep_grid)")
+    return {
+        method: group[["Segment", "Distance (km)", "Nombre de virages"]].reset_index(drop=True)
+        for method, group in selected.groupby("Méthode", sort=False)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Balayage de paramètres des méthodes de découpage")
+    parser.add_argument("gpx_file")
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=METHODS)
+    parser.add_argument("--min", nargs="+", type=float, default=[3, 4, 5, 6, 7], dest="min_kms")
+    parser.add_argument("--max", nargs="+", type=float, default=[10, 12, 15, 18, 20], dest="max_kms")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[25, 40])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--all-points", action="store_true", help="couper en tout point (pas d'index de candidats)")
+    parser.add_argument("--output", default="comparaison_methodes_sweep.parquet")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    coords = load_track(args.gpx_file)
+    configs = sweep_grid(args.methods, args.min_kms, args.max_kms, args.thresholds)
+    print(f"{len(coords)} points, {len(configs)} configurations")
+    results = run_sweep(coords, configs, max_workers=args.workers, use_candidates=not args.all_points)
+    path = write_results(results, args.output)
+    print(f"{len(results)} segments écrits dans {path} en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Appariement des nœuds impairs (matching.py) comparé à l'appariement exact de
+networkx (min_weight_matching sur toutes les distances de plus court chemin),
+sur de petits graphes synthétiques.
+
+    python -m pytest tests
+"""
+import networkx as nx
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import dijkstra
+
+from geometry import haversine_km
+from matching import length_matrix, match_odd_nodes, odd_nodes
+from street_graph import StreetGraph
+
+
+def synthetic_graph(seed, n=150):
+    """Graphe de rues aléatoire connexe : arbre couvrant euclidien plus un tiers des arêtes proches."""
+    rng = np.random.default_rng(seed)
+    lat = 48.85 + rng.random(n) * 0.02
+    lon = 2.33 + rng.random(n) * 0.03
+    near = nx.random_geometric_graph(n, 0.15, pos={k: (rng.random(), rng.random()) for k in range(n)}, seed=seed)
+    complete = nx.Graph()
+    a, b = np.triu_indices(n, 1)
+    complete.add_weighted_edges_from(zip(a.tolist(), b.tolist(), haversine_km(lat[a], lon[a], lat[b], lon[b]).tolist()))
+    edges = set(nx.minimum_spanning_tree(complete).edges())
+    edges.update(e for e in near.edges() if rng.random() < 0.35)
+    u, v = (np.array(side, dtype=np.int32) for side in zip(*sorted(edges)))
+    length = haversine_km(lat[u], lon[u], lat[v], lon[v]) * 1000 * (1 + 0.3 * rng.random(len(u)))
+    return StreetGraph(np.arange(n), lat, lon, u, v, length, np.full(len(u), -1, dtype=np.int32),
+                       np.zeros(len(u) + 1, dtype=np.int64), np.empty((0, 2)), [])
+
+
+def exact_km(graph):
+    """Longueur (km) de l'appariement parfait de poids minimal, sur toutes les paires de nœuds impairs."""
+    odd = odd_nodes(graph)
+    distances = dijkstra(length_matrix(graph), directed=False, indices=odd)[:, odd]
+    complete = nx.Graph()
+    a, b = np.triu_indices(len(odd), 1)
+    complete.add_weighted_edges_from(zip(a.tolist(), b.tolist(), distances[a, b].tolist()))
+    return sum(distances[i, j] for i, j in nx.min_weight_matching(complete)) / 1000
+
+
+def assert_perfect(graph, matching):
+    matched = np.sort(matching.pairs.ravel())
+    assert np.array_equal(matched, odd_nodes(graph))
+    assert matching.added_km == pytest.approx(matching.distances.sum() / 1000)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("radius_m", [150.0, 400.0, 1500.0])
+def test_never_worse_than_greedy(seed, radius_m):
+    graph = synthetic_graph(seed)
+    exact = exact_km(graph)
+    greedy = match_odd_nodes(graph, radius_m=radius_m, method="greedy")
+    assert_perfect(graph, greedy)
+    for method in ("auto", "blossom"):
+        matching = match_odd_nodes(graph, radius_m=radius_m, method=method)
+        assert_perfect(graph, matching)
+        assert exact - 1e-9 <= matching.added_km <= greedy.added_km + 1e-9
+        # Petit rayon : les nœuds restants disposent aussi de candidats sans borne
+        assert matching.added_km <= exact * 1.05
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_blossom_exact_on_complete_candidates(seed):
+    graph = synthetic_graph(seed)
+    n_odd = len(odd_nodes(graph))
+    matching = match_odd_nodes(graph, radius_m=np.inf, method="blossom", k_nearest=n_odd)
+    assert matching.added_km == pytest.approx(exact_km(graph))
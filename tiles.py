@@ -0,0 +1,260 @@
+"""
+Tuiles GeoJSON par niveau de zoom pour la carte d'ensemble.
+
+Pour chaque zoom, les tracés sont simplifiés à environ un pixel (cf. simplify),
+puis découpés selon la grille des tuiles web (Web Mercator, 256 px) :
+static/tiles/<empreinte>/<z>/<x>/<y>.geojson, plus un index.json listant les
+tuiles non vides. Le navigateur (GeoJsonTileLoader) ne charge que les tuiles
+visibles au zoom courant ; la sélection des segments est appliquée côté client,
+les tuiles sont donc communes à toutes les sélections.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+
+import folium
+import numpy as np
+from jinja2 import Template
+
+from simplify import simplification_mask
+
+TILE_SIZE_PX = 256
+# Mètres par pixel à l'équateur au zoom 0
+EQUATOR_M_PER_PX = 156543.03392
+DEFAULT_MIN_ZOOM = 10
+DEFAULT_MAX_ZOOM = 16
+
+
+def zoom_tolerance_m(zoom, latitude, pixel_tolerance=1.0):
+    """Tolérance de simplification (m) correspondant à pixel_tolerance pixels au zoom donné."""
+    return pixel_tolerance * EQUATOR_M_PER_PX * np.cos(np.radians(latitude)) / 2 ** zoom
+
+
+def tile_xy(lat, lon, zoom):
+    """Coordonnées (x, y) fractionnaires des tuiles contenant les points, au zoom donné."""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = (np.asarray(lon) + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n
+    return x, y
+
+
+def tile_lonlat(x, y, zoom):
+    """Longitude et latitude des coordonnées de tuiles (x, y) fractionnaires (inverse de tile_xy)."""
+    n = 2 ** zoom
+    lon = np.asarray(x) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * np.asarray(y) / n))))
+    return lon, lat
+
+
+def _edge_pieces(fx, fy, edges):
+    """
+    Découpe des arêtes (i, i+1) selon la grille des tuiles : pour chaque morceau,
+    indice d'arête, paramètres t0 < t1 le long de l'arête (0 et 1 aux extrémités)
+    et tuile (x, y) traversée. Une arête interne à une tuile donne un seul morceau.
+    """
+    ix, iy = np.floor(fx).astype(np.int64), np.floor(fy).astype(np.int64)
+    single = (ix[edges] == ix[edges + 1]) & (iy[edges] == iy[edges + 1])
+    inner = edges[single]
+    edge_ids, t0, t1 = [inner], [np.zeros(len(inner))], [np.ones(len(inner))]
+    tiles_x, tiles_y = [ix[inner]], [iy[inner]]
+    # Arêtes à cheval sur plusieurs tuiles (rares une fois simplifiées) :
+    # coupées à chaque ligne de la grille franchie, en coordonnées de tuiles (Mercator)
+    for e in edges[~single]:
+        x0, y0 = fx[e], fy[e]
+        dx, dy = fx[e + 1] - x0, fy[e + 1] - y0
+        cuts = [np.array([0.0, 1.0])]
+        for start, delta, lo, hi in ((x0, dx, ix[e], ix[e + 1]), (y0, dy, iy[e], iy[e + 1])):
+            if delta:
+                cuts.append((np.arange(min(lo, hi) + 1, max(lo, hi) + 1) - start) / delta)
+        t = np.unique(np.clip(np.concatenate(cuts), 0.0, 1.0))
+        middle = (t[:-1] + t[1:]) / 2
+        edge_ids.append(np.full(len(middle), e))
+        t0.append(t[:-1])
+        t1.append(t[1:])
+        tiles_x.append(np.floor(x0 + middle * dx).astype(np.int64))
+        tiles_y.append(np.floor(y0 + middle * dy).astype(np.int64))
+    return tuple(np.concatenate(parts) for parts in (edge_ids, t0, t1, tiles_x, tiles_y))
+
+
+def build_zoom_tiles(traces, importance, zoom, pixel_tolerance=1.0):
+    """
+    Tuiles d'un niveau de zoom : dict {(x, y): [features GeoJSON]}.
+    Chaque feature est une portion continue d'un segment, découpée au bord de
+    la tuile, propriété "segment".
+    """
+    if not traces.n_points:
+        return {}
+    latitude = float(traces.coords[:, 0].mean())
+    store = traces.subset(simplification_mask(importance, zoom_tolerance_m(zoom, latitude, pixel_tolerance)))
+    coords = store.coords
+    fx, fy = tile_xy(coords[:, 0], coords[:, 1], zoom)
+
+    # Arêtes (i, i+1) internes à un segment
+    valid = np.ones(max(len(coords) - 1, 0), dtype=bool)
+    stops = store.offsets[1:]
+    ends = stops[(stops > store.offsets[:-1]) & (stops < len(coords))] - 1
+    valid[ends] = False
+    edges = np.flatnonzero(valid)
+    if not len(edges):
+        return {}
+
+    edge_ids, t0, t1, tx, ty = _edge_pieces(fx, fy, edges)
+    order = np.lexsort((t0, edge_ids, ty, tx))
+    edge_ids, t0, t1, tx, ty = edge_ids[order], t0[order], t1[order], tx[order], ty[order]
+
+    # Une nouvelle ligne commence à chaque changement de tuile ou discontinuité d'arêtes
+    breaks = np.ones(len(edge_ids), dtype=bool)
+    breaks[1:] = ((tx[1:] != tx[:-1]) | (ty[1:] != ty[:-1]) | (edge_ids[1:] != edge_ids[:-1] + 1)
+                  | (t1[:-1] < 1) | (t0[1:] > 0))
+    run_starts = np.flatnonzero(breaks)
+    run_stops = np.append(run_starts[1:], len(edge_ids))
+
+    # Extrémités des morceaux : points du tracé, ou intersections avec le bord de la tuile
+    lonlat = coords[:, ::-1]
+    dx, dy = fx[edge_ids + 1] - fx[edge_ids], fy[edge_ids + 1] - fy[edge_ids]
+    heads = np.where((t0 == 0)[:, None], lonlat[edge_ids],
+                     np.column_stack(tile_lonlat(fx[edge_ids] + t0 * dx, fy[edge_ids] + t0 * dy, zoom)))
+    tails = np.where((t1 == 1)[:, None], lonlat[edge_ids + 1],
+                     np.column_stack(tile_lonlat(fx[edge_ids] + t1 * dx, fy[edge_ids] + t1 * dy, zoom)))
+
+    segment_of_point = np.repeat(store.segments, store.point_counts())
+    tiles = {}
+    for start, stop in zip(run_starts, run_stops):
+        first, last = edge_ids[start], edge_ids[stop - 1]
+        line = np.vstack((heads[start], lonlat[first + 1:last + 1], tails[stop - 1]))
+        tiles.setdefault((int(tx[start]), int(ty[start])), []).append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": np.round(line, 6).tolist()},
+            "properties": {"segment": int(segment_of_point[first])}
+        })
+    return tiles
+
+
+def write_tile_pyramid(traces, importance, directory, min_zoom=DEFAULT_MIN_ZOOM,
+                       max_zoom=DEFAULT_MAX_ZOOM, pixel_tolerance=1.0):
+    """
+    Écrit les tuiles de min_zoom à max_zoom dans 'directory' (ignoré s'il est déjà complet).
+    Retourne le contenu de index.json.
+    """
+    directory = Path(directory)
+    index_file = directory / "index.json"
+    if index_file.exists():
+        with open(index_file, 'r') as f:
+            return json.load(f)
+
+    # Construction dans un dossier temporaire, renommé à la fin : jamais de pyramide partielle
+    tmp_dir = directory.with_name(f"{directory.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tile_keys = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        for (x, y), features in build_zoom_tiles(traces, importance, zoom, pixel_tolerance).items():
+            tile_file = tmp_dir / str(zoom) / str(x) / f"{y}.geojson"
+            tile_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tile_file, 'w') as f:
+                json.dump({"type": "FeatureCollection", "features": features}, f, separators=(',', ':'))
+            tile_keys.append(f"{zoom}/{x}/{y}")
+
+    coords = traces.coords
+    index = {
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "bounds": [coords.min(axis=0).tolist(), coords.max(axis=0).tolist()] if len(coords) else None,
+        "tiles": tile_keys
+    }
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    with open(tmp_dir / "index.json", 'w') as f:
+        json.dump(index, f)
+    try:
+        os.replace(tmp_dir, directory)
+    except OSError:
+        # Une autre session a terminé la même pyramide entre-temps
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return index
+
+
+def prune_tile_pyramids(root, keep=4):
+    """Supprime les pyramides les plus anciennes de 'root' pour n'en garder que 'keep'."""
+    root = Path(root)
+    if not root.is_dir():
+        return
+    pyramids = sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True)
+    for pyramid in pyramids[keep:]:
+        shutil.rmtree(pyramid, ignore_errors=True)
+
+
+class GeoJsonTileLoader(folium.MacroElement):
+    """
+    Couche Leaflet qui charge à la demande les tuiles GeoJSON visibles
+    (servies par Streamlit sous app/static/...).
+
+    colors : {segment: couleur} des segments à afficher ; les autres sont filtrés.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var base = new URL({{ this.base_url|tojson }}, document.baseURI).href;
+            var colors = {{ this.colors|tojson }};
+            var renderer = L.canvas({padding: 0.5});
+            var index = null, tileSet = null, requests = {}, layers = {};
+
+            function lon2x(lon, z) { return Math.floor((lon + 180) / 360 * Math.pow(2, z)); }
+            function lat2y(lat, z) {
+                var r = Math.max(-85.0511, Math.min(85.0511, lat)) * Math.PI / 180;
+                return Math.floor((1 - Math.asinh(Math.tan(r)) / Math.PI) / 2 * Math.pow(2, z));
+            }
+
+            function show(key) {
+                var group = L.layerGroup().addTo(map);
+                layers[key] = group;
+                if (!requests[key]) {
+                    requests[key] = fetch(base + key + '.geojson').then(function(r) { return r.json(); });
+                }
+                requests[key].then(function(data) {
+                    if (layers[key] !== group) return;  // tuile sortie de la vue entre-temps
+                    L.geoJSON(data, {
+                        renderer: renderer,
+                        filter: function(f) { return colors.hasOwnProperty(f.properties.segment); },
+                        style: function(f) {
+                            return {color: colors[f.properties.segment], weight: {{ this.weight }}, opacity: 0.7};
+                        },
+                        onEachFeature: function(f, layer) { layer.bindTooltip('Segment ' + f.properties.segment); }
+                    }).addTo(group);
+                });
+            }
+
+            function refresh() {
+                if (!index) return;
+                var z = Math.max(index.min_zoom, Math.min(index.max_zoom, Math.round(map.getZoom())));
+                var b = map.getBounds();
+                var wanted = {};
+                for (var x = lon2x(b.getWest(), z); x <= lon2x(b.getEast(), z); x++) {
+                    for (var y = lat2y(b.getNorth(), z); y <= lat2y(b.getSouth(), z); y++) {
+                        var key = z + '/' + x + '/' + y;
+                        if (tileSet.has(key)) wanted[key] = true;
+                    }
+                }
+                Object.keys(layers).forEach(function(key) {
+                    if (!wanted[key]) { map.removeLayer(layers[key]); delete layers[key]; }
+                });
+                Object.keys(wanted).forEach(function(key) { if (!layers[key]) show(key); });
+            }
+
+            fetch(base + 'index.json').then(function(r) { return r.json(); }).then(function(data) {
+                index = data;
+                tileSet = new Set(data.tiles);
+                refresh();
+            });
+            map.on('moveend', refresh);
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, base_url, colors, weight=3):
+        super().__init__()
+        self._name = "GeoJsonTileLoader"
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.colors = {str(segment): color for segment, color in colors.items()}
+        self.weight = weight
@@ -0,0 +1,126 @@
+"""
+Encodage compact des coordonnées de traces pour les pages d'animation.
+
+Les coordonnées sont quantifiées (10^-precision degré), codées en différences
+successives puis en entiers de longueur variable (zigzag, 7 bits par octet,
+comme les polylignes Google) et transmises en base64. Un point GPS typique
+tient ainsi en 2 à 4 octets au lieu d'une quarantaine de caractères JSON.
+
+DECODER_JS contient le décodeur JavaScript correspondant : il reconstruit un
+unique Float32Array [lat0, lon0, lat1, lon1, ...] et une vue par segment.
+"""
+import base64
+
+import numpy as np
+
+# 5 décimales : ~1 m au sol, précision des polylignes Google
+DEFAULT_PRECISION = 5
+
+
+def encode_varints(values):
+    """Encode des entiers signés (zigzag + LEB128) en bytes, de façon vectorisée."""
+    values = np.asarray(values, dtype=np.int64)
+    zigzag = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+    n_bytes = np.ones(len(zigzag), dtype=np.int64)
+    for k in range(1, 10):
+        n_bytes += zigzag >= np.uint64(1 << (7 * k))
+    starts = np.zeros(len(zigzag), dtype=np.int64)
+    np.cumsum(n_bytes[:-1], out=starts[1:])
+
+    out = np.empty(int(n_bytes.sum()), dtype=np.uint8)
+    for k in range(int(n_bytes.max(initial=0))):
+        has = n_bytes > k
+        byte = (zigzag[has] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = n_bytes[has] > k + 1
+        out[starts[has] + k] = (byte | (more.astype(np.uint64) << np.uint64(7))).astype(np.uint8)
+    return out.tobytes()
+
+
+def decode_varints(data):
+    """Inverse de encode_varints (utilisé pour vérifier un encodage côté Python)."""
+    values = []
+    result = shift = 0
+    for byte in data:
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            values.append((result >> 1) ^ -(result & 1))
+            result = shift = 0
+    return np.array(values, dtype=np.int64)
+
+
+def encode_coords(coords, precision=DEFAULT_PRECISION):
+    """Encode un tableau (n, 2) lat/lon en texte base64 (différences quantifiées)."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    quantized = np.round(coords * 10 ** precision).astype(np.int64).ravel()
+    deltas = np.diff(quantized.reshape(-1, 2), axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    return base64.b64encode(encode_varints(deltas)).decode('ascii')
+
+
+def decode_coords(text, precision=DEFAULT_PRECISION):
+    """Inverse de encode_coords : tableau (n, 2) lat/lon."""
+    deltas = decode_varints(base64.b64decode(text)).reshape(-1, 2)
+    return np.cumsum(deltas, axis=0) / 10 ** precision
+
+
+def encode_traces(traces, precision=DEFAULT_PRECISION):
+    """
+    Charge utile JSON-sérialisable d'une liste de SegmentTrace, à décoder
+    dans la page avec decodeTraces (DECODER_JS).
+    """
+    traces = [trace for trace in traces if len(trace.points)]
+    coords = np.concatenate([trace.points for trace in traces]) if traces else np.empty((0, 2))
+    return {
+        "segments": [int(trace.segment) for trace in traces],
+        "counts": [len(trace.points) for trace in traces],
+        "precision": precision,
+        "data": encode_coords(coords, precision)
+    }
+
+
+DECODER_JS = """
+        function decodeTraces(payload) {
+            var raw = atob(payload.data);
+            var total = payload.counts.reduce(function(a, b) { return a + b; }, 0);
+            var coords = new Float32Array(2 * total);
+            var scale = Math.pow(10, -payload.precision);
+            var acc = [0, 0];
+            var pos = 0;
+            for (var i = 0; i < 2 * total; i++) {
+                var value = 0, factor = 1, b;
+                do {
+                    b = raw.charCodeAt(pos++);
+                    value += (b & 0x7f) * factor;
+                    factor *= 128;
+                } while (b & 0x80);
+                acc[i & 1] += (value % 2) ? -(value + 1) / 2 : value / 2;
+                coords[i] = acc[i & 1] * scale;
+            }
+            var traces = [];
+            var offset = 0;
+            payload.counts.forEach(function(n, k) {
+                traces.push({
+                    segment: payload.segments[k],
+                    points: coords.subarray(2 * offset, 2 * (offset + n)),
+                    length: n
+                });
+                offset += n;
+            });
+            return traces;
+        }
+
+        function latLng(points, i) {
+            return [points[2 * i], points[2 * i + 1]];
+        }
+
+        function pointsBounds(points) {
+            var minLat = Infinity, maxLat = -Infinity, minLng = Infinity, maxLng = -Infinity;
+            for (var i = 0; i < points.length; i += 2) {
+                minLat = Math.min(minLat, points[i]);
+                maxLat = Math.max(maxLat, points[i]);
+                minLng = Math.min(minLng, points[i + 1]);
+                maxLng = Math.max(maxLng, points[i + 1]);
+            }
+            return [[minLat, minLng], [maxLat, maxLng]];
+        }
+"""
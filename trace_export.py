@@ -0,0 +1,245 @@
+"""
+Export columnaire des tracés d'un répertoire de relais : GeoParquet ou Arrow IPC.
+
+Une ligne par segment : numéro, fichier, nombre de points, indicateurs de
+analytics.SegmentMetrics (mêmes noms de colonnes) et la géométrie, une
+LineString longitude/latitude encodée en WKB. Les métadonnées 'geo' du schéma
+suivent GeoParquet 1.0.0 (colonne principale 'geometry', CRS84 par défaut) :
+le fichier se lit directement avec pandas, geopandas ou DuckDB, et
+read_traces le relit en TraceStore pour l'application et les notebooks, sans
+repasser par les GPX.
+
+    python trace_export.py Relais_gpx_greedy Relais_gpx_dp [--format arrow]
+
+écrit segments.parquet (ou segments.arrow) dans chaque répertoire.
+"""
+import argparse
+import io
+import json
+import os
+import struct
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pyarrow as pa
+
+from analytics import SegmentMetrics, segment_metrics
+from gpx_cache import directory_signature
+from gpx_ingest import ingest_gpx_files
+from manifest import GPX_PATTERN, remove_stale_segments, segment_number, update_manifest
+from relay_archive import RelayArchive, arrays_from_points, write_relay_archive
+from trace_store import TraceStore
+
+EXPORT_FILE = "segments"
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+GEOMETRY_COLUMN = "geometry"
+
+# WKB petit-boutiste d'une LineString 2D : ordre des octets, type (2), nombre de points
+_WKB_LINESTRING = struct.Struct("<BII")
+
+
+class ExportedTraces(NamedTuple):
+    """Contenu d'un export relu : tracés et indicateurs alignés sur traces.segments."""
+    traces: TraceStore
+    metrics: SegmentMetrics
+
+
+def _linestring_wkb(points):
+    """WKB d'une LineString à partir d'un tableau (n, 2) lat/lon (x = longitude)."""
+    xy = np.ascontiguousarray(np.asarray(points, dtype='<f8')[:, ::-1])
+    return _WKB_LINESTRING.pack(1, 2, len(xy)) + xy.tobytes()
+
+
+def _wkb_points(wkb):
+    """Tableau (n, 2) lat/lon d'une LineString WKB (repli sur shapely hors petit-boutiste 2D)."""
+    order, kind, count = _WKB_LINESTRING.unpack_from(wkb)
+    if order == 1 and kind == 2:
+        xy = np.frombuffer(wkb, dtype='<f8', count=2 * count, offset=_WKB_LINESTRING.size).reshape(-1, 2)
+    else:
+        import shapely  # WKB d'un autre producteur (gros-boutiste, Z, ...)
+
+        xy = shapely.get_coordinates(shapely.from_wkb(wkb))
+    return xy[:, ::-1].astype(np.float64)
+
+
+def traces_table(traces, manifest=None):
+    """
+    Table Arrow des tracés (une ligne par segment). Les indicateurs viennent du
+    manifeste s'il est donné (ceux des GPX, altitude comprise), sinon ils sont
+    recalculés sur les coordonnées.
+    """
+    segments = traces.segments
+    if manifest is not None and len(manifest):
+        positions = [manifest.position(s) for s in segments.tolist()]
+        known = np.array([p is not None for p in positions], dtype=bool)
+        index = np.array([p if p is not None else 0 for p in positions], dtype=np.int64)
+        metrics = SegmentMetrics(*(
+            np.where(known, values[index], 0 if field == "turns" else np.nan)
+            for field, values in zip(SegmentMetrics._fields, manifest.metrics)
+        ))
+    else:
+        metrics = segment_metrics(traces.offsets, traces.coords)
+
+    geometries = [_linestring_wkb(trace.points) for trace in traces]
+    columns = {
+        "segment": pa.array(segments, pa.int64()),
+        "file": pa.array([os.path.basename(f) for f in traces.files], pa.string()),
+        "points": pa.array(np.diff(traces.offsets), pa.int64()),
+    }
+    for field, values in zip(SegmentMetrics._fields, metrics):
+        columns[field] = pa.array(np.asarray(values, dtype=np.int64 if field == "turns" else np.float64))
+    columns[GEOMETRY_COLUMN] = pa.array(geometries, pa.binary())
+
+    coords = traces.coords
+    bbox = ([float(coords[:, 1].min()), float(coords[:, 0].min()), float(coords[:, 1].max()), float(coords[:, 0].max())]
+            if len(coords) else [])
+    geo = {
+        "version": "1.0.0",
+        "primary_column": GEOMETRY_COLUMN,
+        "columns": {GEOMETRY_COLUMN: {"encoding": "WKB", "geometry_types": ["LineString"], "bbox": bbox}},
+    }
+    table = pa.table(columns)
+    return table.replace_schema_metadata({b"geo": json.dumps(geo).encode('utf-8')})
+
+
+def _format(path, fmt=None):
+    if fmt is None:
+        suffix = Path(path).suffix.lower()
+        fmt = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}.get(suffix)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu pour {path} (attendu : {', '.join(EXPORT_FORMATS)})")
+    return fmt
+
+
+def _write_table(table, sink, fmt):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        import pyarrow.feather as feather
+
+        feather.write_feather(table, sink, compression="zstd")
+
+
+def write_traces(path, traces, manifest=None, fmt=None):
+    """
+    Écrit les tracés dans path : GeoParquet (.parquet) ou Arrow IPC (.arrow,
+    .feather), ou selon fmt ('parquet', 'arrow'). Écriture atomique.
+    """
+    fmt = _format(path, fmt)
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    _write_table(traces_table(traces, manifest), str(tmp), fmt)
+    os.replace(tmp, path)
+    return path
+
+
+def traces_bytes(traces, manifest=None, fmt="parquet"):
+    """Contenu du fichier d'export, en mémoire (téléchargement depuis l'application)."""
+    sink = io.BytesIO()
+    _write_table(traces_table(traces, manifest), sink, _format("", fmt))
+    return sink.getvalue()
+
+
+def read_table(source):
+    """Table Arrow d'un export (chemin ou octets), GeoParquet ou Arrow IPC."""
+    data = source if isinstance(source, (bytes, bytearray, memoryview)) else None
+    if data is not None:
+        fmt = "parquet" if bytes(data[:4]) == b"PAR1" else "arrow"
+        source = pa.BufferReader(data)
+    else:
+        fmt = _format(source)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(source)
+    import pyarrow.feather as feather
+
+    return feather.read_table(source)
+
+
+def read_traces(source):
+    """
+    Relit un export (chemin ou octets) : ExportedTraces(traces, metrics), le
+    TraceStore des segments et leurs indicateurs. Les fichiers des segments sont
+    rapportés au répertoire de l'export.
+    """
+    table = read_table(source)
+    missing = {"segment", "file", GEOMETRY_COLUMN} - set(table.column_names)
+    if missing:
+        raise ValueError(f"Colonnes absentes de l'export : {', '.join(sorted(missing))}")
+    directory = "" if isinstance(source, (bytes, bytearray, memoryview)) else os.path.dirname(str(source))
+
+    segments = table.column("segment").to_numpy()
+    files = [os.path.join(directory, f) for f in table.column("file").to_pylist()]
+    points = [np.empty((0, 2)) if wkb is None else _wkb_points(wkb)
+              for wkb in table.column(GEOMETRY_COLUMN).to_pylist()]
+    traces = TraceStore.from_arrays(zip(segments.tolist(), files, points))
+
+    # Indicateurs réalignés sur l'ordre du store (trié par numéro)
+    order = np.argsort(segments, kind='stable')
+    if set(SegmentMetrics._fields) <= set(table.column_names):
+        metrics = SegmentMetrics(*(
+            table.column(field).to_numpy(zero_copy_only=False)[order] for field in SegmentMetrics._fields
+        ))
+    else:
+        metrics = segment_metrics(traces.offsets, traces.coords)
+    return ExportedTraces(traces, metrics)
+
+
+def relay_traces(directory, max_workers=4):
+    """Manifeste et TraceStore de tous les segments d'un répertoire (archive si à jour, sinon GPX)."""
+    manifest = update_manifest(directory, max_workers=max_workers)
+    archive = RelayArchive.open(directory, directory_signature(directory, GPX_PATTERN))
+    paths = manifest.paths()
+    if archive is not None:
+        return manifest, archive.trace_store([segment_number(p) for p in paths], paths)
+    arrays, _ = ingest_gpx_files(list(paths), with_time=False, max_workers=max_workers)
+    return manifest, TraceStore.from_arrays(
+        (segment_number(p), p, a.coords) for p, a in zip(paths, arrays)
+    )
+
+
+def export_relay_directory(directory, path=None, fmt="parquet", max_workers=4):
+    """Exporte tous les segments d'un répertoire (segments.parquet par défaut). Retourne le chemin écrit."""
+    manifest, traces = relay_traces(directory, max_workers)
+    if path is None:
+        path = Path(directory) / f"{EXPORT_FILE}{EXPORT_FORMATS[fmt]}"
+    return write_traces(path, traces, manifest, fmt)
+
+
+def write_relay_outputs(directory, segments, max_workers=4):
+    """
+    Sorties d'un découpage, juste après l'écriture des relai_<n>.gpx (segments :
+    listes de points gpxpy, dans l'ordre des fichiers) : manifeste (manifest.json)
+    et archive en mémoire mappée (relais.arc), lus par display_all_traces.py sans
+    parser les GPX, puis export GeoParquet (segments.parquet). Les relai_<k>.gpx
+    d'un découpage précédent plus long sont supprimés. Retourne le manifeste.
+    """
+    remove_stale_segments(directory, len(segments))
+    manifest = update_manifest(directory, max_workers=max_workers)
+    write_relay_archive(directory, [arrays_from_points(points) for points in segments])
+    export_relay_directory(directory, max_workers=max_workers)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporte les tracés de répertoires de relais en GeoParquet/Arrow.")
+    parser.add_argument("directories", nargs="+", help="répertoires contenant des relai_*.gpx")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="parquet", help="format d'export")
+    parser.add_argument("--workers", type=int, default=4, help="processus de parsing")
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            parser.error(f"{directory} n'est pas un répertoire")
+        path = export_relay_directory(directory, fmt=args.format, max_workers=args.workers)
+        exported = read_traces(path)
+        print(f"{directory} : {len(exported.traces)} segments, {exported.traces.n_points} points -> {path} "
+              f"({path.stat().st_size / 1e6:.1f} Mo)")
+
+
+if __name__ == "__main__":
+    main()
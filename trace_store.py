@@ -0,0 +1,169 @@
+"""
+Stockage columnaire des traces GPX d'un répertoire de relais.
+
+Toutes les coordonnées sont rangées dans un unique tableau float64 contigu
+de forme (N, 2) (latitude, longitude). Un tableau d'offsets délimite les
+segments : les points du segment d'indice k sont coords[offsets[k]:offsets[k+1]].
+Les accès renvoient des vues NumPy, jamais de copies.
+"""
+import hashlib
+from typing import NamedTuple
+
+import numpy as np
+
+
+class SegmentTrace(NamedTuple):
+    """Vue sur un segment du store."""
+    segment: int
+    points: np.ndarray  # vue (n, 2) : colonnes latitude, longitude
+    file: str
+
+
+class TraceStore:
+    """
+    Ensemble de segments stockés en colonnes.
+
+    - segments : identifiants des segments (int64, triés)
+    - offsets  : bornes des segments dans coords (int64, longueur len(segments)+1)
+    - coords   : tableau (N, 2) float64 des latitudes/longitudes
+    - files    : chemin du fichier GPX source de chaque segment
+    """
+
+    def __init__(self, segments, offsets, coords, files):
+        self.segments = np.asarray(segments, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.files = list(files)
+        if len(self.offsets) != len(self.segments) + 1:
+            raise ValueError("offsets doit contenir len(segments) + 1 éléments")
+        self._positions = {int(s): i for i, s in enumerate(self.segments)}
+        self._fingerprint = None
+
+    @classmethod
+    def empty(cls):
+        return cls([], [0], np.empty((0, 2)), [])
+
+    @classmethod
+    def from_arrays(cls, items):
+        """
+        Construit un store à partir d'un itérable de (segment, file, points),
+        points étant un tableau (n, 2) lat/lon. Les segments sont triés par numéro.
+        """
+        items = sorted(items, key=lambda item: item[0])
+        if not items:
+            return cls.empty()
+
+        counts = [len(points) for _, _, points in items]
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        coords = np.empty((offsets[-1], 2), dtype=np.float64)
+        for (_, _, points), start, stop in zip(items, offsets[:-1], offsets[1:]):
+            if stop > start:
+                coords[start:stop] = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+        return cls(
+            [segment for segment, _, _ in items],
+            offsets,
+            coords,
+            [file for _, file, _ in items]
+        )
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._trace_at(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("Seules les tranches contiguës sont supportées")
+            return self.slice(start, stop)
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        return self._trace_at(key)
+
+    def _trace_at(self, i):
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return SegmentTrace(int(self.segments[i]), self.coords[start:stop], self.files[i])
+
+    @property
+    def segment_ids(self):
+        """Liste des numéros de segments, dans l'ordre du store."""
+        return self.segments.tolist()
+
+    @property
+    def n_points(self):
+        return int(self.offsets[-1] - self.offsets[0])
+
+    @property
+    def fingerprint(self):
+        """Empreinte du contenu, utilisable comme clé de cache (st.cache_data ne sait pas hacher le store)."""
+        if self._fingerprint is None:
+            h = hashlib.md5()
+            for array in (self.segments, self.offsets - self.offsets[0], self.coords):
+                h.update(np.ascontiguousarray(array).tobytes())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def point_counts(self):
+        """Nombre de points de chaque segment."""
+        return np.diff(self.offsets)
+
+    def position(self, segment):
+        """Indice du segment dans le store, ou None s'il est absent."""
+        return self._positions.get(int(segment))
+
+    def get(self, segment):
+        """Retourne le SegmentTrace du segment demandé, ou None."""
+        i = self.position(segment)
+        return None if i is None else self._trace_at(i)
+
+    def points(self, segment):
+        """Vue (n, 2) des points du segment (tableau vide si absent)."""
+        trace = self.get(segment)
+        return trace.points if trace is not None else self.coords[:0]
+
+    def slice(self, start, stop):
+        """Sous-store des segments d'indices [start, stop), partageant les coordonnées."""
+        start = max(0, start)
+        stop = min(len(self), max(start, stop))
+        offsets = self.offsets[start:stop + 1]
+        base = offsets[0]
+        return TraceStore(
+            self.segments[start:stop],
+            offsets - base,
+            self.coords[base:offsets[-1]],
+            self.files[start:stop]
+        )
+
+    def subset(self, mask):
+        """Store ne gardant que les points où mask (booléen, aligné sur coords) est vrai."""
+        mask = np.asarray(mask, dtype=bool)
+        kept = np.zeros(len(mask) + 1, dtype=np.int64)
+        np.cumsum(mask, out=kept[1:])
+        return TraceStore(
+            self.segments,
+            kept[self.offsets - self.offsets[0]],
+            self.coords[mask],
+            self.files
+        )
+
+    def select(self, segment_ids):
+        """Liste des SegmentTrace dont le numéro figure dans segment_ids (ordre du store)."""
+        wanted = {int(s) for s in segment_ids}
+        return [self._trace_at(i) for i, s in enumerate(self.segments) if int(s) in wanted]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_positions']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._positions = {int(s): i for i, s in enumerate(self.segments)}